@@ -10,8 +10,9 @@ import discord
 from discord.ext import commands, tasks
 from dotenv import load_dotenv
 
-from utils.db_manager import DBManager  # Your custom async DB manager
 from utils.features import FeatureManager
+from utils.priority import Priority, set_db_priority
+from utils.storage import StorageBackend, create_storage
 
 # Load environment variables
 load_dotenv()
@@ -27,6 +28,54 @@ if not APPLICATION_ID:
 # Convert APPLICATION_ID to integer
 APPLICATION_ID = int(APPLICATION_ID)
 
+# Storage backend: "sqlite" (persistent) or "memory" (load tests, ephemeral shards)
+DB_BACKEND = os.getenv("DB_BACKEND", "sqlite").lower()
+
+# Split SQLite storage into this many per-guild files (0 = single file).
+# Changing it requires re-splitting with `python -m utils.sharding`
+DB_SHARDS = int(os.getenv("DB_SHARDS", "0"))
+
+# Run SQLite work in a separate process, keeping it off the gateway's event loop
+DB_WORKER = os.getenv("DB_WORKER", "false").lower() in ("1", "true", "yes")
+
+# Database write-behind batching (opt-in)
+DB_WRITE_BEHIND = os.getenv("DB_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+DB_FLUSH_INTERVAL_MS = int(os.getenv("DB_FLUSH_INTERVAL_MS", "500"))
+DB_FLUSH_MAX_OPS = int(os.getenv("DB_FLUSH_MAX_OPS", "500"))
+DB_DRAIN_TIMEOUT = float(os.getenv("DB_DRAIN_TIMEOUT", "10"))
+
+# Number of read-only connections used alongside the single writer
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "2"))
+
+# SQLite tuning: "durable", "balanced" or "throughput"
+DB_STORAGE_PROFILE = os.getenv("DB_STORAGE_PROFILE", "balanced")
+DB_OPTIMIZE_INTERVAL = float(os.getenv("DB_OPTIMIZE_INTERVAL", "3600"))
+DB_CHECKPOINT_INTERVAL = float(os.getenv("DB_CHECKPOINT_INTERVAL", "300"))
+
+# Statements slower than this go to the slow-query log with their plan (0 = off)
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "100"))
+
+# Online snapshots to data/backups every DB_BACKUP_INTERVAL seconds (0 = off), keeping the newest DB_BACKUP_KEEP
+DB_BACKUP_INTERVAL = float(os.getenv("DB_BACKUP_INTERVAL", "86400"))
+DB_BACKUP_KEEP = int(os.getenv("DB_BACKUP_KEEP", "7"))
+
+# Drop guild logs older than this many days, checked hourly (0 = keep forever)
+DB_LOG_RETENTION_DAYS = int(os.getenv("DB_LOG_RETENTION_DAYS", "0"))
+
+# Queued database work moves up one priority class per this many ms waited
+DB_PRIORITY_AGING_MS = float(os.getenv("DB_PRIORITY_AGING_MS", "250"))
+
+# Feature settings of this many guilds are cached in memory. Entries are
+# invalidated on every write; a TTL in seconds only matters when something else
+# writes the database, 0 disables it
+FEATURE_CACHE_SIZE = int(os.getenv("FEATURE_CACHE_SIZE", "10000"))
+FEATURE_CACHE_TTL = float(os.getenv("FEATURE_CACHE_TTL", "0"))
+
+# When several bot processes share the database, poll its settings change log
+# every this many seconds to keep their caches coherent, 0 disables it. Settings
+# writes are only logged while it is enabled, so set it in every process
+FEATURE_WATCH_INTERVAL = float(os.getenv("FEATURE_WATCH_INTERVAL", "0"))
+
 # Configure intents
 intents = discord.Intents.all()
 
@@ -37,13 +86,26 @@ log = logging.getLogger("WhisperBot")
 # Global shutdown task variable
 shutdown_task: Optional[asyncio.Task] = None
 
+class WhisperCommandTree(discord.app_commands.CommandTree):
+    """Command tree that runs slash commands' database work ahead of event and background work."""
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # Runs in the same task as the command, so the class sticks for its queries
+        set_db_priority(Priority.INTERACTIVE)
+        return True
+
 class WhisperBot(commands.Bot):
     """Base bot class with database integration."""
     
     def __init__(self):
-        super().__init__(command_prefix="!", intents=intents, application_id=APPLICATION_ID)
+        super().__init__(
+            command_prefix="!",
+            intents=intents,
+            application_id=APPLICATION_ID,
+            tree_cls=WhisperCommandTree
+        )
         self.session: Optional[aiohttp.ClientSession] = None
-        self.db: Optional[DBManager] = None
+        self.db: Optional[StorageBackend] = None
         self.features: Optional[FeatureManager] = None
 
     def get_logger(self, name: str) -> logging.Logger:
@@ -59,22 +121,52 @@ class WhisperBot(commands.Bot):
         data_dir.mkdir(exist_ok=True)
 
         # Initialize database first
-        self.db = DBManager("data/database.db", logger=log)
+        self.db = create_storage(
+            DB_BACKEND,
+            "data/database.db",
+            shards=DB_SHARDS,
+            worker=DB_WORKER,
+            logger=log,
+            write_behind=DB_WRITE_BEHIND,
+            flush_interval_ms=DB_FLUSH_INTERVAL_MS,
+            flush_max_ops=DB_FLUSH_MAX_OPS,
+            read_pool_size=DB_READ_POOL_SIZE,
+            storage_profile=DB_STORAGE_PROFILE,
+            optimize_interval=DB_OPTIMIZE_INTERVAL,
+            checkpoint_interval=DB_CHECKPOINT_INTERVAL,
+            slow_query_ms=DB_SLOW_QUERY_MS,
+            backup_interval=DB_BACKUP_INTERVAL,
+            backup_keep=DB_BACKUP_KEEP,
+            priority_aging_ms=DB_PRIORITY_AGING_MS,
+            settings_change_log=FEATURE_WATCH_INTERVAL > 0
+        )
         await self.db.init()
         
         # Then initialize feature manager with initialized db
-        self.features = FeatureManager(self.db)
-
-        # Initialize features for all guilds
-        for guild in self.guilds:
-            await self.db.add_guild(guild.id)
-            await self.features.init_guild_features(guild.id)
+        self.features = FeatureManager(self.db, cache_size=FEATURE_CACHE_SIZE, cache_ttl=FEATURE_CACHE_TTL)
+        # Started before warming, so writes from other processes during the scan are caught
+        if FEATURE_WATCH_INTERVAL > 0:
+            if await self.features.watch(FEATURE_WATCH_INTERVAL):
+                log.info(f"Following settings changes every {FEATURE_WATCH_INTERVAL:g}s")
+            else:
+                log.warning(f"Storage backend '{DB_BACKEND}' keeps no settings change log, not following changes")
+        try:
+            warmed = await self.features.warm()
+            log.info(
+                f"Warmed feature settings cache: {warmed['guilds']} guild(s), {warmed['rows']} row(s) "
+                f"in {warmed['elapsed_ms']:.0f}ms, ~{warmed['cache_bytes'] / 1024:.0f} KiB"
+            )
+        except Exception as e:
+            log.error(f"Failed to warm feature settings cache: {e}", exc_info=True)
 
         # Load all cogs
         await self.load_all_cogs()
 
         # Start the status task
         self.status_task.start()
+        self.db_stats_task.start()
+        if DB_LOG_RETENTION_DAYS > 0:
+            self.log_retention_task.start()
 
     async def load_all_cogs(self):
         """Load all cogs from the cogs directory"""
@@ -89,7 +181,21 @@ class WhisperBot(commands.Bot):
             except Exception as e:
                 log.error(f"Failed to load cog {cog_name}: {e}")
 
+    async def bootstrap_guilds(self):
+        """Seed guild and feature rows for every guild the gateway reported"""
+        if self.db is None or self.features is None:
+            return
+        guild_ids = [guild.id for guild in self.guilds]
+        try:
+            seeded = await self.features.init_features_bulk(guild_ids)
+            log.info(f"Bootstrapped {len(guild_ids)} guild(s), seeded {seeded} feature row(s)")
+        except Exception as e:
+            log.error(f"Failed to bootstrap guilds: {e}", exc_info=True)
+
     async def on_ready(self):
+        # Guilds are only available once the gateway is ready, and again after a reconnect
+        await self.bootstrap_guilds()
+
         guild_count = len(self.guilds)
         cog_count = len(self.cogs)
         assert self.user is not None  # for static type checkers like Pylance
@@ -112,13 +218,38 @@ class WhisperBot(commands.Bot):
     async def before_status_task(self):
         await self.wait_until_ready()
 
+    @tasks.loop(minutes=10)
+    async def db_stats_task(self):
+        """Periodically report database pool and queue statistics"""
+        if self.db is not None:
+            log.info(f"Database stats: {self.db.stats()}")
+        if self.features is not None:
+            log.info(f"Feature manager stats: {self.features.stats()}")
+
+    @tasks.loop(hours=1)
+    async def log_retention_task(self):
+        """Drop logs older than DB_LOG_RETENTION_DAYS, whole weekly partitions at a time"""
+        if self.db is None:
+            return
+        set_db_priority(Priority.BACKGROUND)
+        try:
+            await self.db.purge_old_logs(DB_LOG_RETENTION_DAYS)
+        except Exception as e:
+            log.error(f"Failed to purge old logs: {e}", exc_info=True)
+
     async def close(self):
         """Cleanup and close the bot."""
         log.info("Shutting down bot...")
         self.status_task.cancel()
+        self.db_stats_task.cancel()
+        self.log_retention_task.cancel()
+
+        if self.features:
+            await self.features.close()
 
         if self.db:
-            await self.db.close()
+            # Flushes batched writes before the connection goes away
+            await self.db.close(drain_timeout=DB_DRAIN_TIMEOUT)
 
         # Close aiohttp session if exists and open
         if self.session is not None and not self.session.closed:
@@ -154,10 +285,16 @@ class WhisperBot(commands.Bot):
 
     async def on_guild_join(self, guild: discord.Guild):
         """Initialize features when bot joins a new guild"""
-        if self.db is not None:
-            await self.db.add_guild(guild.id)
-            if self.features is not None:
-                await self.features.init_guild_features(guild.id)
+        if self.db is not None and await self.db.cancel_guild_purge(guild.id):
+            log.info(f"Rejoined guild {guild.id}, stopped purging its data")
+        if self.features is not None:
+            await self.features.init_guild_features(guild.id)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        """Delete a guild's data in the background once the bot leaves it"""
+        if self.features is not None:
+            await self.features.purge_guild(guild.id)
+            log.info(f"Removed from guild {guild.id}, purging its data")
 
 # Instantiate the bot
 bot = WhisperBot()
@@ -126,9 +126,11 @@ class ConfigCog(commands.Cog):
                     return await interaction.followup.send("This role is managed by an integration and cannot be used!", ephemeral=True)
                 
                 # Save both whisper staff role and mod role settings
-                await self.bot.db.set_whisper_channel(interaction.guild.id, 
-                    (await self.bot.db.get_whisper_settings(interaction.guild.id) or {}).get('channel_id', 0), 
-                    role.id)
+                await self.bot.features.update_feature_settings(
+                    interaction.guild.id,
+                    FeatureType.WHISPERS,
+                    {'staff_role_id': role.id}
+                )
                 await self.bot.db.set_guild_setting(interaction.guild.id, "mod_role", str(role.id))
                 
                 await interaction.followup.send(
@@ -221,9 +223,9 @@ class ConfigCog(commands.Cog):
     async def _save_whisper_settings(self, guild_id: int, channel_id: int, role_id: int) -> None:
         """Helper method to save whisper settings consistently"""
         # Update to use feature settings instead of direct whisper_settings table
-        await self.bot.db.set_feature_settings(
+        await self.bot.features.set_feature_settings(
             guild_id,
-            "whispers",
+            FeatureType.WHISPERS,
             True,
             {
                 'channel_id': channel_id,
@@ -241,7 +243,7 @@ class ConfigCog(commands.Cog):
 
             # Get all feature settings
             for feature in ["whispers", "logging", "leveling"]:
-                feature_settings = await self.bot.db.get_feature_settings(guild_id, feature)
+                feature_settings = await self.bot.features.get_feature_settings(guild_id, FeatureType(feature))
                 settings[f'{feature}_enabled'] = feature_settings['enabled'] if feature_settings else False
                 if feature_settings and feature_settings['enabled']:
                     options = feature_settings['options']
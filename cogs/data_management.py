@@ -1,9 +1,12 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-from typing import Optional, List
+from typing import Any, Optional, List
 import json
 
+from utils.paginator import CursorPaginator
+from utils.records import Record
+
 class DataManagementCog(commands.Cog):
     """Cog for managing guild data and viewing database information"""
     
@@ -46,75 +49,135 @@ class DataManagementCog(commands.Cog):
             if not interaction.guild:
                 return await interaction.followup.send("❌ This command can only be used in a guild!", ephemeral=True)
 
-            if table == "feature_settings":
-                data = await self.bot.db.get_feature_settings(interaction.guild.id, "*")
-            elif table == "guild_settings":
-                data = await self.bot.db.get_guild_settings(interaction.guild.id)
-            elif table == "xp":
-                data = await self.bot.db.get_leaderboard_page(interaction.guild.id, limit=limit)
+            guild_id = interaction.guild.id
+            db = self.bot.db
+
+            # Large tables are browsed with storage cursors, one page per request
+            if table == "xp":
+                async def fetch(cursor: Optional[str], page_size: int):
+                    return await db.get_leaderboard_after(guild_id, limit=page_size, cursor=cursor)
             elif table == "logs":
-                data = await self.bot.db.get_logs_filtered(interaction.guild.id, since_days=None)[:limit]
+                async def fetch(cursor: Optional[str], page_size: int):
+                    return await db.get_logs_after(guild_id, limit=page_size, cursor=cursor)
             elif table == "mod_actions":
-                data = await self.bot.db.get_mod_actions_page(interaction.guild.id, limit=limit, offset=0)
-            elif table == "whispers":
-                data = await self.bot.db.get_all_whispers(interaction.guild.id)[:limit]
-            elif table == "autoroles":
-                roles = await self.bot.db.get_autoroles(interaction.guild.id)
-                data = [{"role_id": role_id} for role_id in roles]
+                async def fetch(cursor: Optional[str], page_size: int):
+                    return await db.get_mod_actions_after(guild_id, limit=page_size, cursor=cursor)
             else:
-                return await interaction.followup.send("❌ Invalid table selected!", ephemeral=True)
+                if table == "feature_settings":
+                    data = await db.get_all_feature_settings(guild_id)
+                elif table == "guild_settings":
+                    data = await db.get_guild_settings(guild_id)
+                elif table == "whispers":
+                    data = await db.get_all_whispers(guild_id)
+                elif table == "autoroles":
+                    roles = await db.get_autoroles(guild_id)
+                    data = [{"role_id": role_id} for role_id in roles]
+                elif table == "reaction_roles":
+                    data = await db.get_reaction_roles(guild_id)
+                else:
+                    return await interaction.followup.send("❌ Invalid table selected!", ephemeral=True)
 
-            if not data:
-                return await interaction.followup.send(f"No data found in {table}!", ephemeral=True)
+                # Small per-guild tables are loaded once and sliced
+                async def fetch(cursor: Optional[str], page_size: int):
+                    start = int(cursor or 0)
+                    end = start + page_size
+                    return data[start:end], str(end) if end < len(data) else None
 
-            # Create embeds from data
-            embeds = []
-            for i in range(0, len(data), 5):
+            def render(entries: List[Any], page: int) -> discord.Embed:
                 embed = discord.Embed(
                     title=f"📊 {table.replace('_', ' ').title()} Data",
                     color=discord.Color.blue()
                 )
-
-                chunk = data[i:i+5]
-                for idx, entry in enumerate(chunk, start=i+1):
+                for idx, entry in enumerate(entries, start=(page - 1) * 5 + 1):
+                    if isinstance(entry, Record):
+                        entry = entry.as_dict()
                     if raw:
-                        field_value = f"```json\n{json.dumps(entry, indent=2)}```"
+                        field_value = f"```json\n{json.dumps(entry, indent=2, default=str)}```"
                     else:
                         field_value = "\n".join(f"{k}: {v}" for k, v in entry.items() if k != "guild_id")
-                    
+
                     embed.add_field(
                         name=f"Entry {idx}",
                         value=f"```{field_value}```",
                         inline=False
                     )
+                embed.set_footer(text=f"Page {page}")
+                return embed
 
-                embed.set_footer(text=f"Page {i//5 + 1}/{(len(data)-1)//5 + 1}")
-                embeds.append(embed)
-
-            # Create pagination buttons if needed
-            if len(embeds) > 1:
-                class DataPaginator(discord.ui.View):
-                    def __init__(self):
-                        super().__init__(timeout=180)
-                        self.current_page = 0
-
-                    @discord.ui.button(label="Previous", style=discord.ButtonStyle.gray)
-                    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
-                        self.current_page = max(0, self.current_page - 1)
-                        await interaction.response.edit_message(embed=embeds[self.current_page])
-
-                    @discord.ui.button(label="Next", style=discord.ButtonStyle.gray)
-                    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
-                        self.current_page = min(len(embeds) - 1, self.current_page + 1)
-                        await interaction.response.edit_message(embed=embeds[self.current_page])
+            paginator = CursorPaginator(fetch, render, per_page=5, max_entries=limit)
+            embed = await paginator.start()
+            if embed is None:
+                return await interaction.followup.send(f"No data found in {table}!", ephemeral=True)
 
-                await interaction.followup.send(embed=embeds[0], view=DataPaginator())
+            if paginator.needs_buttons:
+                await interaction.followup.send(embed=embed, view=paginator)
             else:
-                await interaction.followup.send(embed=embeds[0])
+                await interaction.followup.send(embed=embed)
 
         except Exception as e:
             await interaction.followup.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
 
+    @app_commands.command(name="dbstats")
+    @app_commands.describe(
+        sort="Rank statements by",
+        reset="Clear the collected metrics after showing them"
+    )
+    @app_commands.choices(sort=[
+        app_commands.Choice(name="Total Time", value="total_ms"),
+        app_commands.Choice(name="95th Percentile", value="p95_ms"),
+        app_commands.Choice(name="Calls", value="count"),
+        app_commands.Choice(name="Rows", value="rows")
+    ])
+    async def dbstats(self, interaction: discord.Interaction, sort: str = "total_ms", reset: bool = False):
+        """Show database query latency and slow queries"""
+        # Metrics cover every guild, so only the bot owner may see them
+        if not await self.bot.is_owner(interaction.user):
+            return await interaction.response.send_message("❌ Only the bot owner can use this command!", ephemeral=True)
+
+        stats = self.bot.db.query_stats(top=8, by=sort, slow=3)
+        if stats is None:
+            return await interaction.response.send_message("❌ The storage backend does not collect query metrics.", ephemeral=True)
+
+        embed = discord.Embed(
+            title="🗄️ Database Query Stats",
+            description=f"Since <t:{int(stats['since'])}:R>, slow query threshold {stats['slow_query_ms']:g} ms",
+            color=discord.Color.blue()
+        )
+
+        lines = [
+            f"{name}: {s['count']}× avg {s['avg_ms']:.2f} p95 {s['p95_ms']:g} max {s['max_ms']:.1f} ms, "
+            f"{s['rows']} rows, total {s['total_ms']:.0f} ms"
+            for name, s in stats["statements"].items()
+        ]
+        embed.add_field(name="Statements", value=f"```{chr(10).join(lines) or 'None yet'}```"[:1024], inline=False)
+
+        transactions = stats["transactions"]
+        lock_wait = stats["lock_wait"]
+        begin_wait = stats["begin_wait"]
+        embed.add_field(
+            name="Transactions",
+            value=(
+                f"```{transactions['count']} run, held p95 {transactions['p95_ms']:g} ms\n"
+                f"Lock wait p50 {lock_wait['p50_ms']:g} / p99 {lock_wait['p99_ms']:g} / max {lock_wait['max_ms']:.1f} ms\n"
+                f"BEGIN IMMEDIATE p99 {begin_wait['p99_ms']:g} / max {begin_wait['max_ms']:.1f} ms```"
+            ),
+            inline=False
+        )
+
+        for entry in stats["slow_queries"]:
+            plan = "\n".join(entry["plan"] or ["(no plan)"])
+            embed.add_field(
+                name=f"🐢 {entry['name']} - {entry['elapsed_ms']:.0f} ms, {entry['rows']} rows, <t:{int(entry['at'])}:R>",
+                value=f"```{plan}```"[:1024],
+                inline=False
+            )
+
+        if reset:
+            self.bot.db.reset_query_stats()
+            embed.set_footer(text="Metrics have been reset")
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
     @app_commands.command(name="deletedata")
     @app_commands.describe(
         target="What data to delete",
@@ -149,11 +212,16 @@ class DataManagementCog(commands.Cog):
                     )
 
                 if target == "guild":
-                    await self.bot.db.delete_guild_data(interaction.guild.id)
+                    # Large guilds take a while, so the purge runs in the background
+                    await self.bot.features.purge_guild(interaction.guild.id)
+                    return await interaction.response.edit_message(
+                        content="✅ Guild data is being deleted in the background.",
+                        view=None
+                    )
                 elif target == "user" and user:
                     await self.bot.db.delete_user_data(interaction.guild.id, user.id)
                 elif target == "logs":
-                    await self.bot.db.purge_old_logs(0)  # 0 days means delete all
+                    await self.bot.db.clear_old_logs(interaction.guild.id, 0)  # 0 days means delete all
                 elif target == "xp":
                     await self.bot.db.delete_all_xp(interaction.guild.id)
                 elif target == "whispers":
@@ -130,6 +130,13 @@ class InfoCog(commands.Cog):
             embed.add_field(name="Servers", value=f"{len(self.bot.guilds):,}", inline=True)
             embed.add_field(name="Members", value=f"{total_members:,}", inline=True)
             embed.add_field(name="Commands", value=f"{len(self.bot.tree.get_commands()):,}", inline=True)
+
+            # Activity tracked across every guild (and every shard)
+            if self.bot.db is not None:
+                totals = await self.bot.db.get_global_stats()
+                embed.add_field(name="Tracked Users", value=f"{totals['users']:,}", inline=True)
+                embed.add_field(name="Messages Seen", value=f"{totals['messages']:,}", inline=True)
+                embed.add_field(name="Commands Run", value=f"{totals['commands']:,}", inline=True)
             
             # Performance
             embed.add_field(name="Latency", value=f"{round(self.bot.latency * 1000)}ms", inline=True)
@@ -1,18 +1,22 @@
 import discord
+from contextlib import aclosing
 from discord import app_commands
 from discord.ext import commands
-from typing import Optional, cast, Union
+from typing import Dict, Optional, cast, Union
 import math
 import random
 import time
 import logging
 from utils.features import FeatureType
+from utils.records import UserXP
 
 class LeaderboardView(discord.ui.View):
-    def __init__(self, cog, page: int, has_next: bool):
+    def __init__(self, cog, page: int, has_next: bool, cursors: Dict[int, Optional[str]]):
         super().__init__(timeout=180)
         self.cog = cog
         self.current_page = page
+        # Page number -> storage cursor that starts it, so every move is one seek
+        self.cursors = cursors
         
         # Add buttons with proper button classes
         prev_button = discord.ui.Button(
@@ -35,11 +39,11 @@ class LeaderboardView(discord.ui.View):
     
     async def previous_callback(self, interaction: discord.Interaction):
         await interaction.response.defer()
-        await self.cog.display_leaderboard(interaction, self.current_page - 1)
+        await self.cog.display_leaderboard(interaction, self.current_page - 1, self.cursors)
     
     async def next_callback(self, interaction: discord.Interaction):
         await interaction.response.defer()
-        await self.cog.display_leaderboard(interaction, self.current_page + 1)
+        await self.cog.display_leaderboard(interaction, self.current_page + 1, self.cursors)
 
 class LevelingCog(commands.Cog):
     """Cog for managing the leveling system"""
@@ -87,8 +91,8 @@ class LevelingCog(commands.Cog):
                     ephemeral=True
                 )
             
-            current_xp = xp_data['xp']
-            current_level = xp_data['level']
+            current_xp = xp_data.xp
+            current_level = xp_data.level
             next_level_xp = self._calculate_xp_for_level(current_level + 1)
             
             # Create progress bar
@@ -111,16 +115,23 @@ class LevelingCog(commands.Cog):
             )
             
             # Add last message XP gain info if available
-            if 'last_xp_gain' in xp_data and 'last_message' in xp_data:
+            if xp_data.last_xp_gain is not None and xp_data.last_message is not None:
                 embed.add_field(
                     name="Last XP Gain",
-                    value=f"+{xp_data['last_xp_gain']} XP\n```{xp_data['last_message']}```",
+                    value=f"+{xp_data.last_xp_gain} XP\n```{xp_data.last_message}```",
                     inline=False
                 )
             
             # Add rank info
-            leaderboard = await self.bot.db.get_leaderboard(interaction.guild.id)
-            rank = next((i + 1 for i, entry in enumerate(leaderboard) if entry['user_id'] == target.id), None)
+            # Stream the leaderboard and stop at the target instead of loading every row
+            rank = None
+            async with aclosing(self.bot.db.iter_leaderboard(interaction.guild.id)) as leaderboard:
+                position = 0
+                async for entry in leaderboard:
+                    position += 1
+                    if entry.user_id == target.id:
+                        rank = position
+                        break
             
             if rank:
                 embed.add_field(name="Rank", value=f"#{rank}", inline=True)
@@ -133,7 +144,12 @@ class LevelingCog(commands.Cog):
             self.log.error(f"Error in level command: {e}", exc_info=True)
             await interaction.response.send_message("❌ An unexpected error occurred.", ephemeral=True)
     
-    async def display_leaderboard(self, interaction: discord.Interaction, page: int = 1):
+    async def display_leaderboard(
+        self,
+        interaction: discord.Interaction,
+        page: int = 1,
+        cursors: Optional[Dict[int, Optional[str]]] = None
+    ):
         """Handle leaderboard display logic."""
         if not interaction.guild:
             return await interaction.response.send_message("This command can only be used in a server!", ephemeral=True)
@@ -144,9 +160,18 @@ class LevelingCog(commands.Cog):
         try:
             per_page = 10
             offset = (page - 1) * per_page
-            
+            cursors = cursors if cursors is not None else {1: None}
+
+            if page not in cursors:
+                # Jumping straight to a page skips the earlier entries once, buttons seek from there
+                cursors[page] = await self.bot.db.get_leaderboard_cursor(interaction.guild.id, offset=offset)
+
             # Get current page entries
-            entries = await self.bot.db.get_leaderboard_page(interaction.guild.id, per_page + 1, offset)
+            entries = []
+            if page == 1 or cursors[page] is not None:
+                entries, next_cursor = await self.bot.db.get_leaderboard_after(
+                    interaction.guild.id, limit=per_page, cursor=cursors[page]
+                )
             
             if not entries:
                 return await interaction.response.send_message(
@@ -155,9 +180,9 @@ class LevelingCog(commands.Cog):
                 )
             
             # Check if there's a next page
-            has_next = len(entries) > per_page
+            has_next = next_cursor is not None
             if has_next:
-                entries = entries[:per_page]
+                cursors[page + 1] = next_cursor
             
             embed = discord.Embed(
                 title=f"🏆 XP Leaderboard for {interaction.guild.name}",
@@ -165,18 +190,18 @@ class LevelingCog(commands.Cog):
             )
             
             for i, entry in enumerate(entries, start=offset + 1):
-                member = interaction.guild.get_member(entry['user_id'])
+                member = interaction.guild.get_member(entry.user_id)
                 if member:
                     embed.add_field(
                         name=f"#{i} {member}",
-                        value=f"Level {entry['level']} • {entry['xp']:,} XP",
+                        value=f"Level {entry.level} • {entry.xp:,} XP",
                         inline=False
                     )
             
             embed.set_footer(text=f"Page {page}")
             
             # Create and send view
-            view = LeaderboardView(self, page, has_next)
+            view = LeaderboardView(self, page, has_next, cursors)
             if interaction.response.is_done():
                 await interaction.followup.send(embed=embed, view=view)
             else:
@@ -214,19 +239,19 @@ class LevelingCog(commands.Cog):
             
         try:
             # Get current feature settings
-            feature_settings = await self.bot.db.get_feature_settings(interaction.guild.id, "leveling")
+            feature_settings = await self.bot.features.get_feature_settings(interaction.guild.id, FeatureType.LEVELING)
             if not feature_settings or not feature_settings['enabled']:
                 return await interaction.response.send_message("The leveling system is currently disabled!", ephemeral=True)
 
             # Get current options or use defaults
-            options = feature_settings.get('options', {})
+            options = feature_settings.mutable_options()
             options['cooldown'] = seconds
             options['min_xp'] = options.get('min_xp', 15)
             options['max_xp'] = options.get('max_xp', 25)
             options['dm_notifications'] = options.get('dm_notifications', True)
 
             # Update feature settings
-            await self.bot.db.set_feature_settings(interaction.guild.id, "leveling", True, options)
+            await self.bot.features.set_feature_settings(interaction.guild.id, FeatureType.LEVELING, True, options)
             
             await interaction.response.send_message(f"✅ XP cooldown set to {seconds} seconds.")
             
@@ -255,19 +280,19 @@ class LevelingCog(commands.Cog):
             
         try:
             # Get current feature settings
-            feature_settings = await self.bot.db.get_feature_settings(interaction.guild.id, "leveling")
+            feature_settings = await self.bot.features.get_feature_settings(interaction.guild.id, FeatureType.LEVELING)
             if not feature_settings or not feature_settings['enabled']:
                 return await interaction.response.send_message("The leveling system is currently disabled!", ephemeral=True)
                 
             # Get current options or use defaults
-            options = feature_settings.get('options', {})
+            options = feature_settings.mutable_options()
             options['min_xp'] = min_xp
             options['max_xp'] = max_xp
             options['cooldown'] = options.get('cooldown', 60)
             options['dm_notifications'] = options.get('dm_notifications', True)
             
             # Update feature settings
-            await self.bot.db.set_feature_settings(interaction.guild.id, "leveling", True, options)
+            await self.bot.features.set_feature_settings(interaction.guild.id, FeatureType.LEVELING, True, options)
             
             await interaction.response.send_message(f"✅ XP range set to {min_xp}-{max_xp} per message.")
             
@@ -288,19 +313,19 @@ class LevelingCog(commands.Cog):
 
         try:
             # Get current feature settings
-            feature_settings = await self.bot.db.get_feature_settings(interaction.guild.id, "leveling")
+            feature_settings = await self.bot.features.get_feature_settings(interaction.guild.id, FeatureType.LEVELING)
             if not feature_settings or not feature_settings['enabled']:
                 return await interaction.response.send_message("The leveling system is currently disabled!", ephemeral=True)
             
             # Get current options or use defaults
-            options = feature_settings.get('options', {})
+            options = feature_settings.mutable_options()
             options['dm_notifications'] = not options.get('dm_notifications', True)
             options['cooldown'] = options.get('cooldown', 60)
             options['min_xp'] = options.get('min_xp', 15)
             options['max_xp'] = options.get('max_xp', 25)
             
             # Update feature settings
-            await self.bot.db.set_feature_settings(interaction.guild.id, "leveling", True, options)
+            await self.bot.features.set_feature_settings(interaction.guild.id, FeatureType.LEVELING, True, options)
             
             status = "enabled" if options['dm_notifications'] else "disabled"
             await interaction.response.send_message(f"✅ Level-up DM notifications have been {status}.")
@@ -396,6 +421,9 @@ class LevelingCog(commands.Cog):
     async def on_message(self, message: discord.Message):
         if not self._should_track_xp(message):
             return
+        # Skips the settings lookup when leveling is known to be off
+        if message.guild and not self.bot.features.is_enabled(message.guild.id, FeatureType.LEVELING):
+            return
 
         try:
             if not message.guild:
@@ -430,12 +458,9 @@ class LevelingCog(commands.Cog):
             xp_gain = random.randint(min_xp, max_xp)
             
             # Get current XP data
-            xp_data = await self.bot.db.get_user_xp(guild_id, user_id) or {
-                'xp': 0,
-                'level': 0
-            }
+            xp_data = await self.bot.db.get_user_xp(guild_id, user_id) or UserXP(0, 0)
             
-            new_xp = xp_data['xp'] + xp_gain
+            new_xp = xp_data.xp + xp_gain
             new_level = self._calculate_level(new_xp)
             
             # Update XP with message tracking
@@ -452,7 +477,7 @@ class LevelingCog(commands.Cog):
             await self.bot.db.set_xp_cooldown(guild_id, user_id, time.time())
             
             # Handle level up with feature settings check for DM notifications
-            if new_level > xp_data['level'] and isinstance(message.author, discord.Member):
+            if new_level > xp_data.level and isinstance(message.author, discord.Member):
                 await self._handle_level_up(message.guild, message.author, new_level)
                 
         except Exception as e:
@@ -472,8 +497,8 @@ class LevelingCog(commands.Cog):
         """Handle level up rewards and notifications."""
         try:
             # Get feature settings for leveling to check DM notification preference
-            feature_settings = await self.bot.db.get_feature_settings(guild.id, "leveling")
-            if not feature_settings or not feature_settings['enabled']:
+            feature_settings = await self.bot.features.get_feature_settings(guild.id, FeatureType.LEVELING)
+            if not feature_settings['enabled']:
                 return
 
             options = feature_settings['options']
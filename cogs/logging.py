@@ -7,6 +7,10 @@ from discord.ext import commands
 from discord.app_commands import Choice
 import logging
 
+from utils.features import FeatureType
+from utils.paginator import CursorPaginator
+from utils.records import LogEntry
+
 # Define EventSelect and EventView outside the command
 class EventSelect(discord.ui.Select):
     def __init__(self, options: List[str], placeholder: str):
@@ -60,16 +64,21 @@ class LoggingCog(commands.Cog):
         """Called when a message is deleted"""
         if not message.guild or message.author.bot:
             return
+        if not self.bot.features.is_enabled(message.guild.id, FeatureType.LOGGING):
+            return
         channel_ref = f"#{message.channel.name}" if isinstance(message.channel, discord.TextChannel) else "a channel"
         description = f"Message by {message.author.mention} deleted in {channel_ref}"
         if message.content:
-            description += f"\nContent: {message.content[:1900]}"  # Truncate long messages        await self._log_event(message.guild.id, "message_delete", description)
+            description += f"\nContent: {message.content[:1900]}"  # Truncate long messages
+        await self._log_event(message.guild.id, "message_delete", description)
         
     @commands.Cog.listener()
     async def on_message_edit(self, before: discord.Message, after: discord.Message):
         """Called when a message is edited"""
         if not before.guild or before.author.bot or before.content == after.content:
             return
+        if not self.bot.features.is_enabled(before.guild.id, FeatureType.LOGGING):
+            return
         channel_ref = f"#{before.channel.name}" if isinstance(before.channel, discord.TextChannel) else "a channel"
         description = (f"Message by {before.author.mention} edited in {channel_ref}\n"
                       f"Before: {before.content[:900]}\nAfter: {after.content[:900]}")  # Truncate long messages
@@ -81,6 +90,8 @@ class LoggingCog(commands.Cog):
         """Called when a member joins the server"""
         if member.bot:
             return
+        if not self.bot.features.is_enabled(member.guild.id, FeatureType.LOGGING):
+            return
         description = f"{member.mention} joined the server"
         await self._log_event(member.guild.id, "member_join", description)
 
@@ -89,6 +100,8 @@ class LoggingCog(commands.Cog):
         """Called when a member leaves the server"""
         if member.bot:
             return
+        if not self.bot.features.is_enabled(member.guild.id, FeatureType.LOGGING):
+            return
         description = f"{member.mention} left the server"
         await self._log_event(member.guild.id, "member_leave", description)
 
@@ -96,12 +109,16 @@ class LoggingCog(commands.Cog):
     @commands.Cog.listener()
     async def on_member_ban(self, guild: discord.Guild, user: discord.User):
         """Called when a member is banned"""
+        if not self.bot.features.is_enabled(guild.id, FeatureType.LOGGING):
+            return
         description = f"{user.mention} was banned from the server"
         await self._log_event(guild.id, "member_ban", description)
 
     @commands.Cog.listener()
     async def on_member_unban(self, guild: discord.Guild, user: discord.User):
         """Called when a member is unbanned"""
+        if not self.bot.features.is_enabled(guild.id, FeatureType.LOGGING):
+            return
         description = f"{user.mention} was unbanned from the server"
         await self._log_event(guild.id, "member_unban", description)
 
@@ -109,12 +126,16 @@ class LoggingCog(commands.Cog):
     @commands.Cog.listener()
     async def on_guild_role_create(self, role: discord.Role):
         """Called when a role is created"""
+        if not self.bot.features.is_enabled(role.guild.id, FeatureType.LOGGING):
+            return
         description = f"Role created: {role.mention}"
         await self._log_event(role.guild.id, "role_create", description)
 
     @commands.Cog.listener()
     async def on_guild_role_delete(self, role: discord.Role):
         """Called when a role is deleted"""
+        if not self.bot.features.is_enabled(role.guild.id, FeatureType.LOGGING):
+            return
         description = f"Role deleted: {role.name}"
         await self._log_event(role.guild.id, "role_delete", description)
 
@@ -122,12 +143,16 @@ class LoggingCog(commands.Cog):
     @commands.Cog.listener()
     async def on_guild_channel_create(self, channel: discord.abc.GuildChannel):
         """Called when a channel is created"""
+        if not self.bot.features.is_enabled(channel.guild.id, FeatureType.LOGGING):
+            return
         description = f"Channel created: {channel.mention}"
         await self._log_event(channel.guild.id, "channel_create", description)
 
     @commands.Cog.listener()
     async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
         """Called when a channel is deleted"""
+        if not self.bot.features.is_enabled(channel.guild.id, FeatureType.LOGGING):
+            return
         description = f"Channel deleted: #{channel.name}"
         await self._log_event(channel.guild.id, "channel_delete", description)
 
@@ -143,23 +168,20 @@ class LoggingCog(commands.Cog):
 
     async def _check_logging_enabled(self, guild_id: int) -> bool:
         """Check if logging feature is enabled"""
-        feature_settings = await self.bot.db.get_feature_settings(guild_id, "logging")
-        return bool(feature_settings and feature_settings['enabled'])
+        feature_settings = await self.bot.features.get_feature_settings(guild_id, FeatureType.LOGGING)
+        return bool(feature_settings['enabled'])
 
     async def _log_event(self, guild_id: int, event_type: str, description: str):
         """Log an event if logging is enabled and event type is configured"""
         try:
-            feature_settings = await self.bot.db.get_feature_settings(guild_id, "logging")
-            if not feature_settings or not feature_settings['enabled']:
+            feature_settings = await self.bot.features.get_feature_settings(guild_id, FeatureType.LOGGING)
+            if not feature_settings.enabled:
                 return
 
-            options = feature_settings['options']
-            enabled_events = options.get('events', [])
-            if event_type not in enabled_events:
+            if event_type not in feature_settings.events:
                 return
 
-            channel_id = options.get('channel_id')
-            if not channel_id:
+            if not feature_settings.channel_id:
                 return
 
             # Insert the log entry
@@ -202,22 +224,26 @@ class LoggingCog(commands.Cog):
                         await channel.send("🔍 Testing logging channel permissions...", delete_after=0)
                         
                         # Get current feature settings
-                        settings = await self.bot.db.get_feature_settings(interaction.guild.id, "logging")
-                        current_events = settings.get('options', {}).get('events', []) if settings else [
+                        settings = await self.bot.features.get_feature_settings(interaction.guild.id, FeatureType.LOGGING)
+                        # The stored list keeps the user's order, settings.events is only for lookups
+                        default_events = [
                             "message_delete", "message_edit", 
                             "member_join", "member_leave", 
                             "member_ban", "member_unban",
                             "whisper_create", "whisper_close",
                             "whisper_delete"
                         ]
+                        current_events = (
+                            list(settings.options.get('events', default_events)) if settings else default_events
+                        )
                         
                         if not interaction.guild:
                             return await interaction.response.send_message("This command can only be used in a server!", ephemeral=True)
                         
                         # Save settings using feature settings method
-                        await self.bot.db.set_feature_settings(
+                        await self.bot.features.set_feature_settings(
                             interaction.guild.id,
-                            "logging",
+                            FeatureType.LOGGING,
                             True,
                             {
                                 'channel_id': channel.id,
@@ -256,26 +282,29 @@ class LoggingCog(commands.Cog):
                     return await interaction.followup.send("No events selected!", ephemeral=True)
                     
                 try:
-                    settings = await self.bot.db.get_feature_settings(interaction.guild.id, "logging")
-                    current_events = settings.get('options', {}).get('events', []) if settings else []
+                    settings = await self.bot.features.get_feature_settings(interaction.guild.id, FeatureType.LOGGING)
+                    current_events = settings.options.get('events', []) if settings else []
                     channel_id = settings.get('options', {}).get('channel_id') if settings else 0
                     
                     # Ensure current_events is a list
                     if isinstance(current_events, str):
                         current_events = [current_events]
+                    current_events = list(current_events)
                     
                     # Update events list
                     if type == "enable":
-                        # Combine lists and remove duplicates using set
-                        new_events = list(set(current_events + list(view.selected_events)))
+                        # Append newly selected events, keeping the stored order
+                        new_events = current_events + [
+                            e for e in dict.fromkeys(view.selected_events) if e not in current_events
+                        ]
                     else:
                         # Remove selected events from current events
                         new_events = [e for e in current_events if e not in view.selected_events]
                     
                     # Save updated settings
-                    await self.bot.db.set_feature_settings(
+                    await self.bot.features.set_feature_settings(
                         interaction.guild.id,
-                        "logging",
+                        FeatureType.LOGGING,
                         True,
                         {
                             'channel_id': channel_id,
@@ -322,64 +351,38 @@ class LoggingCog(commands.Cog):
             if not interaction.guild:
                 return await interaction.response.send_message("This command can only be used in a server!", ephemeral=True)
             
-            # Use the proper get_logs_filtered method
-            logs = await self.bot.db.get_logs_filtered(
-                interaction.guild.id,
-                type,  # event_type
-                days   # since_days
-            )
-            
-            if not logs:
-                return await interaction.response.send_message("No logs found matching the filters!", ephemeral=True)
-            
-            # Filter by user if specified
-            if user:
-                logs = [log for log in logs if str(user.id) in log['description']]
-            
-            # Limit results
-            logs = logs[:limit]
-            
-            # Create embed pages
-            embeds = []
-            for i in range(0, len(logs), 5):
+            guild = interaction.guild
+            search = str(user.id) if user else None
+
+            async def fetch(cursor: Optional[str], page_size: int):
+                return await self.bot.db.get_logs_after(
+                    guild.id, type, days, search, limit=page_size, cursor=cursor
+                )
+
+            def render(logs: List[LogEntry], page: int) -> discord.Embed:
                 embed = discord.Embed(
-                    title=f"📋 Logs for {interaction.guild.name}",
+                    title=f"📋 Logs for {guild.name}",
                     color=discord.Color.blue()
                 )
-                
-                chunk = logs[i:i+5]
-                for log in chunk:
+                for log in logs:
                     embed.add_field(
-                        name=f"{log['event_type']} • {discord.utils.format_dt(log['timestamp'], 'R')}",
-                        value=log['description'],
+                        name=f"{log.event_type} • {discord.utils.format_dt(log.timestamp, 'R')}",
+                        value=log.description,
                         inline=False
                     )
-                
-                embed.set_footer(text=f"Page {i//5 + 1}/{(len(logs)-1)//5 + 1}")
-                embeds.append(embed)
-            
-            # Create pagination view
-            class LogPaginator(discord.ui.View):
-                def __init__(self, embeds: List[discord.Embed]):
-                    super().__init__(timeout=180)
-                    self.embeds = embeds
-                    self.current = 0
-                    
-                @discord.ui.button(label="◀️", style=discord.ButtonStyle.gray)
-                async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
-                    self.current = max(0, self.current - 1)
-                    await interaction.response.edit_message(embed=self.embeds[self.current])
-                    
-                @discord.ui.button(label="▶️", style=discord.ButtonStyle.gray)
-                async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
-                    self.current = min(len(self.embeds) - 1, self.current + 1)
-                    await interaction.response.edit_message(embed=self.embeds[self.current])
-            
-            # Send first page with pagination if needed
-            if len(embeds) > 1:
-                await interaction.response.send_message(embed=embeds[0], view=LogPaginator(embeds))
+                embed.set_footer(text=f"Page {page}")
+                return embed
+
+            # Pages are fetched on demand, each one seeking from the previous page's cursor
+            paginator = CursorPaginator(fetch, render, per_page=5, max_entries=limit)
+            embed = await paginator.start()
+            if embed is None:
+                return await interaction.response.send_message("No logs found matching the filters!", ephemeral=True)
+
+            if paginator.needs_buttons:
+                await interaction.response.send_message(embed=embed, view=paginator)
             else:
-                await interaction.response.send_message(embed=embeds[0])
+                await interaction.response.send_message(embed=embed)
                 
         except Exception as e:
             self.log.error(f"Error viewing logs: {e}", exc_info=True)
@@ -188,7 +188,7 @@ class ModerationCog(commands.Cog):
             await user.kick(reason=reason)
             
             await self.bot.db.insert_mod_action(
-                ctx.guild,
+                ctx.guild.id,
                 user.id,
                 "kick",
                 reason,
@@ -233,7 +233,7 @@ class ModerationCog(commands.Cog):
             await user.timeout(until, reason=reason)
             
             await self.bot.db.insert_mod_action(
-                ctx.guild,
+                ctx.guild.id,
                 user.id,
                 "timeout",
                 f"{reason} (Duration: {duration} minutes)",
@@ -268,7 +268,7 @@ class ModerationCog(commands.Cog):
             
         try:
             await self.bot.db.insert_mod_action(
-                ctx.guild,
+                ctx.guild.id,
                 user.id,
                 "warn",
                 reason,
@@ -417,7 +417,7 @@ class ModerationCog(commands.Cog):
             await channel.edit(slowmode_delay=seconds)
             
             await self.bot.db.insert_mod_action(
-                ctx.guild,
+                ctx.guild.id,
                 ctx.author.id,
                 "slowmode",
                 f"Set slowmode to {seconds}s in #{channel.name}",
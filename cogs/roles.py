@@ -83,7 +83,7 @@ class RolesCog(commands.Cog):
                 FeatureType.AUTOROLES
             )
             
-            roles = settings['options'].get('roles', [])
+            roles = list(settings['options'].get('roles', ()))
             roles.append(role.id)
             
             await self.bot.features.update_feature_settings(
@@ -110,8 +110,17 @@ class RolesCog(commands.Cog):
             return await interaction.response.send_message("You need the Manage Roles permission to use this command!", ephemeral=True)
             
         try:
-            # Fix: Pass guild.id instead of guild object
-            await self.bot.db.remove_autorole(interaction.guild.id, role.id)
+            settings = await self.bot.features.get_feature_settings(
+                interaction.guild.id,
+                FeatureType.AUTOROLES
+            )
+            roles = [role_id for role_id in settings['options'].get('roles', ()) if role_id != role.id]
+
+            await self.bot.features.update_feature_settings(
+                interaction.guild.id,
+                FeatureType.AUTOROLES,
+                {'roles': roles}
+            )
             await interaction.response.send_message(f"✅ Removed {role.mention} from auto roles.")
         except Exception as e:
             await interaction.response.send_message(f"❌ Error: {str(e)}", ephemeral=True)
@@ -124,7 +133,8 @@ class RolesCog(commands.Cog):
             return await interaction.response.send_message("This command can only be used in a server!", ephemeral=True)
             
         try:
-            role_ids = await self.bot.db.get_autoroles(interaction.guild.id)
+            settings = await self.bot.features.get_feature_settings(interaction.guild.id, FeatureType.AUTOROLES)
+            role_ids = settings['options'].get('roles', ())
             if not role_ids:
                 return await interaction.response.send_message("No auto roles set up!", ephemeral=True)
                 
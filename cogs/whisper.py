@@ -6,6 +6,8 @@ from typing import Optional
 from datetime import datetime
 import uuid
 
+from utils.features import FeatureType
+
 class WhisperCog(commands.Cog):
     """Cog for managing whisper/ticket threads"""
     
@@ -22,7 +24,7 @@ class WhisperCog(commands.Cog):
     
     async def _get_whisper_channel(self, guild_id: int) -> Optional[discord.TextChannel]:
         """Get the configured whisper channel"""
-        feature_settings = await self.bot.db.get_feature_settings(guild_id, "whispers")
+        feature_settings = await self.bot.features.get_feature_settings(guild_id, FeatureType.WHISPERS)
         if not feature_settings or not feature_settings['enabled']:
             return None
         
@@ -41,7 +43,7 @@ class WhisperCog(commands.Cog):
             return await interaction.response.send_message("This command can only be used in a server!", ephemeral=True)
 
         # Check if whispers are enabled and get settings in one step
-        feature_settings = await self.bot.db.get_feature_settings(interaction.guild.id, "whispers")
+        feature_settings = await self.bot.features.get_feature_settings(interaction.guild.id, FeatureType.WHISPERS)
         if not feature_settings or not feature_settings['enabled']:
             return await interaction.response.send_message(
                 "❌ Whisper system is currently disabled. An admin can enable it with `/config`.",
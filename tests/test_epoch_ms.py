@@ -0,0 +1,96 @@
+"""Times stored as epoch milliseconds: the legacy migration and NOW_MS must be exact"""
+from datetime import datetime, timedelta, timezone
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from utils.db_manager import DBManager, _text_to_ms
+from utils.queries import NOW_MS
+from utils.records import epoch_ms
+
+# 2024-01-06 10:00:00 UTC
+JAN_6 = 1704535200000
+
+
+def _ms(text: str) -> int:
+    value = datetime.fromisoformat(text).replace(tzinfo=timezone.utc)
+    return int(value.timestamp()) * 1000
+
+
+class TextToMsTest(unittest.TestCase):
+    def test_whole_seconds_are_exact(self):
+        conn = sqlite3.connect(":memory:")
+        start = datetime(2024, 1, 6, 10, 0, 0)
+        for offset in range(0, 86400 * 3, 997):
+            text = f"{start + timedelta(seconds=offset):%Y-%m-%d %H:%M:%S}"
+            value = conn.execute(f"SELECT {_text_to_ms('?')}", (text,)).fetchone()[0]
+            self.assertEqual(value, _ms(text), text)
+
+    def test_known_value(self):
+        conn = sqlite3.connect(":memory:")
+        value = conn.execute(f"SELECT {_text_to_ms('?')}", ("2024-01-06 10:00:00",)).fetchone()[0]
+        self.assertEqual(value, JAN_6)
+
+    def test_now_ms_matches_clock(self):
+        conn = sqlite3.connect(":memory:")
+        before = epoch_ms(datetime.now(timezone.utc))
+        now = conn.execute(f"SELECT {NOW_MS}").fetchone()[0]
+        after = epoch_ms(datetime.now(timezone.utc))
+        self.assertIsInstance(now, int)
+        self.assertTrue(before <= now <= after)
+
+    def test_epoch_seconds(self):
+        self.assertEqual(epoch_ms(1704535200.123), JAN_6 + 123)
+        self.assertEqual(epoch_ms(JAN_6 + 1), JAN_6 + 1)
+
+
+class MigrationTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "legacy.db")
+        # Schema of the current version, then rows as older versions stored them
+        db = DBManager(self.path, read_pool_size=0, optimize_interval=0, checkpoint_interval=0)
+        await db.init()
+        await db.close()
+        conn = sqlite3.connect(self.path)
+        conn.execute("INSERT INTO guilds (guild_id, created_at) VALUES (1, '2024-01-06 10:00:00')")
+        conn.execute(
+            "INSERT INTO whispers (guild_id, whisper_id, user_id, thread_id, created_at, closed_at) "
+            "VALUES (1, 'w', 2, 3, '2024-01-06 10:00:00', '2024-01-06 10:00:01')"
+        )
+        conn.execute("INSERT INTO xp (guild_id, user_id, last_xp_at) VALUES (1, 2, 1704535200.123)")
+        conn.execute(
+            "CREATE TABLE logs (id INTEGER PRIMARY KEY AUTOINCREMENT, guild_id INTEGER, "
+            "event_type TEXT, description TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)"
+        )
+        conn.execute(
+            "INSERT INTO logs (guild_id, event_type, description, timestamp) "
+            "VALUES (1, 'member_join', 'x', '2024-01-06 10:00:00')"
+        )
+        conn.execute("PRAGMA user_version = 0")
+        conn.commit()
+        conn.close()
+
+    async def asyncTearDown(self):
+        self.dir.cleanup()
+
+    async def test_migrated_times_are_exact(self):
+        db = DBManager(self.path, read_pool_size=0, optimize_interval=0, checkpoint_interval=0)
+        await db.init()
+        try:
+            conn = db.connection
+            async with conn.execute("SELECT created_at FROM guilds WHERE guild_id = 1") as cursor:
+                self.assertEqual((await cursor.fetchone())[0], JAN_6)
+            async with conn.execute("SELECT created_at, closed_at FROM whispers") as cursor:
+                self.assertEqual(tuple(await cursor.fetchone()), (JAN_6, JAN_6 + 1000))
+            async with conn.execute("SELECT last_xp_at FROM xp") as cursor:
+                self.assertEqual((await cursor.fetchone())[0], JAN_6 + 123)
+            logs = await db.get_logs(1)
+            self.assertEqual([epoch_ms(entry.timestamp) for entry in logs], [JAN_6])
+        finally:
+            await db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""GuildPurger: chunked deletes, resuming after a restart and cancellation"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from utils.db_manager import DBManager
+
+USERS = 10
+
+
+def _open(path: str) -> DBManager:
+    return DBManager(path, read_pool_size=0, optimize_interval=0, checkpoint_interval=0)
+
+
+class GuildPurgeTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "purge.db")
+        self.db = _open(self.path)
+        await self.db.init()
+        for guild_id in (1, 2):
+            await self._fill(guild_id)
+
+    async def asyncTearDown(self):
+        if self.db._conn is not None:
+            await self.db.close()
+        self.dir.cleanup()
+
+    async def _fill(self, guild_id: int) -> None:
+        await self.db.add_guild(guild_id)
+        for user_id in range(USERS):
+            await self.db.update_user_activity(guild_id, user_id)
+            await self.db.update_user_xp(guild_id, user_id, 100 + user_id, 1)
+            await self.db.add_log(guild_id, "member_join", str(user_id))
+        await self.db.set_feature_settings(guild_id, "leveling", True, {"cooldown": 5, "xp": 10})
+
+    async def _count(self, table: str, guild_id: int) -> int:
+        async with self.db.connection.execute(
+            f"SELECT count(*) FROM {table} WHERE guild_id = ?", (guild_id,)
+        ) as cursor:
+            return (await cursor.fetchone())[0]
+
+    async def _wait_for(self, condition, timeout: float = 5.0) -> None:
+        async with asyncio.timeout(timeout):
+            while not condition():
+                await asyncio.sleep(0.01)
+
+    async def test_purge_deletes_the_guild_in_chunks(self):
+        self.db.purger.chunk_size = 3
+        self.db.purger.pause = 0
+        await self.db.delete_guild_data(1)
+
+        for table in ("guilds", "users", "xp", "feature_settings", "feature_options", "guild_purges"):
+            self.assertEqual(await self._count(table, 1), 0, table)
+        self.assertEqual(await self.db.get_logs(1, limit=-1), [])
+        # Users, xp and logs need several chunks each
+        self.assertGreater(self.db.purger.chunks, len(self.db.purger.STEPS) + 6)
+        self.assertEqual(self.db.purger.purged, 1)
+
+        # Other guilds are untouched
+        self.assertEqual(await self._count("users", 2), USERS)
+        self.assertEqual(await self._count("xp", 2), USERS)
+        self.assertEqual(len(await self.db.get_logs(2, limit=-1)), USERS)
+        self.assertIsNotNone(await self.db.get_feature_settings(2, "leveling"))
+
+    async def test_recorded_purge_resumes_at_its_step(self):
+        await self.db.close()
+        # A purge that was interrupted after the users step
+        conn = sqlite3.connect(self.path)
+        conn.execute("INSERT INTO guild_purges (guild_id, step) VALUES (1, 'xp')")
+        conn.commit()
+        conn.close()
+
+        self.db = _open(self.path)
+        await self.db.init()
+        await self._wait_for(lambda: self.db.purger.purged == 1)
+
+        self.assertEqual(await self._count("xp", 1), 0)
+        self.assertEqual(await self._count("feature_settings", 1), 0)
+        self.assertEqual(await self._count("guilds", 1), 0)
+        self.assertEqual(await self._count("guild_purges", 1), 0)
+        # Steps before the recorded one are not repeated
+        self.assertEqual(await self._count("users", 1), USERS)
+        self.assertEqual(len(await self.db.get_logs(1, limit=-1)), USERS)
+
+    async def test_cancel_stops_between_chunks(self):
+        self.db.purger.chunk_size = 2
+        self.db.purger.pause = 0.05
+        done = await self.db.purger.schedule(1)
+        await self._wait_for(lambda: self.db.purger.chunks >= 1)
+
+        self.assertTrue(await self.db.cancel_guild_purge(1))
+        self.assertFalse(await done)
+        self.assertFalse(await self.db.cancel_guild_purge(1))
+        await self._wait_for(lambda: self.db.purger.current is None)
+
+        self.assertEqual(await self._count("guild_purges", 1), 0)
+        self.assertEqual(await self._count("guilds", 1), 1)
+        self.assertEqual(await self._count("users", 1), USERS)
+        remaining = len(await self.db.get_logs(1, limit=-1))
+        self.assertTrue(0 < remaining < USERS, remaining)
+        self.assertEqual(self.db.purger.purged, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""Weekly log partitions: the legacy migration only creates weeks that hold rows"""
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from utils.db_manager import DBManager
+
+# Sparse history: years apart, two rows in the same week (Monday 2024-01-01)
+LEGACY_ROWS = [
+    "2020-03-04 12:00:00",
+    "2022-07-10 23:59:59",
+    "2024-01-01 00:00:00",
+    "2024-01-07 18:30:00",
+]
+
+
+class LegacyLogMigrationTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "legacy.db")
+        db = DBManager(self.path, read_pool_size=0, optimize_interval=0, checkpoint_interval=0)
+        await db.init()
+        await db.close()
+        conn = sqlite3.connect(self.path)
+        conn.execute("INSERT INTO guilds (guild_id) VALUES (1)")
+        conn.execute(
+            "CREATE TABLE logs (id INTEGER PRIMARY KEY AUTOINCREMENT, guild_id INTEGER, "
+            "event_type TEXT, description TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)"
+        )
+        conn.executemany(
+            "INSERT INTO logs (guild_id, event_type, description, timestamp) VALUES (1, 'member_join', ?, ?)",
+            [(str(index), timestamp) for index, timestamp in enumerate(LEGACY_ROWS)]
+        )
+        conn.commit()
+        conn.close()
+
+    async def asyncTearDown(self):
+        self.dir.cleanup()
+
+    async def test_only_weeks_with_rows_become_partitions(self):
+        db = DBManager(self.path, read_pool_size=0, optimize_interval=0, checkpoint_interval=0)
+        await db.init()
+        try:
+            self.assertEqual(
+                db.log_partitions.tables(),
+                ["logs_20240101", "logs_20220704", "logs_20200302"]
+            )
+            async with db.connection.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name GLOB 'logs*'"
+            ) as cursor:
+                self.assertEqual((await cursor.fetchone())[0], 3)
+            logs = await db.get_logs(1, limit=-1)
+            self.assertEqual([entry.description for entry in logs], ["3", "2", "1", "0"])
+        finally:
+            await db.close()
+
+    async def test_new_rows_continue_the_id_sequence(self):
+        db = DBManager(self.path, read_pool_size=0, optimize_interval=0, checkpoint_interval=0)
+        await db.init()
+        try:
+            await db.add_log(1, "member_leave", "new")
+            logs = await db.get_logs(1, limit=-1)
+            self.assertEqual(len({entry.id for entry in logs}), len(LEGACY_ROWS) + 1)
+        finally:
+            await db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""PrioritySemaphore: class ordering, aging and cancellation of waiters"""
+import asyncio
+import unittest
+
+from utils.priority import Priority, PrioritySemaphore, current_priority, db_priority
+
+
+class PrioritySemaphoreTest(unittest.IsolatedAsyncioTestCase):
+    async def _queue(self, semaphore, order, *waiters):
+        """Start a task per (name, priority) that records its turn, once all are waiting"""
+        async def take(name, priority):
+            async with semaphore.hold(priority):
+                order.append(name)
+
+        tasks = []
+        for name, priority in waiters:
+            tasks.append(asyncio.create_task(take(name, priority)))
+            await asyncio.sleep(0)
+        return tasks
+
+    async def test_free_slot_is_taken_at_once(self):
+        semaphore = PrioritySemaphore(2, aging_ms=0)
+        await semaphore.acquire(Priority.BACKGROUND)
+        await semaphore.acquire(Priority.BACKGROUND)
+        self.assertTrue(semaphore.locked())
+        semaphore.release()
+        self.assertFalse(semaphore.locked())
+
+    async def test_waiters_are_served_by_class_then_arrival(self):
+        semaphore = PrioritySemaphore(1, aging_ms=0)
+        order = []
+        await semaphore.acquire()
+        tasks = await self._queue(
+            semaphore, order,
+            ("background", Priority.BACKGROUND),
+            ("event 1", Priority.EVENT),
+            ("interactive", Priority.INTERACTIVE),
+            ("event 2", Priority.EVENT),
+        )
+        self.assertEqual(semaphore.stats()["waiting"], {"interactive": 1, "event": 2, "background": 1})
+        semaphore.release()
+        await asyncio.gather(*tasks)
+        self.assertEqual(order, ["interactive", "event 1", "event 2", "background"])
+        self.assertFalse(semaphore.locked())
+
+    async def test_priority_defaults_to_the_task_class(self):
+        semaphore = PrioritySemaphore(1, aging_ms=0)
+        order = []
+
+        async def take(name, priority):
+            with db_priority(priority):
+                self.assertEqual(current_priority(), priority)
+                async with semaphore.hold():
+                    order.append(name)
+
+        await semaphore.acquire()
+        tasks = [asyncio.create_task(take("background", Priority.BACKGROUND))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(take("interactive", Priority.INTERACTIVE)))
+        await asyncio.sleep(0)
+        semaphore.release()
+        await asyncio.gather(*tasks)
+        self.assertEqual(order, ["interactive", "background"])
+        self.assertEqual(current_priority(), Priority.EVENT)
+
+    async def test_long_waiters_overtake_better_classes(self):
+        semaphore = PrioritySemaphore(1, aging_ms=10)
+        order = []
+        await semaphore.acquire()
+        tasks = await self._queue(semaphore, order, ("background", Priority.BACKGROUND))
+        # Three aging steps move it ahead of a fresh interactive waiter
+        await asyncio.sleep(0.035)
+        tasks += await self._queue(semaphore, order, ("interactive", Priority.INTERACTIVE))
+        semaphore.release()
+        await asyncio.gather(*tasks)
+        self.assertEqual(order, ["background", "interactive"])
+        self.assertEqual(semaphore.promoted, 1)
+
+    async def test_cancelled_waiter_leaves_the_queue(self):
+        semaphore = PrioritySemaphore(1, aging_ms=0)
+        order = []
+        await semaphore.acquire()
+        cancelled, waiting = await self._queue(
+            semaphore, order, ("cancelled", Priority.INTERACTIVE), ("event", Priority.EVENT)
+        )
+        cancelled.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await cancelled
+        self.assertEqual(semaphore.stats()["waiting"]["interactive"], 0)
+        semaphore.release()
+        await waiting
+        self.assertEqual(order, ["event"])
+        self.assertFalse(semaphore.locked())
+
+    async def test_woken_then_cancelled_waiter_passes_the_slot_on(self):
+        semaphore = PrioritySemaphore(1, aging_ms=0)
+        order = []
+        await semaphore.acquire()
+        woken, waiting = await self._queue(
+            semaphore, order, ("woken", Priority.INTERACTIVE), ("event", Priority.EVENT)
+        )
+        # The slot is handed over, but the task is cancelled before it resumes
+        semaphore.release()
+        woken.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await woken
+        await asyncio.wait_for(waiting, timeout=1)
+        self.assertEqual(order, ["event"])
+        self.assertFalse(semaphore.locked())
+
+
+if __name__ == "__main__":
+    unittest.main()
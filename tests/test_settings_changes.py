@@ -0,0 +1,127 @@
+"""Settings change log: cross-process cache invalidation through settings_changes"""
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from utils.db_manager import DBManager
+from utils.features import FeatureManager, FeatureType
+from utils.settings_events import FeatureChanged, GuildChanged, SettingsEvent, SettingsReset
+
+
+def _open(path: str, change_log: bool = True) -> DBManager:
+    return DBManager(
+        path, read_pool_size=0, optimize_interval=0, checkpoint_interval=0, settings_change_log=change_log
+    )
+
+
+class SettingsChangesTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "shared.db")
+        # Two processes sharing one database file
+        self.writer = _open(self.path)
+        self.reader = _open(self.path)
+        await self.writer.init()
+        await self.reader.init()
+        self.writer_features = FeatureManager(self.writer)
+        self.reader_features = FeatureManager(self.reader)
+        self.events = []
+        self.reader_features.bus.subscribe(SettingsEvent, self.events.append)
+        # Long intervals, the tests poll by hand
+        self.assertTrue(await self.reader_features.watch(3600))
+        self.assertTrue(await self.writer_features.watch(3600))
+
+    async def asyncTearDown(self):
+        for features in (self.reader_features, self.writer_features):
+            await features.close()
+        for db in (self.reader, self.writer):
+            if db._conn is not None:
+                await db.close()
+        self.dir.cleanup()
+
+    def _log_rows(self) -> int:
+        conn = sqlite3.connect(self.path)
+        try:
+            return conn.execute("SELECT count(*) FROM settings_changes").fetchone()[0]
+        finally:
+            conn.close()
+
+    async def test_remote_write_invalidates_the_cached_settings(self):
+        before = await self.reader_features.get_feature_settings(1, FeatureType.LOGGING)
+        self.assertFalse(before.enabled)
+
+        await self.writer_features.enable_feature(1, FeatureType.LOGGING)
+        self.assertEqual(await self.reader_features.poll_changes(), 1)
+
+        after = await self.reader_features.get_feature_settings(1, FeatureType.LOGGING)
+        self.assertTrue(after.enabled)
+        self.assertEqual(self.events, [FeatureChanged(1, FeatureType.LOGGING, remote=True)])
+
+    async def test_one_row_per_feature_and_write(self):
+        before = self._log_rows()
+        options = {f"key_{index}": index for index in range(20)}
+        await self.writer.set_feature_settings(1, "logging", True, options)
+        await self.writer.set_feature_enabled(1, "logging", False, {})
+        await self.writer.patch_feature_options(1, "logging", {"key_0": 1, "key_1": 2}, (False, {}))
+        self.assertEqual(self._log_rows() - before, 3)
+
+    async def test_own_writes_are_not_reported_back(self):
+        await self.writer_features.enable_feature(1, FeatureType.LOGGING)
+        writer_events = []
+        self.writer_features.bus.subscribe(SettingsEvent, writer_events.append)
+        self.assertEqual(await self.writer_features.poll_changes(), 0)
+        self.assertEqual(writer_events, [])
+        self.assertEqual(self.writer_features.remote_changes, 0)
+
+    async def test_idle_poll_does_not_read_the_log(self):
+        await self.writer_features.enable_feature(1, FeatureType.LOGGING)
+        await self.reader_features.poll_changes()
+        with mock.patch.object(self.reader, "_fetchall", wraps=self.reader._fetchall) as fetchall:
+            self.assertEqual(await self.reader_features.poll_changes(), 0)
+            fetchall.assert_not_called()
+            # A commit moves PRAGMA data_version, so the next poll reads again
+            await self.writer_features.enable_feature(2, FeatureType.LOGGING)
+            self.assertEqual(await self.reader_features.poll_changes(), 1)
+            fetchall.assert_called_once()
+
+    async def test_pruned_changes_reset_every_cached_guild(self):
+        await self.reader_features.get_feature_settings(1, FeatureType.LOGGING)
+        await self.writer_features.enable_feature(1, FeatureType.LOGGING)
+        # Pruned before the reader polled
+        conn = sqlite3.connect(self.path)
+        conn.execute("DELETE FROM settings_changes")
+        conn.commit()
+        conn.close()
+
+        await self.reader_features.poll_changes()
+        self.assertEqual(self.events, [SettingsReset()])
+        self.assertEqual(len(self.reader_features.cache), 0)
+        self.assertTrue((await self.reader_features.get_feature_settings(1, FeatureType.LOGGING)).enabled)
+
+    async def test_purge_is_reported_for_the_whole_guild(self):
+        await self.writer_features.enable_feature(1, FeatureType.LOGGING)
+        await self.reader_features.poll_changes()
+        self.events.clear()
+
+        await self.writer.delete_guild_data(1)
+        await self.reader_features.poll_changes()
+        self.assertEqual(self.events, [GuildChanged(1, remote=True)])
+
+    async def test_disabled_log_records_nothing(self):
+        db = _open(os.path.join(self.dir.name, "quiet.db"), change_log=False)
+        await db.init()
+        try:
+            features = FeatureManager(db)
+            self.assertFalse(await features.watch(3600))
+            await features.enable_feature(1, FeatureType.LOGGING)
+            self.assertIsNone((await db.get_settings_changes()).cursor)
+            async with db.connection.execute("SELECT count(*) FROM settings_changes") as cursor:
+                self.assertEqual((await cursor.fetchone())[0], 0)
+        finally:
+            await db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""Write-behind queue: merged counters, reads of unflushed writes, retries and draining"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from utils.db_manager import DBManager
+
+
+def _open(path: str) -> DBManager:
+    # A long interval keeps the flush loop out of the way, tests flush explicitly
+    return DBManager(
+        path, write_behind=True, flush_interval_ms=60000, flush_max_ops=1000,
+        read_pool_size=0, optimize_interval=0, checkpoint_interval=0
+    )
+
+
+class WriteBehindTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "queue.db")
+        self.db = _open(self.path)
+        await self.db.init()
+        await self.db.add_guild(1)
+
+    async def asyncTearDown(self):
+        if self.db._conn is not None:
+            await self.db.close()
+        self.dir.cleanup()
+
+    async def _counters(self, user_id: int):
+        async with self.db.connection.execute(
+            "SELECT messages_count, commands_used FROM users WHERE guild_id = 1 AND user_id = ?", (user_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        return tuple(row) if row is not None else None
+
+    async def test_counters_of_one_user_are_merged(self):
+        for _ in range(3):
+            await self.db.update_user_activity(1, 10)
+        await self.db.increment_user_commands(1, 10)
+        await self.db.update_user_activity(1, 11)
+        self.assertEqual(self.db.write_queue.depth, 2)
+        self.assertIsNone(await self._counters(10))
+
+        self.assertEqual(await self.db.write_queue.flush(), 2)
+        self.assertEqual(await self._counters(10), (3, 1))
+        self.assertEqual(await self._counters(11), (1, 0))
+        self.assertEqual(self.db.write_queue.depth, 0)
+
+    async def test_unflushed_feature_write_is_read_back(self):
+        await self.db.set_feature_settings(1, "leveling", True, {"cooldown": 5})
+        await self.db.set_feature_settings(1, "leveling", False, {"cooldown": 9})
+        self.assertEqual(self.db.write_queue.depth, 1)
+
+        settings = await self.db.get_feature_settings(1, "leveling")
+        self.assertFalse(settings.enabled)
+        self.assertEqual(settings.options, {"cooldown": 9})
+        self.assertEqual(await self.db.get_feature_option(1, "leveling", "cooldown"), 9)
+
+        await self.db.write_queue.flush()
+        settings = await self.db.get_feature_settings(1, "leveling")
+        self.assertEqual((settings.enabled, settings.options), (False, {"cooldown": 9}))
+
+    async def test_patch_lands_on_top_of_a_queued_row(self):
+        await self.db.set_feature_settings(1, "leveling", True, {"cooldown": 5, "xp": 10})
+        await self.db.patch_feature_options(1, "leveling", {"xp": 20}, (False, {}))
+        # The queued row was written before the patch, a later flush must not undo it
+        self.assertIsNone(self.db.write_queue.pending_feature(1, "leveling"))
+        await self.db.write_queue.flush()
+        settings = await self.db.get_feature_settings(1, "leveling")
+        self.assertEqual((settings.enabled, settings.options), (True, {"cooldown": 5, "xp": 20}))
+
+    async def test_failed_flush_is_requeued(self):
+        await self.db.update_user_activity(1, 10)
+        await self.db.add_log(1, "member_join", "x")
+        with mock.patch.object(self.db, "_insert_logs", side_effect=RuntimeError("disk full")):
+            with self.assertRaises(RuntimeError), self.assertLogs(self.db.log, "ERROR"):
+                await self.db.write_queue.flush()
+        self.assertEqual(self.db.write_queue.failed_flushes, 1)
+        self.assertEqual(self.db.write_queue.depth, 2)
+        self.assertIsNone(await self._counters(10))
+
+        # Counters queued meanwhile are merged with the failed batch
+        await self.db.update_user_activity(1, 10)
+        self.assertEqual(await self.db.write_queue.flush(), 2)
+        self.assertEqual(await self._counters(10), (2, 0))
+        self.assertEqual(len(await self.db.get_logs(1)), 1)
+
+    async def test_close_drains_the_queue(self):
+        await self.db.update_user_activity(1, 10)
+        await self.db.add_log(1, "member_join", "x")
+        await self.db.close()
+
+        self.db = _open(self.path)
+        await self.db.init()
+        self.assertEqual(await self._counters(10), (1, 0))
+        self.assertEqual([entry.event_type for entry in await self.db.get_logs(1)], ["member_join"])
+
+
+if __name__ == "__main__":
+    unittest.main()
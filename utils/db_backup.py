@@ -0,0 +1,283 @@
+"""Online snapshots of SQLite database files.
+
+Snapshots are taken with SQLite's online backup API from a dedicated read-only
+connection on a worker thread. The copy runs ``pages_per_step`` pages at a time
+and sleeps ``step_delay`` seconds between steps, so the disk is not saturated,
+and the event loop and writer connection are never blocked.
+
+If the database is written by another connection while a step-wise backup is
+running, SQLite restarts the copy on the next step. A busy bot writes all the
+time, so after ``max_restarts`` restarts the rest is copied in a single step.
+In WAL mode that step reads one consistent snapshot and still does not block
+writers.
+
+Snapshots are written to ``<name>.partial`` and renamed once they pass
+``PRAGMA quick_check``, so a file named ``<stem>-YYYYmmdd-HHMMSS.db`` is always
+complete. Only the ``keep`` newest snapshots of a database are kept.
+"""
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+
+class BackupAborted(Exception):
+    """Raised from the progress callback to stop a running copy"""
+
+
+@dataclass
+class BackupReport:
+    """Progress and outcome of one snapshot"""
+    source: str
+    path: str
+    started_at: float
+    pages_copied: int = 0
+    pages_total: int = 0
+    steps: int = 0
+    restarts: int = 0
+    duration_ms: float = 0.0
+    size_bytes: int = 0
+    state: str = "running"  # running, done or failed
+    error: Optional[str] = None
+
+    @property
+    def percent(self) -> float:
+        return 100.0 * self.pages_copied / self.pages_total if self.pages_total else 0.0
+
+    def summary(self) -> str:
+        if self.state == "failed":
+            return f"{self.source} -> {self.path} failed after {self.duration_ms:.0f}ms: {self.error}"
+        return (
+            f"{self.source} -> {self.path}: {self.pages_copied}/{self.pages_total} pages "
+            f"({self.percent:.0f}%) in {self.steps} steps, {self.restarts} restarts, "
+            f"{self.duration_ms:.0f}ms"
+        )
+
+
+def _copy_database(
+    source_path: str,
+    target_path: str,
+    pages_per_step: int,
+    step_delay: float,
+    max_restarts: int,
+    on_step: Callable[[int, int, int], None],
+    abort: threading.Event
+) -> int:
+    """Copy a database file page by page. Runs on a worker thread.
+
+    Returns:
+        How many times the copy was restarted by concurrent writes
+    """
+    source = sqlite3.connect(f"file:{Path(source_path).resolve().as_posix()}?mode=ro", uri=True)
+    target = sqlite3.connect(target_path)
+    restarts = 0
+    remaining_before: Optional[int] = None
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        nonlocal restarts, remaining_before
+        if abort.is_set():
+            raise BackupAborted("backup cancelled")
+        # A step that went through but didn't shrink the rest started over
+        if status == sqlite3.SQLITE_OK and remaining_before is not None and remaining >= remaining_before:
+            restarts += 1
+            if restarts > max_restarts:
+                raise BackupAborted("too many restarts")
+        remaining_before = remaining
+        on_step(total - remaining, total, restarts)
+        if step_delay and remaining:
+            time.sleep(step_delay)
+
+    try:
+        try:
+            source.backup(target, pages=pages_per_step, progress=progress)
+        except BackupAborted:
+            if abort.is_set():
+                raise
+            source.backup(target, pages=-1, progress=progress)
+        # The copy inherits WAL mode, make the snapshot a self-contained file
+        target.execute("PRAGMA journal_mode=DELETE")
+        result = target.execute("PRAGMA quick_check").fetchone()[0]
+        if result != "ok":
+            raise sqlite3.DatabaseError(f"snapshot failed quick_check: {result}")
+    finally:
+        target.close()
+        source.close()
+    return restarts
+
+
+class DatabaseSnapshots:
+    """Takes scheduled snapshots of one database file and prunes old ones.
+
+    Args:
+        db_path: Database file to copy
+        directory: Where snapshots go, defaults to ``backups`` next to the database
+        interval: Seconds between scheduled snapshots, 0 disables the schedule
+        keep: Number of snapshots kept, older ones are deleted after each run
+        pages_per_step: Pages copied per backup step
+        step_delay: Seconds slept between backup steps
+        max_restarts: Restarts tolerated before copying the rest in one step
+        logger: Where progress and results are logged
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        directory: Optional[str] = None,
+        interval: float = 0,
+        keep: int = 7,
+        pages_per_step: int = 256,
+        step_delay: float = 0.01,
+        max_restarts: int = 3,
+        logger: Optional[logging.Logger] = None,
+        history: int = 10
+    ) -> None:
+        self.db_path = db_path
+        self.directory = Path(directory) if directory else Path(db_path).parent / "backups"
+        self.interval = interval
+        self.keep = keep
+        self.pages_per_step = pages_per_step
+        self.step_delay = step_delay
+        self.max_restarts = max_restarts
+        self.log = logger or logging.getLogger("DatabaseSnapshots")
+        self.reports: deque = deque(maxlen=history)
+        self.current: Optional[BackupReport] = None
+        self._lock = asyncio.Lock()
+        self._abort = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def supported(self) -> bool:
+        """In-memory databases can't be opened from a second connection"""
+        return self.db_path != ":memory:"
+
+    def start(self) -> None:
+        """Start the snapshot schedule"""
+        if self.interval > 0 and self.supported and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run(), name="db-backup")
+
+    async def stop(self) -> None:
+        """Stop the schedule and abort a running copy"""
+        self._abort.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        # The copy thread notices the abort at its next step
+        async with self._lock:
+            self._abort.clear()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run()
+
+    def snapshots(self) -> List[Path]:
+        """Complete snapshots of this database, oldest first"""
+        stem = Path(self.db_path).stem
+        pattern = re.compile(rf"{re.escape(stem)}-\d{{8}}-\d{{6}}\.db")
+        return sorted(path for path in self.directory.glob(f"{stem}-*.db") if pattern.fullmatch(path.name))
+
+    def _prune(self) -> List[Path]:
+        snapshots = self.snapshots()
+        removed = snapshots[:-self.keep] if self.keep > 0 else []
+        for path in removed:
+            for suffix in ("", "-wal", "-shm"):
+                path.with_name(path.name + suffix).unlink(missing_ok=True)
+        return removed
+
+    async def run(
+        self,
+        target: Optional[str] = None,
+        progress: Optional[Callable[[BackupReport], None]] = None
+    ) -> BackupReport:
+        """Take a snapshot now. Runs after any snapshot already in progress.
+
+        Args:
+            target: Write to this file instead of a timestamped snapshot, which
+                is then not subject to retention
+            progress: Called on the event loop with the live report after every step
+        """
+        if not self.supported:
+            raise RuntimeError("In-memory databases can't be backed up")
+        async with self._lock:
+            if target is None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+                final = self.directory / f"{Path(self.db_path).stem}-{stamp}.db"
+            else:
+                final = Path(target)
+                final.parent.mkdir(parents=True, exist_ok=True)
+            partial = final.with_name(final.name + ".partial")
+            partial.unlink(missing_ok=True)
+
+            report = self.current = BackupReport(self.db_path, str(final), started_at=time.time())
+            loop = asyncio.get_running_loop()
+            logged = [0]
+
+            def update(copied: int, total: int, restarts: int) -> None:
+                report.pages_copied = copied
+                report.pages_total = total
+                report.restarts = restarts
+                report.steps += 1
+                # Log each quarter of a large copy
+                if total > self.pages_per_step * 4 and report.percent >= logged[0] + 25:
+                    logged[0] = int(report.percent // 25 * 25)
+                    self.log.debug(f"Database backup {report.path}: {logged[0]}%")
+                if progress is not None:
+                    progress(report)
+
+            def on_step(copied: int, total: int, restarts: int) -> None:
+                loop.call_soon_threadsafe(update, copied, total, restarts)
+
+            start = time.perf_counter()
+            try:
+                await asyncio.to_thread(
+                    _copy_database, self.db_path, str(partial), self.pages_per_step,
+                    self.step_delay, self.max_restarts, on_step, self._abort
+                )
+                partial.replace(final)
+                report.size_bytes = final.stat().st_size
+                report.state = "done"
+            except (sqlite3.Error, OSError, BackupAborted) as e:
+                report.state = "failed"
+                report.error = str(e)
+                partial.unlink(missing_ok=True)
+            report.duration_ms = (time.perf_counter() - start) * 1000
+            self.current = None
+            self.reports.append(report)
+
+            if report.state == "done":
+                removed = self._prune() if target is None else []
+                self.log.info(
+                    f"Database backup: {report.summary()}"
+                    + (f", removed {len(removed)} old snapshots" if removed else "")
+                )
+            else:
+                self.log.error(f"Database backup: {report.summary()}")
+            return report
+
+    def stats(self) -> Dict[str, Any]:
+        """The running snapshot's progress and the outcome of the last one"""
+        last = self.reports[-1] if self.reports else None
+        current = self.current
+        return {
+            "interval": self.interval,
+            "keep": self.keep,
+            "snapshots": len(self.snapshots()) if self.supported and self.directory.exists() else 0,
+            "running": round(current.percent, 1) if current else None,
+            "last_run": last.started_at if last else None,
+            "last_state": last.state if last else None,
+            "last_duration_ms": round(last.duration_ms, 2) if last else None,
+            "last_size_bytes": last.size_bytes if last else None,
+            "last_error": last.error if last else None,
+        }
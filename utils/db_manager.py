@@ -1,26 +1,912 @@
 from __future__ import annotations
-from contextlib import asynccontextmanager
-from typing import AsyncIterator, Dict, List, Optional, Any, TypeVar
+from collections import deque
+from contextlib import aclosing, asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Any, Sequence, Tuple, TypeVar, Union
+import asyncio
 import json
 import time
+import uuid
 import logging
 import aiosqlite
 from aiosqlite import Connection, Cursor
 
+from utils.db_backup import BackupReport, DatabaseSnapshots
+from utils.priority import Priority, PrioritySemaphore, set_db_priority
+from utils.queries import NOW_MS, STATEMENTS, QueryRegistry
+from utils.query_metrics import QueryMetrics, format_plan
+from utils.single_flight import SingleFlight
+from utils.records import (
+    DAY_MS, FeatureSettings, GuildFeatureSettings, LeaderboardEntry, LogEntry, NamedFeatureSettings, SettingsChanges,
+    UserXP, cutoff_ms, epoch_ms, now_ms
+)
+from utils.storage import Page, StorageBackend, decode_cursor, encode_cursor, make_page
+
 T = TypeVar('T')
 
-class DBManager:    
-    def __init__(self, db_path: str, logger: Optional[logging.Logger] = None) -> None:
+# Per-connection prepared statement cache, comfortably above the registry size
+STATEMENT_CACHE_SIZE = 256
+
+# Tables behind feature settings reads, writes to them end read sharing
+_FEATURE_TABLES = ("feature_settings", "feature_options")
+
+# Days the settings change log is kept. A process that polls less often than
+# this sees its changes as lost and drops its whole settings cache
+SETTINGS_CHANGES_RETENTION_DAYS = 1
+
+
+# Bumped by migrations that rewrite existing rows, stored in PRAGMA user_version.
+# 1: times stored as epoch milliseconds instead of CURRENT_TIMESTAMP text
+SCHEMA_VERSION = 1
+
+# Time columns per table, all epoch milliseconds. ``logs`` stands for every
+# weekly partition
+TIME_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "guilds": ("created_at", "premium_until"),
+    "users": ("first_seen", "last_seen"),
+    "xp": ("last_xp_at",),
+    "mod_actions": ("created_at",),
+    "whispers": ("created_at", "closed_at"),
+    "guild_purges": ("requested_at",),
+    "logs": ("timestamp",),
+}
+
+# Later than any stored time, starts a newest-first log scan
+_END_OF_TIME = 2 ** 63 - 1
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _text_to_ms(column: str) -> str:
+    """SQL converting a CURRENT_TIMESTAMP text column to epoch milliseconds.
+    Rounded, a truncated product lands 1 ms early"""
+    return f"CAST(ROUND((julianday({column}) - 2440587.5) * 86400000) AS INTEGER)"
+
+
+class WriteBehindQueue:
+    """Buffers hot-path writes and flushes them in a single transaction.
+
+    Counter updates for the same (guild_id, user_id) are merged while they wait,
+    so a burst of messages from one user costs a single upsert at flush time.
+    A flush happens every ``flush_interval_ms`` or as soon as ``max_ops``
+    operations are pending, whichever comes first.
+    """
+
+    def __init__(self, db: DBManager, flush_interval_ms: int = 500, max_ops: int = 500) -> None:
+        self.db = db
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_ops = max_ops
+        # (guild_id, user_id) -> [messages, commands, last_seen]
+        self._counters: Dict[Tuple[int, int], List[Any]] = {}
+        # (guild_id, feature) -> (enabled, options_json); last write wins
+        self._features: Dict[Tuple[int, str], Tuple[bool, str]] = {}
+        self._logs: List[Tuple[int, str, str, int]] = []
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # Stats
+        self.flushes = 0
+        self.flushed_ops = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    @property
+    def depth(self) -> int:
+        """Number of operations waiting to be flushed"""
+        return len(self._counters) + len(self._features) + len(self._logs)
+
+    def start(self) -> None:
+        """Start the background flush loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="db-write-behind")
+
+    async def _run(self) -> None:
+        set_db_priority(Priority.BACKGROUND)
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass  # Already logged by flush(); the batch was re-queued
+
+    def _maybe_wake(self) -> None:
+        if self.depth >= self.max_ops:
+            self._wakeup.set()
+
+    # -------------------- Enqueue --------------------
+
+    def add_activity(self, guild_id: int, user_id: int) -> None:
+        entry = self._counters.setdefault((guild_id, user_id), [0, 0, None])
+        entry[0] += 1
+        entry[2] = now_ms()
+        self._maybe_wake()
+
+    def add_command(self, guild_id: int, user_id: int) -> None:
+        entry = self._counters.setdefault((guild_id, user_id), [0, 0, None])
+        entry[1] += 1
+        self._maybe_wake()
+
+    def add_log(self, guild_id: int, event_type: str, description: str) -> None:
+        self._logs.append((guild_id, event_type, description, now_ms()))
+        self._maybe_wake()
+
+    def set_feature(self, guild_id: int, feature: str, enabled: bool, options_json: str) -> None:
+        # Re-insert so the dict keeps write order
+        self._features.pop((guild_id, feature), None)
+        self._features[(guild_id, feature)] = (enabled, options_json)
+        self._maybe_wake()
+
+    def pending_feature(self, guild_id: int, feature: str) -> Optional[Tuple[bool, str]]:
+        """Get a feature settings write that has not been flushed yet"""
+        return self._features.get((guild_id, feature))
+
+    # -------------------- Flush --------------------
+
+    async def flush(self) -> int:
+        """Write every pending operation in one transaction.
+
+        Returns:
+            The number of operations written
+
+        Raises:
+            aiosqlite.Error: If the transaction fails. The batch is put back
+                on the queue so it is retried by the next flush.
+        """
+        async with self._flush_lock:
+            if not self.depth:
+                return 0
+
+            counters, self._counters = self._counters, {}
+            features, self._features = self._features, {}
+            logs, self._logs = self._logs, []
+            count = len(counters) + len(features) + len(logs)
+
+            start = time.perf_counter()
+            try:
+                async with self.db.transaction() as tr:
+                    if features:
+                        await self.db._executemany(
+                            tr, "guilds.ensure", {(guild_id,) for guild_id, _ in features}
+                        )
+                        await self.db._replace_features(
+                            tr, [(g, f, enabled, options) for (g, f), (enabled, options) in features.items()]
+                        )
+                    if counters:
+                        await self.db._executemany(
+                            tr, "users.add_counters",
+                            [(g, u, last_seen, msgs, cmds) for (g, u), (msgs, cmds, last_seen) in counters.items()]
+                        )
+                    if logs:
+                        await self.db._insert_logs(tr, logs)
+            except BaseException as e:
+                self._requeue(counters, features, logs)
+                if not isinstance(e, asyncio.CancelledError):
+                    self.failed_flushes += 1
+                    self.db.log.error(f"Write-behind flush of {count} operation(s) failed: {e}")
+                raise
+
+            elapsed = (time.perf_counter() - start) * 1000
+            self.flushes += 1
+            self.flushed_ops += count
+            self.last_flush_ms = elapsed
+            self.max_flush_ms = max(self.max_flush_ms, elapsed)
+            self._total_flush_ms += elapsed
+            return count
+
+    def _requeue(self, counters, features, logs) -> None:
+        """Merge a failed batch back in front of anything queued since"""
+        for key, (msgs, cmds, last_seen) in counters.items():
+            entry = self._counters.setdefault(key, [0, 0, None])
+            entry[0] += msgs
+            entry[1] += cmds
+            entry[2] = entry[2] or last_seen
+        for key, value in features.items():
+            self._features.setdefault(key, value)
+        self._logs[:0] = logs
+
+    async def drain(self, timeout: float) -> int:
+        """Stop the flush loop and flush until the queue is empty or the deadline passes.
+
+        Returns:
+            The number of operations that could not be written
+        """
+        if self._task is not None:
+            async with self._flush_lock:  # Don't interrupt a flush in progress
+                self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+        deadline = time.monotonic() + timeout
+        while self.depth:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(self.flush(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            except Exception:
+                await asyncio.sleep(min(0.1, max(0.0, deadline - time.monotonic())))
+
+        dropped = self.depth
+        if dropped:
+            self.db.log.warning(f"Write-behind queue drain timed out, {dropped} operation(s) were not written")
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and flush latency statistics"""
+        return {
+            "depth": self.depth,
+            "flushes": self.flushes,
+            "flushed_ops": self.flushed_ops,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
+
+
+@dataclass(frozen=True)
+class StorageProfile:
+    """A named set of SQLite pragmas applied to every connection at connect time"""
+    name: str
+    synchronous: str
+    cache_size: int         # Negative values are KiB, positive values are pages
+    mmap_size: int          # Bytes, 0 disables memory-mapped I/O
+    temp_store: str
+    wal_autocheckpoint: int  # Pages
+    busy_timeout: int = 5000  # Milliseconds
+
+    async def apply(self, conn: Connection, writer: bool = True) -> None:
+        """Apply the profile to a freshly opened connection"""
+        if writer:
+            # Persistent settings; auto_vacuum only takes effect on a new file
+            await conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            await conn.execute("PRAGMA journal_mode=WAL")
+            await conn.execute(f"PRAGMA wal_autocheckpoint={self.wal_autocheckpoint}")
+        await conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        await conn.execute(f"PRAGMA cache_size={self.cache_size}")
+        await conn.execute(f"PRAGMA mmap_size={self.mmap_size}")
+        await conn.execute(f"PRAGMA temp_store={self.temp_store}")
+        await conn.execute(f"PRAGMA busy_timeout={self.busy_timeout}")
+
+
+STORAGE_PROFILES: Dict[str, StorageProfile] = {
+    # fsync on every commit, survives power loss
+    "durable": StorageProfile(
+        name="durable",
+        synchronous="FULL",
+        cache_size=-8000,
+        mmap_size=0,
+        temp_store="DEFAULT",
+        wal_autocheckpoint=1000
+    ),
+    # WAL + NORMAL can lose the last commits on power loss, never corrupts
+    "balanced": StorageProfile(
+        name="balanced",
+        synchronous="NORMAL",
+        cache_size=-16000,
+        mmap_size=64 * 1024 * 1024,
+        temp_store="MEMORY",
+        wal_autocheckpoint=1000
+    ),
+    "throughput": StorageProfile(
+        name="throughput",
+        synchronous="NORMAL",
+        cache_size=-64000,
+        mmap_size=256 * 1024 * 1024,
+        temp_store="MEMORY",
+        wal_autocheckpoint=10000
+    ),
+}
+
+
+@dataclass
+class MaintenanceReport:
+    """What a single maintenance run did and how long it took"""
+    started_at: float
+    duration_ms: float = 0.0
+    steps: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def summary(self) -> str:
+        parts = [
+            f"{name} ({', '.join(f'{k}={v}' for k, v in result.items())})"
+            for name, result in self.steps.items()
+        ]
+        return f"{'; '.join(parts) or 'nothing to do'} in {self.duration_ms:.1f}ms"
+
+
+class StorageMaintenance:
+    """Runs SQLite housekeeping in the background, off the hot path.
+
+    Every ``checkpoint_interval`` seconds the WAL is checkpointed in PASSIVE
+    mode, which never blocks readers or writers. Every ``optimize_interval``
+    seconds ``PRAGMA optimize`` refreshes planner statistics and up to
+    ``vacuum_pages`` free pages are released with an incremental vacuum, and
+    settings changes older than ``SETTINGS_CHANGES_RETENTION_DAYS`` are pruned.
+    """
+
+    def __init__(
+        self,
+        db: DBManager,
+        optimize_interval: float = 3600,
+        checkpoint_interval: float = 300,
+        vacuum_pages: int = 512,
+        history: int = 20
+    ) -> None:
+        self.db = db
+        self.optimize_interval = optimize_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.vacuum_pages = vacuum_pages
+        self.reports: deque = deque(maxlen=history)
+        self._last_optimize = time.monotonic()
+        self._last_checkpoint = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the background maintenance loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="db-maintenance")
+
+    async def stop(self) -> None:
+        """Stop the background maintenance loop"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        intervals = [i for i in (self.optimize_interval, self.checkpoint_interval) if i > 0]
+        if not intervals:
+            return
+        tick = min(intervals)
+        while True:
+            await asyncio.sleep(tick)
+            now = time.monotonic()
+            optimize = 0 < self.optimize_interval <= now - self._last_optimize
+            checkpoint = 0 < self.checkpoint_interval <= now - self._last_checkpoint
+            if optimize or checkpoint:
+                await self.run(optimize=optimize, vacuum=optimize, checkpoint=checkpoint)
+
+    async def run(self, optimize: bool = True, vacuum: bool = True, checkpoint: bool = True) -> MaintenanceReport:
+        """Run the requested maintenance steps now and record a report"""
+        report = MaintenanceReport(started_at=time.time())
+        start = time.perf_counter()
+        conn = self.db.connection
+        try:
+            # Hold the write lock so steps never land inside a transaction
+            async with self.db._write_lock.hold(Priority.BACKGROUND):
+                if optimize:
+                    step = time.perf_counter()
+                    statement = self.db.queries["settings_changes.prune"]
+                    async with conn.execute(
+                        statement.sql, (cutoff_ms(SETTINGS_CHANGES_RETENTION_DAYS),)
+                    ) as cursor:
+                        pruned = cursor.rowcount
+                    await conn.commit()
+                    report.steps["settings_changes"] = {
+                        "pruned": pruned,
+                        "ms": round((time.perf_counter() - step) * 1000, 2)
+                    }
+
+                    step = time.perf_counter()
+                    await conn.execute("PRAGMA optimize")
+                    report.steps["optimize"] = {"ms": round((time.perf_counter() - step) * 1000, 2)}
+                    self._last_optimize = time.monotonic()
+
+                if vacuum:
+                    step = time.perf_counter()
+                    async with conn.execute("PRAGMA auto_vacuum") as cursor:
+                        mode = (await cursor.fetchone())[0]
+                    if mode == 2:  # INCREMENTAL
+                        async with conn.execute("PRAGMA freelist_count") as cursor:
+                            before = (await cursor.fetchone())[0]
+                        if before:
+                            # execute() only steps the pragma once (one page), executescript runs it to completion
+                            await conn.executescript(f"PRAGMA incremental_vacuum({self.vacuum_pages});")
+                            async with conn.execute("PRAGMA freelist_count") as cursor:
+                                after = (await cursor.fetchone())[0]
+                            report.steps["incremental_vacuum"] = {
+                                "pages_freed": before - after,
+                                "pages_left": after,
+                                "ms": round((time.perf_counter() - step) * 1000, 2)
+                            }
+                    else:
+                        report.steps["incremental_vacuum"] = {"skipped": "auto_vacuum is not INCREMENTAL"}
+
+                if checkpoint:
+                    step = time.perf_counter()
+                    async with conn.execute("PRAGMA wal_checkpoint(PASSIVE)") as cursor:
+                        busy, log_pages, checkpointed = await cursor.fetchone()
+                    report.steps["wal_checkpoint"] = {
+                        "busy": busy,
+                        "wal_pages": log_pages,
+                        "checkpointed": checkpointed,
+                        "ms": round((time.perf_counter() - step) * 1000, 2)
+                    }
+                    self._last_checkpoint = time.monotonic()
+        except aiosqlite.Error as e:
+            report.error = str(e)
+            self.db.log.error(f"Database maintenance failed: {e}")
+
+        report.duration_ms = (time.perf_counter() - start) * 1000
+        self.reports.append(report)
+        if report.error is None:
+            # Checkpoint-only runs are frequent, keep them out of the INFO log
+            level = logging.INFO if optimize or vacuum else logging.DEBUG
+            self.db.log.log(level, f"Database maintenance: {report.summary()}")
+        return report
+
+    def stats(self) -> Dict[str, Any]:
+        """Summary of the most recent maintenance run"""
+        last = self.reports[-1] if self.reports else None
+        return {
+            "runs": len(self.reports),
+            "last_run": last.started_at if last else None,
+            "last_duration_ms": round(last.duration_ms, 2) if last else None,
+            "last_steps": last.steps if last else None,
+            "last_error": last.error if last else None,
+        }
+
+
+class ReaderPool:
+    """A fixed-size pool of read-only connections.
+
+    With WAL enabled, readers never wait on the writer, so reads are only
+    queued behind each other when every pooled connection is busy. Queued
+    reads get a connection by priority class, see :mod:`utils.priority`.
+    """
+
+    def __init__(self, db_path: str, size: int, profile: StorageProfile, aging_ms: float = 250.0) -> None:
+        self.db_path = db_path
+        self.size = size
+        self.profile = profile
+        self._connections: List[Connection] = []
+        self._idle: List[Connection] = []
+        self._slots = PrioritySemaphore(size, aging_ms)
+
+        # Stats
+        self.acquisitions = 0
+        self.waits = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    async def open(self) -> None:
+        """Open all pooled connections"""
+        uri = f"file:{Path(self.db_path).resolve().as_posix()}?mode=ro"
+        for _ in range(self.size):
+            conn = await aiosqlite.connect(uri, uri=True, cached_statements=STATEMENT_CACHE_SIZE)
+            conn.row_factory = aiosqlite.Row
+            await self.profile.apply(conn, writer=False)
+            self._connections.append(conn)
+            self._idle.append(conn)
+
+    async def close(self) -> None:
+        """Close all pooled connections"""
+        for conn in self._connections:
+            await conn.close()
+        self._connections.clear()
+        self._idle.clear()
+
+    @property
+    def in_use(self) -> int:
+        return len(self._connections) - len(self._idle)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Connection]:
+        """Borrow a connection, waiting for one to become idle if needed"""
+        start = time.perf_counter()
+        if self._slots.locked():
+            self.waits += 1
+        await self._slots.acquire()
+        conn = self._idle.pop()
+        waited = (time.perf_counter() - start) * 1000
+        self.acquisitions += 1
+        self.total_wait_ms += waited
+        self.max_wait_ms = max(self.max_wait_ms, waited)
+        try:
+            yield conn
+        finally:
+            self._idle.append(conn)
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size and wait time statistics"""
+        return {
+            "size": self.size,
+            "in_use": self.in_use,
+            "acquisitions": self.acquisitions,
+            "waits": self.waits,
+            "avg_wait_ms": round(self.total_wait_ms / self.acquisitions, 3) if self.acquisitions else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+            "priority": self._slots.stats(),
+        }
+
+
+class LogPartitions:
+    """Routes log rows to weekly ``logs_YYYYMMDD`` tables.
+
+    Each partition covers one UTC week starting on Monday, so reads only touch
+    the weeks that overlap the requested window and retention drops whole
+    tables instead of deleting rows one by one. Partition IDs continue the
+    previous partition's sequence, so log IDs stay unique across tables.
+
+    Tables created or dropped inside a transaction only become visible to
+    readers once :meth:`commit` is called after that transaction commits.
+    """
+
+    PREFIX = "logs_"
+    SPAN = timedelta(days=7)
+
+    def __init__(self) -> None:
+        self._tables: Dict[date, str] = {}
+        self._created: Dict[date, str] = {}
+        self._dropped: List[date] = []
+
+    @classmethod
+    def week_of(cls, timestamp: int) -> date:
+        """Start of the partition that holds an epoch milliseconds timestamp"""
+        day = date.fromordinal(_EPOCH_ORDINAL + timestamp // DAY_MS)
+        return day - timedelta(days=day.weekday())
+
+    @classmethod
+    def start_ms(cls, start: date) -> int:
+        """Epoch milliseconds at the start of a partition"""
+        return (start.toordinal() - _EPOCH_ORDINAL) * DAY_MS
+
+    @classmethod
+    def table_name(cls, start: date) -> str:
+        return f"{cls.PREFIX}{start:%Y%m%d}"
+
+    @property
+    def count(self) -> int:
+        return len(self._tables)
+
+    async def load(self, conn: Connection) -> None:
+        """Discover the partitions that already exist"""
+        async with conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'logs_[0-9]*'"
+        ) as cursor:
+            rows = await cursor.fetchall()
+        self._tables = {
+            datetime.strptime(row[0][len(self.PREFIX):], "%Y%m%d").date(): row[0] for row in rows
+        }
+
+    def tables(self, since: Optional[int] = None, until: Optional[int] = None) -> List[str]:
+        """Partitions overlapping ``[since, until]``, newest first. Missing bounds are open"""
+        starts = sorted(self._tables, reverse=True)
+        if since:
+            first = self.week_of(since)
+            starts = [start for start in starts if start >= first]
+        if until:
+            last = self.week_of(until)
+            starts = [start for start in starts if start <= last]
+        return [self._tables[start] for start in starts]
+
+    def table_for(self, timestamp: int) -> Optional[str]:
+        """Existing partition that holds a timestamp"""
+        return self._tables.get(self.week_of(timestamp))
+
+    async def ensure(self, tr: Cursor, timestamp: int) -> str:
+        """Get the partition for a timestamp, creating it inside the transaction if needed"""
+        start = self.week_of(timestamp)
+        table = self._tables.get(start) or self._created.get(start)
+        if table is not None:
+            return table
+        table = self.table_name(start)
+        await tr.execute(f"""CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            event_type TEXT NOT NULL,
+            description TEXT NOT NULL,
+            timestamp INTEGER NOT NULL DEFAULT ({NOW_MS})
+        )""")
+        await tr.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_guild ON {table}(guild_id, timestamp DESC)")
+        await tr.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_type ON {table}(guild_id, event_type, timestamp DESC)")
+        await tr.execute(
+            "INSERT INTO sqlite_sequence (name, seq) "
+            "SELECT ?, (SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence "
+            "WHERE name = 'logs' OR name GLOB 'logs_[0-9]*') "
+            "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)",
+            (table, table)
+        )
+        self._created[start] = table
+        return table
+
+    async def drop_older_than(self, tr: Cursor, cutoff: int) -> List[str]:
+        """Drop every partition that ends before ``cutoff``. Returns the dropped tables"""
+        boundary = self.week_of(cutoff)
+        dropped = []
+        for start, table in sorted(self._tables.items()):
+            if start >= boundary:
+                break
+            await tr.execute(f"DROP TABLE IF EXISTS {table}")
+            await tr.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+            self._dropped.append(start)
+            dropped.append(table)
+        return dropped
+
+    def commit(self) -> None:
+        """Publish the partitions changed by the committed transaction"""
+        self._tables.update(self._created)
+        for start in self._dropped:
+            self._tables.pop(start, None)
+        self._created.clear()
+        self._dropped.clear()
+
+    def rollback(self) -> None:
+        """Forget the partitions changed by the rolled back transaction"""
+        self._created.clear()
+        self._dropped.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        starts = sorted(self._tables)
+        return {
+            "partitions": len(starts),
+            "oldest": starts[0].isoformat() if starts else None,
+            "newest": starts[-1].isoformat() if starts else None,
+        }
+
+
+class GuildPurger:
+    """Deletes everything stored for guilds in the background, in bounded chunks.
+
+    Deleting a big guild in one transaction would hold the write lock for as
+    long as it takes to remove all its logs and users. Instead each table is
+    emptied ``chunk_size`` rows per transaction, at background priority, with
+    a short pause in between so other work gets the writer.
+
+    Purges are recorded in ``guild_purges`` together with the step they
+    reached, so a purge interrupted by a restart resumes where it left off.
+    The guild row and the purge record go in the final transaction.
+
+    ``PRAGMA foreign_keys`` stays off, so the schema's ``ON DELETE CASCADE``
+    clauses never fire. A cascade would delete the whole guild inside one
+    statement, and enforcement would also reject rows written for guilds that
+    have no ``guilds`` row yet.
+    """
+
+    # Children first, the guild row last
+    STEPS = (
+        "logs",
+        "users",
+        "xp",
+        "mod_actions",
+        "whispers",
+        "level_roles",
+        "reaction_roles",
+        "guild_settings",
+        "feature_options",
+        "feature_settings",
+    )
+
+    def __init__(self, db: DBManager, chunk_size: int = 500, pause: float = 0.01) -> None:
+        self.db = db
+        self.chunk_size = chunk_size
+        self.pause = pause
+        # guild_id -> step to resume from, in request order
+        self._pending: Dict[int, Optional[str]] = {}
+        self._waiters: Dict[int, asyncio.Future] = {}
+        self._cancelled: set = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.current: Optional[int] = None
+
+        # Stats
+        self.purged = 0
+        self.deleted_rows = 0
+        self.chunks = 0
+        self.failures = 0
+
+    def start(self) -> None:
+        """Resume recorded purges and start the background loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="db-guild-purge")
+
+    async def stop(self) -> None:
+        """Stop after the chunk in progress; unfinished purges resume on the next start"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    async def schedule(self, guild_id: int) -> asyncio.Future:
+        """Record a purge and queue it. The future resolves when it finishes"""
+        self._cancelled.discard(guild_id)
+        if guild_id not in self._pending:
+            async with self.db.transaction() as tr:
+                await self.db._execute(tr, "guild_purges.add", (guild_id,))
+            self._pending[guild_id] = None
+        waiter = self._waiters.get(guild_id)
+        if waiter is None or waiter.done():
+            waiter = self._waiters[guild_id] = asyncio.get_running_loop().create_future()
+        self._wakeup.set()
+        return waiter
+
+    async def cancel(self, guild_id: int) -> bool:
+        """Stop a queued or running purge. Rows already deleted stay deleted"""
+        if guild_id not in self._pending:
+            return False
+        self._pending.pop(guild_id)
+        self._cancelled.add(guild_id)
+        async with self.db.transaction() as tr:
+            await self.db._execute(tr, "guild_purges.delete", (guild_id,))
+        waiter = self._waiters.pop(guild_id, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(False)
+        return True
+
+    async def _run(self) -> None:
+        set_db_priority(Priority.BACKGROUND)
+        for guild_id, step in await self.db._fetchall("guild_purges.list"):
+            self._pending.setdefault(guild_id, step)
+        if self._pending:
+            self.db.log.info(f"Resuming {len(self._pending)} guild purge(s)")
+        while True:
+            while self._pending:
+                guild_id, step = next(iter(self._pending.items()))
+                try:
+                    await self._purge(guild_id, step)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.failures += 1
+                    self.db.log.error(f"Purge of guild {guild_id} failed, retrying later: {e}")
+                    waiter = self._waiters.pop(guild_id, None)
+                    if waiter is not None and not waiter.done():
+                        waiter.set_exception(e)
+                    await asyncio.sleep(30)
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+    async def _purge(self, guild_id: int, resume: Optional[str]) -> None:
+        self.current = guild_id
+        start = time.perf_counter()
+        deleted = 0
+        try:
+            # Queued writes for the guild would land after their table was emptied
+            if self.db.write_queue is not None:
+                await self.db.write_queue.flush()
+            steps = self.STEPS[self.STEPS.index(resume):] if resume in self.STEPS else self.STEPS
+            for step in steps:
+                tables = self.db.log_partitions.tables() if step == "logs" else [None]
+                for table in tables:
+                    while True:
+                        if guild_id in self._cancelled:
+                            self._cancelled.discard(guild_id)
+                            self.db.log.info(f"Purge of guild {guild_id} cancelled after {deleted} row(s)")
+                            return
+                        async with self.db.transaction() as tr:
+                            if table is None:
+                                await self.db._execute(tr, f"{step}.delete_guild_chunk", (guild_id, self.chunk_size))
+                            else:
+                                await self.db._execute_partitions(
+                                    tr, "logs.delete_guild_chunk", [table], (guild_id, self.chunk_size)
+                                )
+                            count = tr.rowcount
+                            if count and step in _FEATURE_TABLES:
+                                await self.db._record_settings_changes(tr, [(guild_id, None)])
+                            await self.db._execute(tr, "guild_purges.advance", (step, count, guild_id))
+                        self.chunks += 1
+                        deleted += count
+                        self.deleted_rows += count
+                        if count < self.chunk_size:
+                            break
+                        await asyncio.sleep(self.pause)
+            async with self.db.transaction() as tr:
+                await self.db._execute(tr, "guilds.delete", (guild_id,))
+                await self.db._execute(tr, "guild_purges.delete", (guild_id,))
+        finally:
+            self.current = None
+
+        self._pending.pop(guild_id, None)
+        self.purged += 1
+        waiter = self._waiters.pop(guild_id, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(True)
+        self.db.log.info(
+            f"Purged guild {guild_id}: {deleted} row(s) in {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "current": self.current,
+            "purged": self.purged,
+            "deleted_rows": self.deleted_rows,
+            "chunks": self.chunks,
+            "failures": self.failures,
+        }
+
+
+class DBManager(StorageBackend):
+    """SQLite storage backend"""
+
+    def __init__(
+        self,
+        db_path: str,
+        logger: Optional[logging.Logger] = None,
+        write_behind: bool = False,
+        flush_interval_ms: int = 500,
+        flush_max_ops: int = 500,
+        read_pool_size: int = 2,
+        storage_profile: str = "balanced",
+        optimize_interval: float = 3600,
+        checkpoint_interval: float = 300,
+        slow_query_ms: float = 100.0,
+        metrics: Optional[QueryMetrics] = None,
+        backup_interval: float = 0,
+        backup_keep: int = 7,
+        backup_dir: Optional[str] = None,
+        priority_aging_ms: float = 250.0,
+        settings_change_log: bool = False
+    ) -> None:
+        if storage_profile not in STORAGE_PROFILES:
+            raise ValueError(
+                f"Unknown storage profile '{storage_profile}', "
+                f"expected one of: {', '.join(STORAGE_PROFILES)}"
+            )
         self.db_path = db_path
         self._conn: Optional[Connection] = None
         self.log = logger or logging.getLogger("DBManager")
+        self.profile = STORAGE_PROFILES[storage_profile]
+        # In-memory databases can't be shared between connections
+        self.read_pool: Optional[ReaderPool] = (
+            ReaderPool(db_path, read_pool_size, self.profile, priority_aging_ms)
+            if read_pool_size > 0 and db_path != ":memory:" else None
+        )
+        self.maintenance = StorageMaintenance(self, optimize_interval, checkpoint_interval)
+        self.snapshots = DatabaseSnapshots(db_path, backup_dir, backup_interval, backup_keep, logger=self.log)
+        self.purger = GuildPurger(self)
+        self.queries = QueryRegistry(STATEMENTS)
+        # Shards of one process pass a shared instance
+        self.metrics = metrics if metrics is not None else QueryMetrics(slow_query_ms)
+        self.log_partitions = LogPartitions()
+        self.single_flight = SingleFlight()
+        # Transactions share one connection; queued ones start by priority class
+        self._write_lock = PrioritySemaphore(1, priority_aging_ms)
+        # Tables written by the open transaction
+        self._written: set = set()
+        self.write_queue: Optional[WriteBehindQueue] = (
+            WriteBehindQueue(self, flush_interval_ms, flush_max_ops) if write_behind else None
+        )
+        self._options_migration: Optional[asyncio.Task] = None
+        # Record feature settings writes for other processes, see get_settings_changes.
+        # Every process sharing the database has to enable it for the log to be complete
+        self.settings_change_log = settings_change_log
+        # Tags this instance's change log rows, so its own writes aren't reported back
+        self.origin = uuid.uuid4().hex
+        # Polls the change log
+        self._change_conn: Optional[Connection] = None
+        # (seq, PRAGMA data_version) of the last poll that read the log to its end
+        self._changes_seen: Optional[Tuple[int, int]] = None
 
     @property
     def connection(self) -> Connection:
-        """Get the database connection.
+        """Get the writer connection.
         
         Returns:
-            The active database connection
+            The active writer connection
             
         Raises:
             RuntimeError: If the connection hasn't been initialized
@@ -28,27 +914,116 @@ class DBManager:
         if not self._conn:
             raise RuntimeError("Database connection not initialized. Call init() first.")
         return self._conn    
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[Connection]:
+        """Borrow a read-only connection from the pool.
+
+        Falls back to the writer connection when no pool is configured.
+        """
+        if self.read_pool is None:
+            yield self.connection
+            return
+        async with self.read_pool.acquire() as conn:
+            yield conn
         
     async def init(self) -> None:
-        """Initialize database connection and create tables"""
+        """Initialize database connections and create tables"""
         try:
-            self._conn = await aiosqlite.connect(self.db_path)
+            self._conn = await aiosqlite.connect(self.db_path, cached_statements=STATEMENT_CACHE_SIZE)
             self._conn.row_factory = aiosqlite.Row
+            await self.profile.apply(self._conn)
             await self._create_tables()
             await self._create_indexes()
-            self.log.info("Database initialization complete")
+            await self.log_partitions.load(self._conn)
+            await self._migrate_legacy_logs()
+            await self._migrate_epoch_ms()
+            self._options_migration = asyncio.create_task(
+                self._migrate_feature_options(), name="db-options-migration"
+            )
+            if self.read_pool is not None:
+                await self.read_pool.open()
+            self.maintenance.start()
+            self.snapshots.start()
+            self.purger.start()
+            if self.write_queue is not None:
+                self.write_queue.start()
+            self.log.info(f"Database initialization complete (storage profile: {self.profile.name})")
         except Exception as e:
             self.log.error(f"Error initializing database: {e}", exc_info=True)
             raise
 
-    async def close(self) -> None:
+    def stats(self) -> Dict[str, Any]:
+        """Runtime statistics for the connection pool and write queue"""
+        return {
+            "read_pool": self.read_pool.stats() if self.read_pool is not None else None,
+            "write_queue": self.write_queue.stats() if self.write_queue is not None else None,
+            "writer": self._write_lock.stats(),
+            "maintenance": self.maintenance.stats(),
+            "backup": self.snapshots.stats(),
+            "purges": self.purger.stats(),
+            "logs": self.log_partitions.stats(),
+            "queries": self.metrics.summary(),
+            "single_flight": self.single_flight.stats(),
+        }
+
+    def query_stats(self, top: int = 10, by: str = "total_ms", slow: int = 10) -> Dict[str, Any]:
+        """Per-statement latency histograms, transaction lock waits and the slow-query log"""
+        return self.metrics.snapshot(top, by, slow)
+
+    def reset_query_stats(self) -> None:
+        """Start query metrics from scratch"""
+        self.metrics.reset()
+        self.single_flight.reset()
+
+    async def backup(self, progress: Optional[Callable[[BackupReport], None]] = None) -> List[BackupReport]:
+        """Snapshot the database file without blocking readers or writers.
+
+        Queued write-behind operations are flushed first so the snapshot
+        includes them. See :class:`~utils.db_backup.DatabaseSnapshots`.
+
+        Args:
+            progress: Called with the live report after every copy step
+        """
+        if self.write_queue is not None:
+            await self.write_queue.flush()
+        return [await self.snapshots.run(progress=progress)]
+
+    async def drain(self, timeout: float = 5.0) -> int:
+        """Flush the write-behind queue, giving up after ``timeout`` seconds.
+
+        Returns:
+            The number of queued operations that could not be written
+        """
+        if self.write_queue is None or self._conn is None:
+            return 0
+        return await self.write_queue.drain(timeout)
+
+    async def close(self, drain_timeout: float = 5.0) -> None:
         """Close the database connection and perform cleanup.
         
         This method should be called when the database is no longer needed
-        to ensure proper resource cleanup.
+        to ensure proper resource cleanup. Pending write-behind operations
+        are flushed first, for at most ``drain_timeout`` seconds.
         """
         if self._conn:
+            await self.purger.stop()
+            await self.drain(drain_timeout)
+            await self.maintenance.stop()
+            await self.snapshots.stop()
+            if self._options_migration is not None:
+                self._options_migration.cancel()
+                try:
+                    await self._options_migration
+                except (asyncio.CancelledError, Exception):
+                    pass
+                self._options_migration = None
             try:
+                if self.read_pool is not None:
+                    await self.read_pool.close()
+                if self._change_conn is not None:
+                    await self._change_conn.close()
+                    self._change_conn = None
                 await self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")  # Cleanup WAL files
                 await self._conn.close()
                 self._conn = None
@@ -60,18 +1035,18 @@ class DBManager:
     async def _create_tables(self):
         """Create all required database tables"""
         tables = [
-            """CREATE TABLE IF NOT EXISTS guilds (
+            f"""CREATE TABLE IF NOT EXISTS guilds (
                 guild_id INTEGER PRIMARY KEY,
                 prefix TEXT DEFAULT '!',
                 locale TEXT DEFAULT 'en',
-                premium_until TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                premium_until INTEGER,
+                created_at INTEGER DEFAULT ({NOW_MS})
             )""",
-            """CREATE TABLE IF NOT EXISTS users (
+            f"""CREATE TABLE IF NOT EXISTS users (
                 user_id INTEGER,
                 guild_id INTEGER,
-                first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_seen TIMESTAMP,
+                first_seen INTEGER DEFAULT ({NOW_MS}),
+                last_seen INTEGER,
                 messages_count INTEGER DEFAULT 0,
                 commands_used INTEGER DEFAULT 0,
                 PRIMARY KEY (user_id, guild_id),
@@ -85,14 +1060,82 @@ class DBManager:
                 PRIMARY KEY (guild_id, feature),
                 FOREIGN KEY (guild_id) REFERENCES guilds(guild_id) ON DELETE CASCADE
             )""",
-            """CREATE TABLE IF NOT EXISTS logs (
+            """CREATE TABLE IF NOT EXISTS feature_options (
+                guild_id INTEGER,
+                feature TEXT,
+                key TEXT,
+                value_json TEXT NOT NULL,
+                PRIMARY KEY (guild_id, feature, key)
+            ) WITHOUT ROWID""",
+            """CREATE TABLE IF NOT EXISTS guild_settings (
+                guild_id INTEGER,
+                key TEXT,
+                value TEXT,
+                PRIMARY KEY (guild_id, key),
+                FOREIGN KEY (guild_id) REFERENCES guilds(guild_id) ON DELETE CASCADE
+            )""",
+            """CREATE TABLE IF NOT EXISTS xp (
+                guild_id INTEGER,
+                user_id INTEGER,
+                xp INTEGER DEFAULT 0,
+                level INTEGER DEFAULT 0,
+                last_xp_gain INTEGER,
+                last_message TEXT,
+                last_xp_at INTEGER,
+                PRIMARY KEY (guild_id, user_id),
+                FOREIGN KEY (guild_id) REFERENCES guilds(guild_id) ON DELETE CASCADE
+            )""",
+            """CREATE TABLE IF NOT EXISTS level_roles (
+                guild_id INTEGER,
+                level INTEGER,
+                role_id INTEGER NOT NULL,
+                PRIMARY KEY (guild_id, level),
+                FOREIGN KEY (guild_id) REFERENCES guilds(guild_id) ON DELETE CASCADE
+            )""",
+            """CREATE TABLE IF NOT EXISTS reaction_roles (
+                guild_id INTEGER,
+                message_id INTEGER,
+                emoji TEXT,
+                role_id INTEGER NOT NULL,
+                PRIMARY KEY (guild_id, message_id, emoji),
+                FOREIGN KEY (guild_id) REFERENCES guilds(guild_id) ON DELETE CASCADE
+            )""",
+            f"""CREATE TABLE IF NOT EXISTS mod_actions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 guild_id INTEGER NOT NULL,
-                event_type TEXT NOT NULL,
-                description TEXT NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                user_id INTEGER NOT NULL,
+                action TEXT NOT NULL,
+                reason TEXT,
+                moderator_id INTEGER NOT NULL,
+                created_at INTEGER DEFAULT ({NOW_MS}),
+                FOREIGN KEY (guild_id) REFERENCES guilds(guild_id) ON DELETE CASCADE
+            )""",
+            f"""CREATE TABLE IF NOT EXISTS whispers (
+                guild_id INTEGER,
+                whisper_id TEXT,
+                user_id INTEGER NOT NULL,
+                thread_id INTEGER NOT NULL,
+                is_closed BOOLEAN DEFAULT FALSE,
+                created_at INTEGER DEFAULT ({NOW_MS}),
+                closed_at INTEGER,
+                PRIMARY KEY (guild_id, whisper_id),
                 FOREIGN KEY (guild_id) REFERENCES guilds(guild_id) ON DELETE CASCADE
-            )"""
+            )""",
+            f"""CREATE TABLE IF NOT EXISTS guild_purges (
+                guild_id INTEGER PRIMARY KEY,
+                step TEXT,
+                deleted INTEGER DEFAULT 0,
+                requested_at INTEGER DEFAULT ({NOW_MS})
+            )""",
+            # Feature settings writes of every process, for cache invalidation.
+            # AUTOINCREMENT keeps seq from being reused once old rows are pruned
+            f"""CREATE TABLE IF NOT EXISTS settings_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER NOT NULL,
+                feature TEXT,
+                origin TEXT,
+                changed_at INTEGER DEFAULT ({NOW_MS})
+            )""",
         ]
 
         async with self.transaction() as tr:
@@ -115,21 +1158,132 @@ class DBManager:
         -- Feature Settings Indexes
         CREATE INDEX IF NOT EXISTS idx_feature_settings_lookup ON feature_settings(guild_id, feature);
         CREATE INDEX IF NOT EXISTS idx_feature_settings_enabled ON feature_settings(guild_id) WHERE enabled = TRUE;
+        CREATE INDEX IF NOT EXISTS idx_feature_settings_legacy ON feature_settings(guild_id) WHERE options_json IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_settings_changes_time ON settings_changes(changed_at);
+
+        -- XP Indexes
+        CREATE INDEX IF NOT EXISTS idx_xp_leaderboard ON xp(guild_id, xp DESC, user_id);
+
+        -- Moderation Indexes
+        CREATE INDEX IF NOT EXISTS idx_mod_actions_guild ON mod_actions(guild_id, id DESC);
+        CREATE INDEX IF NOT EXISTS idx_mod_actions_user ON mod_actions(guild_id, user_id);
 
-        -- Logs Indexes
-        CREATE INDEX IF NOT EXISTS idx_logs_guild ON logs(guild_id, timestamp DESC);
-        CREATE INDEX IF NOT EXISTS idx_logs_type ON logs(guild_id, event_type);
+        -- Whisper Indexes
+        DROP INDEX IF EXISTS idx_whispers_user;
+        DROP INDEX IF EXISTS idx_whispers_created;
+        CREATE INDEX IF NOT EXISTS idx_whispers_user_thread ON whispers(guild_id, user_id, thread_id DESC);
+        CREATE INDEX IF NOT EXISTS idx_whispers_thread ON whispers(guild_id, thread_id DESC);
         """)
         
         await self.connection.commit()
         self.log.info("Database indexes created.")
 
+    async def _migrate_legacy_logs(self) -> None:
+        """Move rows from the old single ``logs`` table into weekly partitions"""
+        async with self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'logs'"
+        ) as cursor:
+            if await cursor.fetchone() is None:
+                return
+
+        count = 0
+        async with self.transaction() as tr:
+            # Only weeks that hold rows, a sparse history would otherwise leave many empty partitions
+            await tr.execute(
+                "SELECT DISTINCT date(timestamp, 'weekday 0', '-6 days') FROM logs WHERE timestamp IS NOT NULL"
+            )
+            weeks = sorted(date.fromisoformat(row[0]) for row in await tr.fetchall() if row[0] is not None)
+            for week in weeks:
+                table = await self.log_partitions.ensure(tr, LogPartitions.start_ms(week))
+                await tr.execute(
+                    f"INSERT INTO {table} (id, guild_id, event_type, description, timestamp) "
+                    f"SELECT id, guild_id, event_type, description, {_text_to_ms('timestamp')} FROM logs "
+                    "WHERE timestamp >= ? AND timestamp < ?",
+                    (f"{week:%Y-%m-%d}", f"{week + LogPartitions.SPAN:%Y-%m-%d}")
+                )
+                count += tr.rowcount
+            await tr.execute("DROP TABLE logs")
+            await tr.execute("DELETE FROM sqlite_sequence WHERE name = 'logs'")
+        self.log.info(f"Moved {count} log row(s) into {self.log_partitions.count} weekly partition(s)")
+
+    async def _migrate_epoch_ms(self) -> None:
+        """Rewrite ``CURRENT_TIMESTAMP`` text times as epoch milliseconds.
+
+        Runs once at startup, before the bot serves anything. Every table is
+        converted in its own transaction and only rows still holding text are
+        touched, so an interrupted run carries on at the next start. The XP
+        cooldown used to be epoch seconds as a float.
+        """
+        async with self.connection.execute("PRAGMA user_version") as cursor:
+            if (await cursor.fetchone())[0] >= SCHEMA_VERSION:
+                return
+
+        converted = 0
+        start = time.perf_counter()
+        for table, columns in TIME_COLUMNS.items():
+            for name in self.log_partitions.tables() if table == "logs" else [table]:
+                async with self.transaction() as tr:
+                    for column in columns:
+                        if column == "last_xp_at":
+                            await tr.execute(
+                                f"UPDATE {name} SET {column} = CAST(ROUND({column} * 1000) AS INTEGER) WHERE {column} < 1e11"
+                            )
+                        else:
+                            await tr.execute(
+                                f"UPDATE {name} SET {column} = {_text_to_ms(column)} WHERE typeof({column}) = 'text'"
+                            )
+                        converted += max(tr.rowcount, 0)
+        async with self.transaction() as tr:
+            await tr.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        if converted:
+            self.log.info(
+                f"Converted {converted} time value(s) to epoch milliseconds "
+                f"in {(time.perf_counter() - start) * 1000:.0f}ms"
+            )
+
+    async def _migrate_feature_options(self, batch_size: int = 200) -> None:
+        """Split legacy ``options_json`` blobs into per-key ``feature_options`` rows.
+
+        Runs in the background after startup, one short transaction per batch,
+        so the bot keeps serving while it works through the table. Reads fall
+        back to the blob of a row that has not been migrated yet, and option
+        patches migrate the row they touch first.
+        """
+        migrated = 0
+        try:
+            while True:
+                async with self.transaction(Priority.BACKGROUND) as tr:
+                    await self._execute(tr, "feature_settings.legacy_batch", (batch_size,))
+                    keys = [tuple(row) for row in await tr.fetchall()]
+                    if keys:
+                        await self._migrate_feature_rows(tr, keys)
+                migrated += len(keys)
+                if len(keys) < batch_size:
+                    break
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.log.error(f"Feature options migration stopped after {migrated} row(s): {e}", exc_info=True)
+            return
+        if migrated:
+            self.log.info(f"Split options of {migrated} feature row(s) into per-key rows")
+
+    async def _migrate_feature_rows(self, tr: Cursor, keys: Sequence[Tuple[int, str]]) -> None:
+        """Move the options blob of the given (guild_id, feature) rows into per-key rows"""
+        await self._executemany(tr, "feature_options.migrate", keys)
+        await self._executemany(tr, "feature_settings.clear_legacy", keys)
+
     @asynccontextmanager
-    async def transaction(self) -> AsyncIterator[Cursor]:
+    async def transaction(self, priority: Optional[Priority] = None) -> AsyncIterator[Cursor]:
         """A context manager for database transactions.
         
         This ensures that a series of database operations either all complete successfully
         or are all rolled back in case of an error.
+
+        Args:
+            priority: Queueing class while waiting for the writer, defaults to
+                the calling task's, see :mod:`utils.priority`
         
         Yields:
             Cursor: A database cursor for executing SQL commands
@@ -141,134 +1295,909 @@ class DBManager:
         if self._conn is None:
             raise RuntimeError("Database connection not initialized")
             
-        tr = await self.connection.cursor()
-        await tr.execute("BEGIN IMMEDIATE")  # Get write lock immediately
-        
+        # Transactions share one connection, so they must not interleave
+        start = time.perf_counter()
+        async with self._write_lock.hold(priority):
+            locked = time.perf_counter()
+            tr = await self.connection.cursor()
+            await tr.execute("BEGIN IMMEDIATE")  # Get write lock immediately
+            begun = time.perf_counter()
+            
+            try:
+                yield tr
+                await self.connection.commit()
+                self.log_partitions.commit()
+                # Reads started before the commit must not be shared with later callers
+                self.single_flight.forget(self._written)
+            except BaseException as e:
+                await self.connection.rollback()
+                self.log_partitions.rollback()
+                if not isinstance(e, asyncio.CancelledError):
+                    self.log.error(f"Transaction failed, rolled back: {e}")
+                raise
+            finally:
+                self._written.clear()
+                await tr.close()
+                self.metrics.observe_transaction(
+                    (locked - start) * 1000,
+                    (begun - locked) * 1000,
+                    (time.perf_counter() - begun) * 1000
+                )
+
+    # -------------------- Statement Helpers --------------------
+
+    async def _observe(
+        self,
+        conn: Connection,
+        name: str,
+        sql: str,
+        params: Any,
+        start: float,
+        rows: int,
+        executions: int = 1
+    ) -> None:
+        """Record a statement run that began at ``start``. Slow runs are logged with their query plan"""
+        elapsed = (time.perf_counter() - start) * 1000
+        self.metrics.observe(name, elapsed, rows, executions)
+        if not self.metrics.is_slow(elapsed):
+            return
+        plan = self.metrics.plans.get(sql)
+        if plan is None:
+            plan = await self._query_plan(conn, sql, params)
+        self.metrics.add_slow(name, sql, elapsed, rows, plan)
+        self.log.warning(f"Slow query {name}: {elapsed:.1f} ms, {rows} row(s)")
+
+    async def _query_plan(self, conn: Connection, sql: str, params: Any) -> Optional[List[str]]:
+        """``EXPLAIN QUERY PLAN`` of a statement, or None if it can't be explained"""
         try:
-            yield tr
-            await self.connection.commit()
-        except Exception as e:
-            await self.connection.rollback()
-            self.log.error(f"Transaction failed, rolled back: {e}")
-            raise
-        finally:
-            await tr.close()
+            async with conn.execute(f"EXPLAIN QUERY PLAN {sql}", params) as cursor:
+                return format_plan(await cursor.fetchall())
+        except aiosqlite.Error as e:
+            self.log.debug(f"Could not explain {sql!r}: {e}")
+            return None
+
+    async def _fetchone(self, name: str, params: Sequence[Any] = ()) -> Any:
+        """Run a registered read statement on a pooled reader and decode the first row"""
+        statement = self.queries[name]
+        self.queries.record(name)
+        async with self.reader() as conn:
+            start = time.perf_counter()
+            async with conn.execute(statement.sql, params) as cursor:
+                if statement.row_factory is not None:
+                    cursor.row_factory = statement.row_factory
+                row = await cursor.fetchone()
+            await self._observe(conn, name, statement.sql, params, start, int(row is not None))
+        if row is None or statement.decoder is None:
+            return row
+        return statement.decoder(row)
+
+    async def _fetchall(self, name: str, params: Sequence[Any] = ()) -> List[Any]:
+        """Run a registered read statement on a pooled reader and decode every row"""
+        statement = self.queries[name]
+        self.queries.record(name)
+        async with self.reader() as conn:
+            start = time.perf_counter()
+            async with conn.execute(statement.sql, params) as cursor:
+                if statement.row_factory is not None:
+                    cursor.row_factory = statement.row_factory
+                rows = await cursor.fetchall()
+            await self._observe(conn, name, statement.sql, params, start, len(rows))
+        if statement.decoder is None:
+            return list(rows)
+        decode = statement.decoder
+        return [decode(row) for row in rows]
+
+    async def _stream(
+        self,
+        name: str,
+        params: Union[Sequence[Any], Dict[str, Any]] = (),
+        batch_size: int = 500,
+        table: Optional[str] = None
+    ) -> AsyncIterator[Any]:
+        """Run a registered read statement and yield decoded rows, ``batch_size`` at a time.
+
+        The pooled reader is held until the iterator is exhausted or closed.
+        Only time spent fetching counts towards the statement's latency, not
+        time the consumer spends between batches.
+        """
+        statement = self.queries[name]
+        sql = statement.for_table(table) if table is not None else statement.sql
+        decode = statement.decoder
+        self.queries.record(name)
+        fetched = 0
+        busy = 0.0
+        done = False
+        async with self.reader() as conn:
+            try:
+                start = time.perf_counter()
+                async with conn.execute(sql, params) as cursor:
+                    if statement.row_factory is not None:
+                        cursor.row_factory = statement.row_factory
+                    while True:
+                        rows = await cursor.fetchmany(batch_size)
+                        busy += time.perf_counter() - start
+                        if not rows:
+                            break
+                        fetched += len(rows)
+                        for row in rows:
+                            yield decode(row) if decode is not None else row
+                        start = time.perf_counter()
+                done = True
+            finally:
+                if not done:
+                    # Closed early: record without awaiting a query plan
+                    self.metrics.observe(name, busy * 1000, fetched)
+            # Backdate the start so only the fetch time counts
+            await self._observe(conn, name, sql, params, time.perf_counter() - busy, fetched)
+
+    async def _execute(self, tr: Cursor, name: str, params: Sequence[Any] = ()) -> Cursor:
+        """Run a registered write statement inside a transaction"""
+        sql = self.queries[name].sql
+        self.queries.record(name)
+        self._written.add(name.partition(".")[0])
+        start = time.perf_counter()
+        cursor = await tr.execute(sql, params)
+        await self._observe(self.connection, name, sql, params, start, tr.rowcount)
+        return cursor
+
+    async def _executemany(self, tr: Cursor, name: str, params: Iterable[Sequence[Any]]) -> Cursor:
+        """Run a registered write statement once per parameter set inside a transaction"""
+        params = list(params)
+        sql = self.queries[name].sql
+        self.queries.record(name, len(params))
+        self._written.add(name.partition(".")[0])
+        start = time.perf_counter()
+        cursor = await tr.executemany(sql, params)
+        if params:
+            await self._observe(self.connection, name, sql, params[0], start, tr.rowcount, len(params))
+        return cursor
+
+    async def _execute_partitions(
+        self,
+        tr: Cursor,
+        name: str,
+        tables: Iterable[str],
+        params: Sequence[Any] = ()
+    ) -> None:
+        """Run a partitioned write statement against each of the given tables"""
+        statement = self.queries[name]
+        self._written.add(name.partition(".")[0])
+        for table in tables:
+            sql = statement.for_table(table)
+            self.queries.record(name)
+            start = time.perf_counter()
+            await tr.execute(sql, params)
+            await self._observe(self.connection, name, sql, params, start, tr.rowcount)
+
+    async def _fetch_partitions(
+        self,
+        name: str,
+        tables: Iterable[str],
+        params: Union[Sequence[Any], Dict[str, Any]],
+        limit: int
+    ) -> List[Any]:
+        """Run a partitioned read statement newest partition first until ``limit`` rows are found.
+
+        ``params`` must leave out the trailing LIMIT parameter, or the
+        ``limit`` key for named parameters. A negative limit reads every
+        partition.
+        """
+        statement = self.queries[name]
+        rows: List[Any] = []
+        async with self.reader() as conn:
+            for table in tables:
+                remaining = limit - len(rows) if limit >= 0 else -1
+                if remaining == 0:
+                    break
+                self.queries.record(name)
+                sql = statement.for_table(table)
+                bound = {**params, 'limit': remaining} if isinstance(params, dict) else (*params, remaining)
+                start = time.perf_counter()
+                async with conn.execute(sql, bound) as cursor:
+                    if statement.row_factory is not None:
+                        cursor.row_factory = statement.row_factory
+                    found = await cursor.fetchall()
+                await self._observe(conn, name, sql, bound, start, len(found))
+                rows.extend(found)
+        if statement.decoder is None:
+            return rows
+        decode = statement.decoder
+        return [decode(row) for row in rows]
+
+    async def _insert_logs(self, tr: Cursor, logs: Iterable[Tuple[int, str, str, int]]) -> None:
+        """Insert ``(guild_id, event_type, description, timestamp)`` rows into their partitions"""
+        by_table: Dict[str, List[Tuple[int, str, str, int]]] = {}
+        for entry in logs:
+            table = await self.log_partitions.ensure(tr, entry[3])
+            by_table.setdefault(table, []).append(entry)
+        statement = self.queries["logs.insert_at"]
+        for table, rows in by_table.items():
+            sql = statement.for_table(table)
+            self.queries.record(statement.name, len(rows))
+            start = time.perf_counter()
+            await tr.executemany(sql, rows)
+            await self._observe(self.connection, statement.name, sql, rows[0], start, tr.rowcount, len(rows))
 
     # -------------------- Guild Methods --------------------
 
     async def add_guild(self, guild_id: int) -> None:
         """Add a new guild to the database"""
         async with self.transaction() as tr:
-            await tr.execute("INSERT OR IGNORE INTO guilds (guild_id) VALUES (?)", (guild_id,))
+            await self._execute(tr, "guilds.ensure", (guild_id,))
 
-    async def remove_guild(self, guild_id: int) -> None:
-        """Remove a guild and all its associated data"""
+    async def add_guilds_bulk(self, guild_ids: Iterable[int]) -> int:
+        """Add every missing guild in a single transaction.
+
+        Returns:
+            The number of guilds that were added
+        """
+        params = [(guild_id,) for guild_id in set(guild_ids)]
+        if not params:
+            return 0
         async with self.transaction() as tr:
-            await tr.execute("DELETE FROM guilds WHERE guild_id = ?", (guild_id,))
+            cursor = await self._executemany(tr, "guilds.ensure", params)
+            return cursor.rowcount
+
+    async def remove_guild(self, guild_id: int) -> None:
+        """Remove a guild and all its associated data in the background"""
+        await self.purge_guild(guild_id)
 
     async def get_guild_prefix(self, guild_id: int) -> str:
         """Get guild prefix"""
-        async with self.connection.execute(
-            "SELECT prefix FROM guilds WHERE guild_id = ?", 
-            (guild_id,)
-        ) as cursor:
-            row = await cursor.fetchone()
-            return row[0] if row else "!"
+        prefix = await self._fetchone("guilds.get_prefix", (guild_id,))
+        return prefix if prefix is not None else "!"
 
     async def set_guild_prefix(self, guild_id: int, prefix: str) -> None:
         """Set guild prefix"""
         async with self.transaction() as tr:
-            await tr.execute(
-                "INSERT INTO guilds (guild_id, prefix) VALUES (?, ?) "
-                "ON CONFLICT(guild_id) DO UPDATE SET prefix = ?",
-                (guild_id, prefix, prefix)
-            )
+            await self._execute(tr, "guilds.set_prefix", (guild_id, prefix))
+
+    async def get_guild_setting(self, guild_id: int, key: str) -> Optional[str]:
+        """Get a single guild setting value"""
+        return await self._fetchone("guild_settings.get", (guild_id, key))
+
+    async def set_guild_setting(self, guild_id: int, key: str, value: str) -> None:
+        """Set a single guild setting value"""
+        async with self.transaction() as tr:
+            await self._execute(tr, "guilds.ensure", (guild_id,))
+            await self._execute(tr, "guild_settings.set", (guild_id, key, value))
+
+    async def get_guild_settings(self, guild_id: int) -> List[Dict[str, Any]]:
+        """Get every guild setting as key/value entries"""
+        return await self._fetchall("guild_settings.list", (guild_id,))
+
+    async def get_global_stats(self) -> Dict[str, int]:
+        """Totals across every guild in this database"""
+        if self.write_queue is not None:
+            await self.write_queue.flush()
+        return await self._fetchone("guilds.global_stats")
+
+    async def delete_guild_data(self, guild_id: int) -> None:
+        """Delete everything stored for a guild, returning once it is gone.
+        Runs as a chunked purge, see :class:`GuildPurger`"""
+        done = await self.purger.schedule(guild_id)
+        await asyncio.shield(done)
+
+    async def purge_guild(self, guild_id: int) -> None:
+        """Start deleting everything stored for a guild in bounded chunks.
+        Returns once the purge is recorded; it resumes after a restart"""
+        await self.purger.schedule(guild_id)
+
+    async def cancel_guild_purge(self, guild_id: int) -> bool:
+        """Stop a purge that has not finished, e.g. because the bot rejoined the guild"""
+        return await self.purger.cancel(guild_id)
 
     # -------------------- User Methods --------------------
 
     async def update_user_activity(self, guild_id: int, user_id: int) -> None:
         """Update user's last seen timestamp"""
-        async with self.transaction() as tr:
-            await tr.execute("""
-                INSERT INTO users (guild_id, user_id, last_seen, messages_count) 
-                VALUES (?, ?, CURRENT_TIMESTAMP, 1)
-                ON CONFLICT(guild_id, user_id) DO UPDATE 
-                SET last_seen = CURRENT_TIMESTAMP,
-                    messages_count = messages_count + 1
-            """, (guild_id, user_id))
+        if self.write_queue is not None:
+            self.write_queue.add_activity(guild_id, user_id)
+            return
+        async with self.transaction(Priority.BACKGROUND) as tr:
+            await self._execute(tr, "users.touch", (guild_id, user_id))
 
     async def increment_user_commands(self, guild_id: int, user_id: int) -> None:
         """Increment user's commands used counter"""
+        if self.write_queue is not None:
+            self.write_queue.add_command(guild_id, user_id)
+            return
+        async with self.transaction(Priority.BACKGROUND) as tr:
+            await self._execute(tr, "users.increment_commands", (guild_id, user_id))
+
+    async def delete_user_data(self, guild_id: int, user_id: int) -> None:
+        """Delete everything stored for a user in a guild"""
+        if self.write_queue is not None:
+            await self.write_queue.flush()
         async with self.transaction() as tr:
-            await tr.execute("""
-                INSERT INTO users (guild_id, user_id, commands_used) 
-                VALUES (?, ?, 1)
-                ON CONFLICT(guild_id, user_id) DO UPDATE 
-                SET commands_used = commands_used + 1
-            """, (guild_id, user_id))
+            for name in ("users.delete", "xp.delete", "whispers.delete_user", "mod_actions.delete_user"):
+                await self._execute(tr, name, (guild_id, user_id))
 
     # -------------------- Feature Settings Methods --------------------
 
-    async def get_feature_settings(self, guild_id: int, feature: str) -> Optional[Dict[str, Any]]:
+    async def get_feature_settings(self, guild_id: int, feature: str) -> Optional[FeatureSettings]:
         """Get raw feature settings from database"""
         if not self._conn:
             raise RuntimeError("Database not initialized")
-            
-        async with self.connection.execute(
-            "SELECT enabled, options_json FROM feature_settings WHERE guild_id = ? AND feature = ?",
-            (guild_id, feature)
-        ) as cursor:
-            row = await cursor.fetchone()
-            return {
-                'enabled': bool(row[0]),
-                'options': json.loads(row[1]) if row[1] else {}
-            } if row else None
+
+        if self.write_queue is not None:
+            pending = self.write_queue.pending_feature(guild_id, feature)
+            if pending is not None:
+                return FeatureSettings.from_row(pending)
+
+        # Busy channels ask for the same settings many times at once
+        return await self.single_flight.run(
+            ("feature_settings.get", guild_id, feature),
+            lambda: self._fetchone("feature_settings.get", (guild_id, feature)),
+            _FEATURE_TABLES
+        )
+
+    async def get_all_feature_settings(self, guild_id: int) -> List[NamedFeatureSettings]:
+        """Get every stored feature of a guild"""
+        if self.write_queue is not None:
+            await self.write_queue.flush()
+        return await self._fetchall("feature_settings.list", (guild_id,))
+
+    async def get_feature_rows_after(self, limit: int = 500, cursor: Optional[str] = None) -> Page:
+        """Get stored feature settings of every guild, ordered by guild and feature,
+        the page after ``cursor``"""
+        if cursor is None:
+            if self.write_queue is not None:
+                await self.write_queue.flush()
+            guild_id, feature = -1, ""
+        else:
+            guild_id, feature = decode_cursor("feature_rows", cursor)
+        rows = await self._fetchall("feature_settings.scan", {
+            'guild_id': guild_id,
+            'feature': feature,
+            'limit': limit + 1,
+        })
+        return make_page(rows, limit, "feature_rows", lambda row: (row.guild_id, row.feature))
+
+    async def iter_feature_rows(self, batch_size: int = 500) -> AsyncIterator[GuildFeatureSettings]:
+        """Stream stored feature settings of every guild in a single scan,
+        ``batch_size`` rows at a time"""
+        if self.write_queue is not None:
+            await self.write_queue.flush()
+        params = {'guild_id': -1, 'feature': "", 'limit': -1}
+        async with aclosing(self._stream("feature_settings.scan", params, batch_size)) as rows:
+            async for row in rows:
+                yield row
+
+    async def get_settings_changes(self, cursor: Optional[str] = None, limit: int = 1000) -> SettingsChanges:
+        """Feature settings writes after ``cursor`` by other processes, oldest first.
+
+        Writes are recorded in ``settings_changes`` when ``settings_change_log``
+        is enabled, one row per (guild, feature) per transaction. Writes of this
+        instance are left out, its callers already know about them. A dedicated
+        connection checks ``PRAGMA data_version`` first, which only moves when a
+        commit lands, so an idle poll doesn't read the log at all. Without a
+        cursor, returns no changes and the cursor of the current end of the log.
+        """
+        if not self.settings_change_log or self.db_path == ":memory:":
+            return SettingsChanges([], None)
+        if self._change_conn is None:
+            self._change_conn = await aiosqlite.connect(self.db_path)
+            await self.profile.apply(self._change_conn, writer=False)
+        async with self._change_conn.execute("PRAGMA data_version") as version_cursor:
+            version = (await version_cursor.fetchone())[0]
+
+        if cursor is None:
+            head = await self._fetchone("settings_changes.head")
+            self._changes_seen = (head, version)
+            return SettingsChanges([], encode_cursor("settings_changes", head))
+        seq, = decode_cursor("settings_changes", cursor)
+        if self._changes_seen == (seq, version):
+            return SettingsChanges([], cursor)
+
+        head = await self._fetchone("settings_changes.head")
+        rows = await self._fetchall("settings_changes.after", (seq, limit))
+        # seq has no gaps, rows are only ever deleted oldest first by pruning
+        complete = (rows[0].seq if rows else head + 1) == seq + 1
+        last = rows[-1].seq if rows else max(seq, head)
+        if len(rows) < limit:
+            self._changes_seen = (last, version)
+        return SettingsChanges(
+            [row for row in rows if row.origin != self.origin],
+            encode_cursor("settings_changes", last),
+            complete
+        )
+
+    async def _record_settings_changes(self, tr: Cursor, keys: Iterable[Tuple[int, Optional[str]]]) -> None:
+        """Log a write of the given (guild_id, feature) keys, once each, if the change log is enabled"""
+        if self.settings_change_log:
+            await self._executemany(
+                tr, "settings_changes.record",
+                [(guild_id, feature, self.origin) for guild_id, feature in dict.fromkeys(keys)]
+            )
+
+    async def init_features_bulk(
+        self,
+        guild_ids: Iterable[int],
+        defaults: Dict[str, Tuple[bool, Dict[str, Any]]]
+    ) -> int:
+        """Seed missing guild rows and feature rows in a single transaction.
+
+        Existing rows are left untouched, so this is safe to run on every startup.
+
+        Args:
+            guild_ids: Guilds to seed
+            defaults: Feature name -> (enabled, options) to insert where no row exists
+
+        Returns:
+            The number of feature rows that were created
+        """
+        guild_ids = set(guild_ids)
+        if not guild_ids or not defaults:
+            return 0
+        # Serialize each feature's defaults once, not once per guild
+        encoded = [(feature, enabled, json.dumps(options)) for feature, (enabled, options) in defaults.items()]
+        async with self.transaction() as tr:
+            await self._executemany(tr, "guilds.ensure", [(guild_id,) for guild_id in guild_ids])
+            # Options first: they are only written while the feature row is missing
+            await self._executemany(
+                tr, "feature_options.insert_missing",
+                [
+                    {"guild_id": guild_id, "feature": feature, "options_json": options_json}
+                    for guild_id in guild_ids
+                    for feature, _, options_json in encoded
+                ]
+            )
+            cursor = await self._executemany(
+                tr, "feature_settings.insert_missing",
+                [
+                    (guild_id, feature, enabled)
+                    for guild_id in guild_ids
+                    for feature, enabled, _ in encoded
+                ]
+            )
+            # Not logged: a seeded row holds the defaults every process already assumes
+            return cursor.rowcount
 
     async def set_feature_settings(self, guild_id: int, feature: str, enabled: bool, options: Dict[str, Any]) -> None:
         """Set raw feature settings in database. For feature management, use FeatureManager."""
+        options_json = json.dumps(options)
+        if self.write_queue is not None:
+            self.write_queue.set_feature(guild_id, feature, enabled, options_json)
+            return
         async with self.transaction() as tr:
             # Ensure guild exists first
-            await tr.execute("INSERT OR IGNORE INTO guilds (guild_id) VALUES (?)", (guild_id,))
-            
-            # Then set feature settings
-            await tr.execute("""
-                INSERT INTO feature_settings (guild_id, feature, enabled, options_json)
-                VALUES (?, ?, ?, ?)
-                ON CONFLICT(guild_id, feature) DO UPDATE 
-                SET enabled = ?, options_json = ?
-            """, (guild_id, feature, enabled, json.dumps(options), enabled, json.dumps(options)))
+            await self._execute(tr, "guilds.ensure", (guild_id,))
+            await self._replace_features(tr, [(guild_id, feature, enabled, options_json)])
+
+    async def _replace_features(self, tr: Cursor, rows: Sequence[Tuple[int, str, bool, str]]) -> None:
+        """Overwrite whole feature rows, (guild_id, feature, enabled, options_json) each"""
+        await self._executemany(tr, "feature_options.delete", [(g, f) for g, f, _, _ in rows])
+        await self._executemany(tr, "feature_settings.upsert", [(g, f, enabled) for g, f, enabled, _ in rows])
+        await self._executemany(
+            tr, "feature_options.insert_json",
+            [{"guild_id": g, "feature": f, "options_json": options_json} for g, f, _, options_json in rows]
+        )
+        await self._record_settings_changes(tr, [(g, f) for g, f, _, _ in rows])
+
+    async def _seed_feature(self, tr: Cursor, guild_id: int, feature: str, enabled: bool, options: Dict[str, Any]) -> None:
+        """Create a feature row from defaults unless it exists, and migrate a legacy row"""
+        await self._execute(tr, "guilds.ensure", (guild_id,))
+        await self._execute(
+            tr, "feature_options.insert_missing",
+            {"guild_id": guild_id, "feature": feature, "options_json": json.dumps(options)}
+        )
+        await self._execute(tr, "feature_settings.insert_missing", (guild_id, feature, enabled))
+        await self._migrate_feature_rows(tr, [(guild_id, feature)])
+
+    async def _flush_pending_feature(self, guild_id: int, feature: str) -> None:
+        """Write a queued whole-row feature write before patching the row in place.
+        Otherwise the later flush would overwrite the patch with the stale row."""
+        if self.write_queue is not None and self.write_queue.pending_feature(guild_id, feature) is not None:
+            await self.write_queue.flush()
+
+    async def get_feature_option(self, guild_id: int, feature: str, key: str, default: Any = None) -> Any:
+        """Get a single option value, decoding only that option"""
+        if self.write_queue is not None:
+            pending = self.write_queue.pending_feature(guild_id, feature)
+            if pending is not None:
+                return json.loads(pending[1]).get(key, default)
+
+        value_json = await self.single_flight.run(
+            ("feature_settings.get_option", guild_id, feature, key),
+            lambda: self._fetchone(
+                "feature_settings.get_option", {"guild_id": guild_id, "feature": feature, "key": key}
+            ),
+            _FEATURE_TABLES
+        )
+        return default if value_json is None else json.loads(value_json)
+
+    async def set_feature_enabled(
+        self,
+        guild_id: int,
+        feature: str,
+        enabled: bool,
+        default_options: Dict[str, Any]
+    ) -> None:
+        """Set a feature's enabled flag and keep its stored options.
+        A missing feature is created with ``default_options``"""
+        await self._flush_pending_feature(guild_id, feature)
+        async with self.transaction() as tr:
+            await self._seed_feature(tr, guild_id, feature, enabled, default_options)
+            await self._execute(tr, "feature_settings.set_enabled", (guild_id, feature, enabled))
+            await self._record_settings_changes(tr, [(guild_id, feature)])
+
+    async def patch_feature_options(
+        self,
+        guild_id: int,
+        feature: str,
+        options: Dict[str, Any],
+        default: Tuple[bool, Dict[str, Any]]
+    ) -> None:
+        """Replace individual option keys, leaving the other keys untouched.
+
+        Each key is one small ``feature_options`` row, so the cost does not
+        depend on the size of the other options, and concurrent patches of
+        different keys cannot overwrite each other. A missing feature is first
+        created from ``default`` (enabled, options).
+        """
+        if not options:
+            return
+        await self._flush_pending_feature(guild_id, feature)
+        enabled, default_options = default
+        async with self.transaction() as tr:
+            await self._seed_feature(tr, guild_id, feature, enabled, default_options)
+            await self._executemany(
+                tr, "feature_options.upsert",
+                [
+                    {"guild_id": guild_id, "feature": feature, "key": key, "value": json.dumps(value)}
+                    for key, value in options.items()
+                ]
+            )
+            await self._record_settings_changes(tr, [(guild_id, feature)])
+
+    async def patch_feature_list_item(
+        self,
+        guild_id: int,
+        feature: str,
+        key: str,
+        match: Tuple[str, Any],
+        updates: Dict[str, Any]
+    ) -> bool:
+        """Update fields of the first object in the ``key`` option list whose
+        ``match`` (field, value) pair is equal, if the feature is enabled.
+
+        The item is located and changed with json_each/json_set inside SQLite,
+        so the list is never read back into Python.
+
+        Returns:
+            Whether an item was updated
+        """
+        if not updates:
+            return False
+        await self._flush_pending_feature(guild_id, feature)
+        match_field, match_value = match
+        async with self.transaction() as tr:
+            await self._migrate_feature_rows(tr, [(guild_id, feature)])
+            cursor = await self._executemany(
+                tr, "feature_options.set_list_item_field",
+                [
+                    {
+                        "guild_id": guild_id,
+                        "feature": feature,
+                        "key": key,
+                        "match_field": match_field,
+                        "match_value": match_value,
+                        "field": field,
+                        "value": json.dumps(value),
+                    }
+                    for field, value in updates.items()
+                ]
+            )
+            updated = cursor.rowcount > 0
+            if updated:
+                await self._record_settings_changes(tr, [(guild_id, feature)])
+            return updated
+
+    # -------------------- Leveling Methods --------------------
+
+    async def get_user_xp(self, guild_id: int, user_id: int) -> Optional[UserXP]:
+        """Get a user's XP and level"""
+        return await self._fetchone("xp.get", (guild_id, user_id))
+
+    async def update_user_xp(self, guild_id: int, user_id: int, xp: int, level: int) -> None:
+        """Set a user's XP and level"""
+        async with self.transaction() as tr:
+            await self._execute(tr, "xp.set", (guild_id, user_id, xp, level))
+
+    async def update_user_xp_with_message(
+        self,
+        guild_id: int,
+        user_id: int,
+        xp: int,
+        level: int,
+        xp_gain: int,
+        message: str
+    ) -> None:
+        """Set a user's XP and level and remember the message that earned it"""
+        async with self.transaction() as tr:
+            await self._execute(tr, "xp.set_with_message", (guild_id, user_id, xp, level, xp_gain, message))
+
+    async def reset_user_xp(self, guild_id: int, user_id: int) -> None:
+        """Reset a user's XP and level"""
+        async with self.transaction() as tr:
+            await self._execute(tr, "xp.reset", (guild_id, user_id))
+
+    async def delete_all_xp(self, guild_id: int) -> None:
+        """Delete all XP data of a guild"""
+        async with self.transaction() as tr:
+            await self._execute(tr, "xp.delete_guild", (guild_id,))
+
+    async def get_leaderboard(self, guild_id: int) -> List[LeaderboardEntry]:
+        """Get every user of a guild ordered by XP"""
+        return await self._fetchall("xp.leaderboard_page", (guild_id, -1, 0))
+
+    async def get_leaderboard_page(self, guild_id: int, limit: int = 10, offset: int = 0) -> List[LeaderboardEntry]:
+        """Get one page of the leaderboard"""
+        return await self._fetchall("xp.leaderboard_page", (guild_id, limit, offset))
+
+    async def get_leaderboard_after(self, guild_id: int, limit: int = 10, cursor: Optional[str] = None) -> Page:
+        """Get the leaderboard page after ``cursor``.
+
+        Seeks on the (xp DESC, user_id) index, so every page costs the same
+        no matter how deep it is.
+        """
+        if cursor is None:
+            rows = await self._fetchall("xp.leaderboard_page", (guild_id, limit + 1, 0))
+        else:
+            xp, user_id = decode_cursor("leaderboard", cursor)
+            rows = await self._fetchall("xp.leaderboard_after", (guild_id, xp, xp, user_id, limit + 1))
+        return make_page(rows, limit, "leaderboard", lambda row: (row['xp'], row['user_id']))
+
+    async def get_leaderboard_cursor(self, guild_id: int, offset: int) -> Optional[str]:
+        """Cursor that skips the first ``offset`` entries. The skipped entries
+        are only stepped over in the leaderboard index, a single row is read"""
+        if offset <= 0:
+            return None
+        row = await self._fetchone("xp.leaderboard_seek", (guild_id, offset - 1))
+        return encode_cursor("leaderboard", row[0], row[1]) if row is not None else None
+
+    async def iter_leaderboard(self, guild_id: int, batch_size: int = 500) -> AsyncIterator[LeaderboardEntry]:
+        """Stream the leaderboard, highest XP first, from a single index walk"""
+        async with aclosing(self._stream("xp.leaderboard_page", (guild_id, -1, 0), batch_size)) as rows:
+            async for row in rows:
+                yield row
+
+    async def get_xp_cooldown(self, guild_id: int, user_id: int) -> Optional[float]:
+        """Get the epoch time in seconds a user last earned XP"""
+        last = await self._fetchone("xp.get_cooldown", (guild_id, user_id))
+        return epoch_ms(last) / 1000 if last is not None else None
+
+    async def set_xp_cooldown(self, guild_id: int, user_id: int, timestamp: float) -> None:
+        """Set the epoch time in seconds a user last earned XP"""
+        async with self.transaction() as tr:
+            await self._execute(tr, "xp.set_cooldown", (guild_id, user_id, epoch_ms(timestamp)))
+
+    async def set_level_role(self, guild_id: int, level: int, role_id: int) -> None:
+        """Set the reward role for a level"""
+        async with self.transaction() as tr:
+            await self._execute(tr, "level_roles.set", (guild_id, level, role_id))
+
+    async def delete_level_role(self, guild_id: int, level: int) -> None:
+        """Remove the reward role for a level"""
+        async with self.transaction() as tr:
+            await self._execute(tr, "level_roles.delete", (guild_id, level))
+
+    async def get_level_roles(self, guild_id: int) -> List[Dict[str, Any]]:
+        """Get every level reward of a guild"""
+        return await self._fetchall("level_roles.list", (guild_id,))
+
+    async def get_level_roles_for_level(self, guild_id: int, level: int) -> List[int]:
+        """Get the reward role IDs for a level"""
+        return await self._fetchall("level_roles.for_level", (guild_id, level))
+
+    # -------------------- Role Methods --------------------
+
+    async def add_reaction_role(self, guild_id: int, message_id: int, emoji: str, role_id: int) -> None:
+        """Store a reaction role binding"""
+        async with self.transaction() as tr:
+            await self._execute(tr, "reaction_roles.add", (guild_id, message_id, emoji, role_id))
+
+    async def remove_reaction_role(self, guild_id: int, message_id: int, emoji: str) -> None:
+        """Remove a reaction role binding"""
+        async with self.transaction() as tr:
+            await self._execute(tr, "reaction_roles.remove", (guild_id, message_id, emoji))
+
+    async def get_reaction_roles(self, guild_id: int) -> List[Dict[str, Any]]:
+        """Get every reaction role binding of a guild"""
+        return await self._fetchall("reaction_roles.list", (guild_id,))
+
+    # -------------------- Moderation Methods --------------------
+
+    async def insert_mod_action(
+        self,
+        guild_id: int,
+        user_id: int,
+        action: str,
+        reason: Optional[str],
+        moderator_id: int
+    ) -> None:
+        """Record a moderation action"""
+        async with self.transaction() as tr:
+            await self._execute(tr, "mod_actions.insert", (guild_id, user_id, action, reason, moderator_id))
+
+    async def get_mod_actions_page(self, guild_id: int, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
+        """Get moderation actions, newest first"""
+        return await self._fetchall("mod_actions.page", (guild_id, limit, offset))
+
+    async def get_mod_actions_after(self, guild_id: int, limit: int = 10, cursor: Optional[str] = None) -> Page:
+        """Get the moderation actions page after ``cursor``, newest first"""
+        if cursor is None:
+            rows = await self._fetchall("mod_actions.page", (guild_id, limit + 1, 0))
+        else:
+            before_id, = decode_cursor("mod_actions", cursor)
+            rows = await self._fetchall("mod_actions.page_before", (guild_id, before_id, limit + 1))
+        return make_page(rows, limit, "mod_actions", lambda row: (row['id'],))
+
+    async def iter_mod_actions(self, guild_id: int, batch_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """Stream moderation actions, newest first"""
+        async with aclosing(self._stream("mod_actions.page", (guild_id, -1, 0), batch_size)) as rows:
+            async for row in rows:
+                yield row
+
+    # -------------------- Whisper Methods --------------------
+
+    async def create_whisper(self, guild_id: int, whisper_id: str, user_id: int, thread_id: int) -> None:
+        """Record a new whisper thread"""
+        async with self.transaction() as tr:
+            await self._execute(tr, "whispers.create", (guild_id, whisper_id, user_id, thread_id))
+
+    async def close_whisper(self, guild_id: int, whisper_id: str) -> None:
+        """Mark a whisper thread as closed"""
+        async with self.transaction() as tr:
+            await self._execute(tr, "whispers.close", (guild_id, whisper_id))
+
+    async def get_whispers_by_user(self, guild_id: int, user_id: int) -> List[Dict[str, Any]]:
+        """Get a user's whispers, newest first"""
+        return await self._fetchall("whispers.by_user", (guild_id, user_id))
+
+    async def get_all_whispers(self, guild_id: int) -> List[Dict[str, Any]]:
+        """Get every whisper of a guild, newest first"""
+        return await self._fetchall("whispers.list", (guild_id,))
+
+    async def delete_all_whispers(self, guild_id: int) -> None:
+        """Delete every whisper of a guild"""
+        async with self.transaction() as tr:
+            await self._execute(tr, "whispers.delete_guild", (guild_id,))
 
     # -------------------- Logging Methods --------------------
 
     async def add_log(self, guild_id: int, event_type: str, description: str) -> None:
         """Add a log entry"""
-        async with self.transaction() as tr:
-            await tr.execute(
-                "INSERT INTO logs (guild_id, event_type, description) VALUES (?, ?, ?)",
-                (guild_id, event_type, description)
-            )
+        if self.write_queue is not None:
+            self.write_queue.add_log(guild_id, event_type, description)
+            return
+        async with self.transaction(Priority.BACKGROUND) as tr:
+            await self._insert_logs(tr, [(guild_id, event_type, description, now_ms())])
 
-    async def get_logs(self, guild_id: int, event_type: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+    async def get_logs(self, guild_id: int, event_type: Optional[str] = None, limit: int = 100) -> List[LogEntry]:
         """Get logs with optional filtering"""
-        query = "SELECT * FROM logs WHERE guild_id = ?"
-        params: List[Any] = [guild_id]
-        
+        return await self.get_logs_filtered(guild_id, event_type, None, limit)
+
+    async def get_logs_filtered(
+        self,
+        guild_id: int,
+        event_type: Optional[str] = None,
+        since_days: Optional[int] = None,
+        limit: int = -1
+    ) -> List[LogEntry]:
+        """Get logs newer than ``since_days`` days, newest first.
+
+        Only the weekly partitions overlapping the window are read, newest
+        first, stopping as soon as ``limit`` rows have been found.
+        """
+        if self.write_queue is not None:
+            await self.write_queue.flush()  # Make queued logs visible
+
+        if since_days is None:
+            tables = self.log_partitions.tables()
+            if event_type:
+                return await self._fetch_partitions("logs.recent_by_type", tables, (guild_id, event_type), limit)
+            return await self._fetch_partitions("logs.recent", tables, (guild_id,), limit)
+
+        cutoff = cutoff_ms(since_days)
+        tables = self.log_partitions.tables(since=cutoff)
         if event_type:
-            query += " AND event_type = ?"
-            params.append(event_type)
-            
-        query += " ORDER BY timestamp DESC LIMIT ?"
-        params.append(limit)
-        
-        async with self.connection.execute(query, params) as cursor:
-            rows = await cursor.fetchall()
-            return [dict(zip([c[0] for c in cursor.description], row)) for row in rows]
+            return await self._fetch_partitions("logs.since_by_type", tables, (guild_id, event_type, cutoff), limit)
+        return await self._fetch_partitions("logs.since", tables, (guild_id, cutoff), limit)
+
+    async def get_logs_after(
+        self,
+        guild_id: int,
+        event_type: Optional[str] = None,
+        since_days: Optional[int] = None,
+        search: Optional[str] = None,
+        limit: int = 10,
+        cursor: Optional[str] = None
+    ) -> Page:
+        """Get the logs page after ``cursor``, newest first.
+
+        The cursor carries the (timestamp, id) of the last row and the window
+        start, so each page seeks straight to its position and only reads the
+        partitions between the window start and that row.
+        """
+        if cursor is None:
+            if self.write_queue is not None:
+                await self.write_queue.flush()
+            since = cutoff_ms(since_days) if since_days is not None else 0
+            before, before_id = _END_OF_TIME, 0
+            tables = self.log_partitions.tables(since=since)
+        else:
+            before, before_id, since = decode_cursor("logs", cursor)
+            tables = self.log_partitions.tables(since=since, until=before)
+
+        statement = "logs.page_before_by_type" if event_type is not None else "logs.page_before"
+        rows = await self._fetch_partitions(statement, tables, {
+            'guild_id': guild_id,
+            'since': since,
+            'before': before,
+            'before_id': before_id,
+            'event_type': event_type,
+            'search': search,
+        }, limit + 1)
+        return make_page(
+            rows, limit, "logs",
+            lambda row: (epoch_ms(row['timestamp']), row['id'], since)
+        )
+
+    async def iter_logs(
+        self,
+        guild_id: int,
+        event_type: Optional[str] = None,
+        since_days: Optional[int] = None,
+        batch_size: int = 500
+    ) -> AsyncIterator[LogEntry]:
+        """Stream logs, newest first, one partition at a time.
+
+        Rows are fetched ``batch_size`` at a time, so memory use stays
+        constant. Wrap the iterator in ``contextlib.aclosing`` when it may be
+        abandoned early, so the pooled reader is returned right away.
+        """
+        if self.write_queue is not None:
+            await self.write_queue.flush()
+        since = cutoff_ms(since_days) if since_days is not None else 0
+        params = {
+            'guild_id': guild_id,
+            'since': since,
+            'before': _END_OF_TIME,
+            'before_id': 0,
+            'event_type': event_type,
+            'search': None,
+            'limit': -1,
+        }
+        statement = "logs.page_before_by_type" if event_type is not None else "logs.page_before"
+        for table in self.log_partitions.tables(since=since):
+            async with aclosing(self._stream(statement, params, batch_size, table=table)) as rows:
+                async for row in rows:
+                    yield row
 
     async def clear_old_logs(self, guild_id: int, days: int) -> None:
         """Clear logs older than specified days"""
+        if self.write_queue is not None:
+            await self.write_queue.flush()
+        cutoff = cutoff_ms(days)
+        tables = self.log_partitions.tables(until=cutoff)
         async with self.transaction() as tr:
-            await tr.execute(
-                "DELETE FROM logs WHERE guild_id = ? AND timestamp < datetime('now', ?)",
-                (guild_id, f'-{days} days')
-            )
+            await self._execute_partitions(tr, "logs.delete_older_than", tables, (guild_id, cutoff))
+
+    async def purge_old_logs(self, days: int) -> None:
+        """Clear every guild's logs older than specified days.
 
+        Partitions that end before the cutoff are dropped whole, only the
+        partition the cutoff falls into is trimmed row by row.
+        """
+        if self.write_queue is not None:
+            await self.write_queue.flush()
+        cutoff = cutoff_ms(days)
+        async with self.transaction() as tr:
+            dropped = await self.log_partitions.drop_older_than(tr, cutoff)
+            boundary = self.log_partitions.table_for(cutoff)
+            if boundary is not None:
+                await self._execute_partitions(tr, "logs.purge_older_than", [boundary], (cutoff,))
+        if dropped:
+            self.log.info(f"Dropped {len(dropped)} expired log partition(s)")
@@ -0,0 +1,515 @@
+"""Run the SQLite backend in a separate worker process.
+
+aiosqlite moves statement execution to a thread, but JSON encoding, row
+decoding and record building still run in the bot process and hold the GIL
+while the gateway is trying to handle events. With ``DB_WORKER`` enabled,
+:class:`WorkerBackend` starts a child process that owns the real backend and
+forwards every storage call to it over a Unix socket. It implements the same
+:class:`~utils.storage.StorageBackend` interface, so cogs don't notice.
+
+Protocol: every frame is a 4-byte big-endian length followed by a pickled list.
+The client sends ``(request_id, method_index, args, kwargs, priority)`` tuples
+and the worker answers with ``(request_id, ok, value)`` tuples, where ``value``
+is the result or the exception raised. Methods are sent as indexes into
+:data:`REMOTE_METHODS`, which both sides build from the same code, and
+``priority`` is the caller's :class:`~utils.priority.Priority`, so the worker
+queues database work the way the bot process would. Calls issued during the
+same event loop iteration go out as one frame, and replies finished together
+come back as one frame, so bursts cost one write per side.
+
+The socket lives in a private temporary directory that only the bot's user can
+open. Both processes run the same code base, so frames are trusted.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import inspect
+import itertools
+import logging
+import multiprocessing
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+import time
+
+from utils.db_backup import BackupReport
+from utils.priority import Priority, current_priority, set_db_priority
+from utils.storage import StorageBackend, create_storage
+
+_HEADER = struct.Struct("!I")
+
+# Storage coroutines forwarded to the worker, then control operations.
+# iter_* are not forwarded: the client walks them with keyset pages.
+REMOTE_METHODS: Tuple[str, ...] = tuple(sorted(
+    name for name, member in inspect.getmembers(StorageBackend)
+    if not name.startswith("_")
+    and inspect.iscoroutinefunction(member)
+    and name not in ("init", "close")
+)) + ("_close", "_snapshot", "_reset_query_stats")
+_METHOD_INDEX = {name: index for index, name in enumerate(REMOTE_METHODS)}
+
+# Snapshot sizes fetched for query_stats(), which then slices locally
+_SNAPSHOT_TOP = 1000
+_SNAPSHOT_SLOW = 1000
+
+
+def _encode(items: List[Tuple[Any, ...]]) -> bytes:
+    payload = pickle.dumps(items, protocol=pickle.HIGHEST_PROTOCOL)
+    return _HEADER.pack(len(payload)) + payload
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Optional[List[Tuple[Any, ...]]]:
+    """Read one frame, or None once the other side has closed the connection"""
+    try:
+        header = await reader.readexactly(_HEADER.size)
+        (length,) = _HEADER.unpack(header)
+        return pickle.loads(await reader.readexactly(length))
+    except asyncio.IncompleteReadError:
+        return None
+
+
+def _portable(error: BaseException) -> BaseException:
+    """The exception itself if it survives pickling, else a RuntimeError describing it"""
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
+
+
+# -------------------- Worker --------------------
+
+class _WorkerServer:
+    """Serves one client connection on behalf of the real backend"""
+
+    def __init__(self, backend: StorageBackend, log: logging.Logger) -> None:
+        self.backend = backend
+        self.log = log
+        self.stopped = asyncio.Event()
+        self._outbox: List[Tuple[Any, ...]] = []
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._handler: Optional[asyncio.Task] = None
+        self._tasks: set = set()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if self._writer is not None:
+            writer.close()  # One bot process per worker
+            return
+        self._writer = writer
+        self._handler = asyncio.current_task()
+        try:
+            while (batch := await _read_frame(reader)) is not None:
+                for request_id, index, args, kwargs, priority in batch:
+                    task = asyncio.create_task(
+                        self._run(request_id, REMOTE_METHODS[index], args, kwargs or {}, Priority(priority))
+                    )
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+        finally:
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            writer.close()
+            self.stopped.set()
+
+    async def _run(
+        self,
+        request_id: int,
+        name: str,
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+        priority: Priority
+    ) -> None:
+        set_db_priority(priority)
+        try:
+            if name == "_close":
+                await self.backend.close(*args, **kwargs)
+                value = None
+            elif name == "_snapshot":
+                value = {
+                    "stats": self.backend.stats(),
+                    "query_stats": self.backend.query_stats(top=_SNAPSHOT_TOP, slow=_SNAPSHOT_SLOW),
+                }
+            elif name == "_reset_query_stats":
+                value = self.backend.reset_query_stats()
+            else:
+                value = await getattr(self.backend, name)(*args, **kwargs)
+            reply = (request_id, True, value)
+        except Exception as e:
+            reply = (request_id, False, _portable(e))
+        self._send(reply)
+        if name == "_close":
+            self._flush()
+            self.stopped.set()
+
+    async def disconnect(self) -> None:
+        """Close the client connection and wait for its handler to finish"""
+        if self._writer is not None:
+            self._writer.close()
+        if self._handler is not None and self._handler is not asyncio.current_task():
+            await asyncio.wait([self._handler], timeout=5)
+
+    def _send(self, reply: Tuple[Any, ...]) -> None:
+        if not self._outbox:
+            asyncio.get_running_loop().call_soon(self._flush)
+        self._outbox.append(reply)
+
+    def _flush(self) -> None:
+        if not self._outbox or self._writer is None or self._writer.is_closing():
+            self._outbox.clear()
+            return
+        replies, self._outbox = self._outbox, []
+        try:
+            frame = _encode(replies)
+        except Exception:
+            # Encode one by one so a single unpicklable result doesn't fail the batch
+            frame = b"".join(_encode([self._encodable(reply)]) for reply in replies)
+        self._writer.write(frame)
+
+    @staticmethod
+    def _encodable(reply: Tuple[Any, ...]) -> Tuple[Any, ...]:
+        try:
+            pickle.dumps(reply, protocol=pickle.HIGHEST_PROTOCOL)
+            return reply
+        except Exception as e:
+            return (reply[0], False, RuntimeError(f"Unserializable database result: {e}"))
+
+
+async def _serve(socket_path: str, db_path: str, shards: int, options: Dict[str, Any]) -> None:
+    log = logging.getLogger("DBWorker")
+    backend = create_storage("sqlite", db_path, shards=shards, logger=log, **options)
+    await backend.init()
+    server = _WorkerServer(backend, log)
+    listener = await asyncio.start_unix_server(server.handle, path=socket_path)
+    log.info(f"Database worker {os.getpid()} serving {db_path}")
+    try:
+        await server.stopped.wait()
+    finally:
+        listener.close()
+        await server.disconnect()
+        # Closes the backend if the bot went away without asking
+        await backend.close()
+        log.info(f"Database worker {os.getpid()} stopped")
+
+
+def _worker_main(socket_path: str, db_path: str, shards: int, options: Dict[str, Any]) -> None:
+    """Entry point of the worker process"""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    asyncio.run(_serve(socket_path, db_path, shards, options))
+
+
+# -------------------- Client --------------------
+
+def _remote(name: str):
+    """Forward a storage method to the worker"""
+    index = _METHOD_INDEX[name]
+
+    async def method(self: WorkerBackend, *args: Any, **kwargs: Any) -> Any:
+        return await self._call(index, args, kwargs)
+
+    method.__name__ = name
+    method.__qualname__ = f"WorkerBackend.{name}"
+    method.__doc__ = getattr(StorageBackend, name).__doc__
+    return method
+
+
+class WorkerBackend(StorageBackend):
+    """Storage backend proxy whose SQLite work runs in a child process.
+
+    Args:
+        db_path: Database file opened by the worker
+        shards: Shard count passed on to the worker's backend
+        logger: Logger of the bot process, not sent to the worker
+        startup_timeout: Seconds to wait for the worker to open the database
+        stats_interval: Seconds between refreshes of the worker's stats, which
+            :meth:`stats` and :meth:`query_stats` return without waiting
+        **options: Keyword arguments for the worker's backend
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        shards: int = 0,
+        logger: Optional[logging.Logger] = None,
+        startup_timeout: float = 120.0,
+        stats_interval: float = 5.0,
+        **options: Any
+    ) -> None:
+        self.db_path = db_path
+        self.shards = shards
+        self.options = options
+        self.log = logger or logging.getLogger("WorkerBackend")
+        self.startup_timeout = startup_timeout
+        self.stats_interval = stats_interval
+        self._process: Optional[multiprocessing.process.BaseProcess] = None
+        self._socket_dir: Optional[str] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._receiver: Optional[asyncio.Task] = None
+        self._refresher: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._outbox: List[Tuple[Any, ...]] = []
+        self._ids = itertools.count()
+        self._snapshot: Dict[str, Any] = {"stats": {}, "query_stats": None}
+
+        # Stats
+        self.requests = 0
+        self.frames_sent = 0
+        self.frames_received = 0
+        self.bytes_sent = 0
+
+    # -------------------- Lifecycle --------------------
+
+    async def init(self) -> None:
+        """Start the worker process and connect to it once the database is open"""
+        self._socket_dir = tempfile.mkdtemp(prefix="whisper-db-")
+        socket_path = os.path.join(self._socket_dir, "db.sock")
+        context = multiprocessing.get_context("spawn")
+        self._process = context.Process(
+            target=_worker_main,
+            args=(socket_path, str(Path(self.db_path).resolve()), self.shards, self.options),
+            name="db-worker",
+            daemon=True
+        )
+        self._process.start()
+
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            if not self._process.is_alive():
+                exitcode = self._process.exitcode
+                self._cleanup()
+                raise RuntimeError(f"Database worker exited during startup with code {exitcode}")
+            try:
+                self._reader, self._writer = await asyncio.open_unix_connection(socket_path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    self._process.terminate()
+                    self._cleanup()
+                    raise RuntimeError(f"Database worker did not start within {self.startup_timeout:g}s")
+                await asyncio.sleep(0.05)
+
+        self._receiver = asyncio.create_task(self._receive(), name="db-worker-receive")
+        self._refresher = asyncio.create_task(self._refresh_stats(), name="db-worker-stats")
+        self.log.info(f"Connected to database worker {self._process.pid}")
+
+    async def close(self, drain_timeout: float = 5.0) -> None:
+        """Ask the worker to drain and close its backend, then stop it"""
+        if self._process is None:
+            return
+        if self._refresher is not None:
+            self._refresher.cancel()
+        try:
+            await self._call(_METHOD_INDEX["_close"], (drain_timeout,), {})
+        except ConnectionError:
+            pass
+        except Exception as e:
+            self.log.error(f"Error closing database worker: {e}")
+        if self._writer is not None:
+            self._writer.close()
+        process = self._process
+        await asyncio.get_running_loop().run_in_executor(None, process.join, drain_timeout + 5)
+        if process.is_alive():
+            self.log.warning(f"Database worker {process.pid} did not exit, terminating it")
+            process.terminate()
+        if self._receiver is not None:
+            self._receiver.cancel()
+        self._cleanup()
+        self.log.info("Database worker stopped")
+
+    def _cleanup(self) -> None:
+        self._process = None
+        if self._socket_dir is not None:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+
+    # -------------------- Transport --------------------
+
+    def _call(self, index: int, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> asyncio.Future:
+        if self._writer is None or self._writer.is_closing():
+            raise ConnectionError("Database worker is not connected")
+        loop = asyncio.get_running_loop()
+        request_id = next(self._ids)
+        future = loop.create_future()
+        self._pending[request_id] = future
+        if not self._outbox:
+            loop.call_soon(self._flush)
+        self._outbox.append((request_id, index, args, kwargs or None, int(current_priority())))
+        self.requests += 1
+        return future
+
+    def _flush(self) -> None:
+        requests, self._outbox = self._outbox, []
+        if not requests:
+            return
+        try:
+            frame = _encode(requests)
+        except Exception as e:
+            for request_id, *_ in requests:
+                future = self._pending.pop(request_id, None)
+                if future is not None and not future.done():
+                    future.set_exception(TypeError(f"Storage call arguments can't be sent to the worker: {e}"))
+            return
+        if self._writer is None or self._writer.is_closing():
+            self._fail_pending(ConnectionError("Database worker is not connected"))
+            return
+        self._writer.write(frame)
+        self.frames_sent += 1
+        self.bytes_sent += len(frame)
+
+    async def _receive(self) -> None:
+        try:
+            while (replies := await _read_frame(self._reader)) is not None:
+                self.frames_received += 1
+                for request_id, ok, value in replies:
+                    future = self._pending.pop(request_id, None)
+                    if future is None or future.done():
+                        continue
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.log.error(f"Database worker connection failed: {e}")
+        self._fail_pending(ConnectionError("Database worker connection lost"))
+
+    def _fail_pending(self, error: Exception) -> None:
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def _refresh_stats(self) -> None:
+        while True:
+            try:
+                self._snapshot = await self._call(_METHOD_INDEX["_snapshot"], (), {})
+            except ConnectionError:
+                return
+            except Exception as e:
+                self.log.debug(f"Could not refresh database worker stats: {e}")
+            await asyncio.sleep(self.stats_interval)
+
+    # -------------------- Stats --------------------
+
+    def stats(self) -> Dict[str, Any]:
+        """Transport statistics plus the worker backend's last reported stats"""
+        return {
+            "worker": {
+                "pid": self._process.pid if self._process is not None else None,
+                "requests": self.requests,
+                "in_flight": len(self._pending),
+                "frames_sent": self.frames_sent,
+                "frames_received": self.frames_received,
+                "avg_batch": round(self.requests / self.frames_sent, 2) if self.frames_sent else 0.0,
+                "bytes_sent": self.bytes_sent,
+            },
+            **self._snapshot["stats"],
+        }
+
+    def query_stats(self, top: int = 10, by: str = "total_ms", slow: int = 10) -> Optional[Dict[str, Any]]:
+        """The worker's query metrics as of the last refresh"""
+        snapshot = self._snapshot["query_stats"]
+        if snapshot is None:
+            return None
+        statements = sorted(snapshot["statements"].items(), key=lambda item: item[1][by], reverse=True)
+        return {
+            **snapshot,
+            "statements": dict(statements[:top]),
+            "slow_queries": snapshot["slow_queries"][:slow],
+        }
+
+    def reset_query_stats(self) -> None:
+        """Reset the worker's query metrics"""
+        self._snapshot["query_stats"] = None
+        future = self._call(_METHOD_INDEX["_reset_query_stats"], (), {})
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    async def backup(self, progress: Optional[Callable[[BackupReport], None]] = None) -> List[BackupReport]:
+        """Snapshot the worker's databases.
+
+        Callbacks can't cross the process boundary, so ``progress`` is only
+        called once per finished snapshot. The worker logs progress itself.
+        """
+        reports = await self._call(_METHOD_INDEX["backup"], (), {})
+        if progress is not None:
+            for report in reports:
+                progress(report)
+        return reports
+
+    # -------------------- Forwarded --------------------
+
+    drain = _remote("drain")
+
+    add_guild = _remote("add_guild")
+    add_guilds_bulk = _remote("add_guilds_bulk")
+    remove_guild = _remote("remove_guild")
+    get_guild_prefix = _remote("get_guild_prefix")
+    set_guild_prefix = _remote("set_guild_prefix")
+    get_guild_setting = _remote("get_guild_setting")
+    set_guild_setting = _remote("set_guild_setting")
+    get_guild_settings = _remote("get_guild_settings")
+    delete_guild_data = _remote("delete_guild_data")
+    purge_guild = _remote("purge_guild")
+    cancel_guild_purge = _remote("cancel_guild_purge")
+    get_global_stats = _remote("get_global_stats")
+
+    update_user_activity = _remote("update_user_activity")
+    increment_user_commands = _remote("increment_user_commands")
+    delete_user_data = _remote("delete_user_data")
+
+    get_feature_settings = _remote("get_feature_settings")
+    get_all_feature_settings = _remote("get_all_feature_settings")
+    get_feature_rows_after = _remote("get_feature_rows_after")
+    get_settings_changes = _remote("get_settings_changes")
+    get_feature_option = _remote("get_feature_option")
+    set_feature_settings = _remote("set_feature_settings")
+    init_features_bulk = _remote("init_features_bulk")
+    set_feature_enabled = _remote("set_feature_enabled")
+    patch_feature_options = _remote("patch_feature_options")
+    patch_feature_list_item = _remote("patch_feature_list_item")
+    get_whisper_settings = _remote("get_whisper_settings")
+    set_whisper_channel = _remote("set_whisper_channel")
+    get_autoroles = _remote("get_autoroles")
+    remove_autorole = _remote("remove_autorole")
+
+    get_user_xp = _remote("get_user_xp")
+    update_user_xp = _remote("update_user_xp")
+    update_user_xp_with_message = _remote("update_user_xp_with_message")
+    reset_user_xp = _remote("reset_user_xp")
+    delete_all_xp = _remote("delete_all_xp")
+    get_leaderboard = _remote("get_leaderboard")
+    get_leaderboard_page = _remote("get_leaderboard_page")
+    get_leaderboard_after = _remote("get_leaderboard_after")
+    get_leaderboard_cursor = _remote("get_leaderboard_cursor")
+    get_xp_cooldown = _remote("get_xp_cooldown")
+    set_xp_cooldown = _remote("set_xp_cooldown")
+    set_level_role = _remote("set_level_role")
+    delete_level_role = _remote("delete_level_role")
+    get_level_roles = _remote("get_level_roles")
+    get_level_roles_for_level = _remote("get_level_roles_for_level")
+
+    add_reaction_role = _remote("add_reaction_role")
+    remove_reaction_role = _remote("remove_reaction_role")
+    get_reaction_roles = _remote("get_reaction_roles")
+
+    insert_mod_action = _remote("insert_mod_action")
+    get_mod_actions_page = _remote("get_mod_actions_page")
+    get_mod_actions_after = _remote("get_mod_actions_after")
+
+    create_whisper = _remote("create_whisper")
+    close_whisper = _remote("close_whisper")
+    get_whispers_by_user = _remote("get_whispers_by_user")
+    get_all_whispers = _remote("get_all_whispers")
+    delete_all_whispers = _remote("delete_all_whispers")
+
+    add_log = _remote("add_log")
+    insert_log = _remote("insert_log")
+    get_logs = _remote("get_logs")
+    get_logs_filtered = _remote("get_logs_filtered")
+    get_logs_after = _remote("get_logs_after")
+    clear_old_logs = _remote("clear_old_logs")
+    purge_old_logs = _remote("purge_old_logs")
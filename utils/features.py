@@ -1,8 +1,18 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, List, Mapping, Optional
+from contextlib import aclosing
 from dataclasses import dataclass
 from enum import Enum
+import asyncio
+import logging
 import time
 
+from utils.guild_settings import FeatureSnapshot, GuildSettings
+from utils.priority import Priority, db_priority
+from utils.records import cutoff_ms, epoch_ms
+from utils.settings_cache import MISSING, SettingsCache
+from utils.settings_events import FeatureChanged, GuildChanged, SettingsBus, SettingsReset
+from utils.single_flight import SingleFlight
+
 class FeatureType(Enum):
     """Types of features available in the bot"""
     LEVELING = "leveling"
@@ -12,6 +22,9 @@ class FeatureType(Enum):
     AUTOROLES = "autoroles"
     COLOR_ROLES = "color_roles"
 
+# Bit of each feature in GuildSettings.enabled_mask
+FEATURE_BITS: Dict[str, int] = {feature.value: 1 << index for index, feature in enumerate(FeatureType)}
+
 @dataclass
 class FeatureDefaults:
     """Default settings for features"""
@@ -82,11 +95,154 @@ class FeatureDefaults:
 class FeatureManager:
     """Manages feature settings and provides a standard interface"""
     
-    def __init__(self, db):
+    def __init__(self, db, cache_size: int = 10000, cache_ttl: float = 0.0):
         if not db:
             raise ValueError("Database manager cannot be None")
         self.db = db
         self.defaults = FeatureDefaults()
+        # Compiled once, shared by every guild without a stored row
+        self._default_snapshots = {
+            feature.value: FeatureSnapshot(
+                feature.value,
+                getattr(self.defaults, feature.value)["enabled"],
+                getattr(self.defaults, feature.value)["options"]
+            )
+            for feature in FeatureType
+        }
+        # Settings of recently active guilds, see utils.settings_cache
+        self.cache = SettingsCache(cache_size, cache_ttl)
+        # Coalesces settings reads above the backend, which may be a worker process
+        self.single_flight = SingleFlight()
+        self._purges: Dict[int, asyncio.Task] = {}
+        # Guilds written while warm() runs
+        self._written_while_warming: Optional[set] = None
+        # is_enabled() calls answered with a cached disabled flag
+        self.skipped = 0
+        self.log = logging.getLogger("FeatureManager")
+        # Settings change notifications, see utils.settings_events
+        self.bus = SettingsBus(self.log)
+        # Change log polling, see watch()
+        self._change_cursor: Optional[str] = None
+        self._watcher: Optional[asyncio.Task] = None
+        self.remote_changes = 0
+        self.remote_resets = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Settings cache and read coalescing statistics"""
+        return {
+            "cache": self.cache.stats(),
+            "single_flight": self.single_flight.stats(),
+            "skipped": self.skipped,
+            "bus": self.bus.stats(),
+            "watch": {
+                "running": self._watcher is not None,
+                "remote_changes": self.remote_changes,
+                "resets": self.remote_resets,
+            },
+        }
+
+    def invalidate(self, guild_ids: Iterable[int]) -> None:
+        """Forget cached settings of ``guild_ids``. Called after every settings write"""
+        guild_ids = list(guild_ids)
+        self.cache.invalidate(guild_ids)
+        self.single_flight.forget(guild_ids)
+        if self._written_while_warming is not None:
+            self._written_while_warming.update(guild_ids)
+
+    def _changed(self, guild_id: int, feature: FeatureType) -> None:
+        """Drop a guild's cached settings after a write and announce it"""
+        self.invalidate([guild_id])
+        self.bus.publish(FeatureChanged(guild_id, feature))
+
+    async def watch(self, interval: float = 1.0) -> bool:
+        """Follow settings written by other processes sharing the database.
+
+        Polls the backend's change log every ``interval`` seconds, drops the
+        cached settings of every guild written and publishes ``remote`` events.
+        Returns False when the backend keeps no change log, SQLite storage
+        only keeps one when opened with ``settings_change_log``"""
+        if self._watcher is not None:
+            return True
+        changes = await self.db.get_settings_changes()
+        if changes.cursor is None:
+            return False
+        self._change_cursor = changes.cursor
+        self._watcher = asyncio.create_task(self._watch(interval), name="settings-watch")
+        return True
+
+    async def _watch(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.poll_changes()
+            except Exception as e:
+                self.log.error(f"Error polling settings changes: {e}", exc_info=True)
+
+    async def poll_changes(self) -> int:
+        """Apply the settings changes logged since the last poll, see :meth:`watch`.
+        Returns the number of guilds invalidated"""
+        if self._change_cursor is None:
+            return 0
+        with db_priority(Priority.BACKGROUND):
+            changes = await self.db.get_settings_changes(self._change_cursor)
+        if changes.cursor is None:
+            return 0
+        self._change_cursor = changes.cursor
+        if not changes.complete:
+            invalidated = len(self.cache)
+            self.cache.clear()
+            self.single_flight.forget_all()
+            self.remote_resets += 1
+            self.bus.publish(SettingsReset())
+            return invalidated
+
+        written: Dict[int, set] = {}
+        for change in changes.changes:
+            written.setdefault(change.guild_id, set()).add(change.feature)
+        if not written:
+            return 0
+        self.invalidate(written)
+        self.remote_changes += len(changes.changes)
+        for guild_id, features in written.items():
+            if None in features:
+                self.bus.publish(GuildChanged(guild_id, remote=True))
+                continue
+            for feature in FeatureType:
+                if feature.value in features:
+                    self.bus.publish(FeatureChanged(guild_id, feature, remote=True))
+        return len(written)
+
+    async def close(self) -> None:
+        """Stop following the change log"""
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._watcher = None
+
+    async def purge_guild(self, guild_id: int) -> None:
+        """Start deleting a guild's data in the background, see ``StorageBackend.purge_guild``.
+        Cached settings are dropped now and once more when the purge has finished"""
+        await self.db.purge_guild(guild_id)
+        self.invalidate([guild_id])
+        self.bus.publish(GuildChanged(guild_id))
+        if guild_id not in self._purges:
+            self._purges[guild_id] = asyncio.create_task(
+                self._invalidate_after_purge(guild_id), name=f"purge-settings-{guild_id}"
+            )
+
+    async def _invalidate_after_purge(self, guild_id: int) -> None:
+        try:
+            # Joins the purge started above
+            await self.db.delete_guild_data(guild_id)
+        except Exception:
+            pass  # The purge retries on its own
+        finally:
+            self._purges.pop(guild_id, None)
+            self.invalidate([guild_id])
+            self.bus.publish(GuildChanged(guild_id))
         
     async def enable_feature(self, guild_id: int, feature: FeatureType) -> None:
         """Enable a feature with default settings"""
@@ -97,23 +253,63 @@ class FeatureManager:
             True,
             default_config["options"]
         )
+        self._changed(guild_id, feature)
         
     async def disable_feature(self, guild_id: int, feature: FeatureType) -> None:
         """Disable a feature while preserving its settings"""
-        await self.db.set_feature_settings(
+        await self.db.set_feature_enabled(
             guild_id,
             feature.value,
             False,
-            (await self.get_feature_settings(guild_id, feature))["options"]
+            getattr(self.defaults, feature.value)["options"]
         )
+        self._changed(guild_id, feature)
         
-    async def get_feature_settings(self, guild_id: int, feature: FeatureType) -> Dict[str, Any]:
-        """Get feature settings with defaults if not set"""
-        settings = await self.db.get_feature_settings(guild_id, feature.value)
-        if not settings:
-            return getattr(self.defaults, feature.value)
+    async def get_guild_settings(self, guild_id: int) -> GuildSettings:
+        """Compiled settings of every feature of a guild, from the cache or with one query"""
+        settings = self.cache.get(guild_id)
+        if settings is MISSING:
+            generation = self.cache.generation
+            settings = await self.single_flight.run(
+                ("get_all_feature_settings", guild_id),
+                lambda: self._load_guild_settings(guild_id),
+                [guild_id]
+            )
+            self.cache.put(guild_id, settings, generation)
         return settings
+
+    async def _load_guild_settings(self, guild_id: int) -> GuildSettings:
+        rows = await self.db.get_all_feature_settings(guild_id)
+        return GuildSettings.compile(rows, self._default_snapshots, FEATURE_BITS)
+
+    def is_enabled(self, guild_id: int, feature: FeatureType) -> bool:
+        """Whether a feature may be enabled, answered from the cache without awaiting.
+
+        False only when the guild's settings are cached and the feature is off.
+        Listeners return on False, and otherwise await :meth:`get_feature_settings`,
+        which loads the guild if it isn't cached"""
+        settings = self.cache.peek(guild_id)
+        if settings is MISSING or settings.enabled_mask & FEATURE_BITS[feature.value]:
+            return True
+        self.skipped += 1
+        return False
+
+    async def get_feature_settings(self, guild_id: int, feature: FeatureType) -> FeatureSnapshot:
+        """Get feature settings with defaults if not set. The snapshot is shared and
+        read-only, edit ``mutable_options()`` to change settings"""
+        return (await self.get_guild_settings(guild_id))[feature.value]
         
+    async def set_feature_settings(
+        self,
+        guild_id: int,
+        feature: FeatureType,
+        enabled: bool,
+        options: Dict[str, Any]
+    ) -> None:
+        """Replace a feature's enabled flag and options"""
+        await self.db.set_feature_settings(guild_id, feature.value, enabled, options)
+        self._changed(guild_id, feature)
+
     async def update_feature_settings(
         self, 
         guild_id: int, 
@@ -121,14 +317,14 @@ class FeatureManager:
         options: Dict[str, Any]
     ) -> None:
         """Update specific feature settings while preserving others"""
-        current = await self.get_feature_settings(guild_id, feature)
-        current["options"].update(options)
-        await self.db.set_feature_settings(
+        default_config = getattr(self.defaults, feature.value)
+        await self.db.patch_feature_options(
             guild_id,
             feature.value,
-            current["enabled"],
-            current["options"]
+            options,
+            (default_config["enabled"], default_config["options"])
         )
+        self._changed(guild_id, feature)
         
     async def reset_feature(self, guild_id: int, feature: FeatureType) -> None:
         """Reset a feature to default settings"""
@@ -139,6 +335,7 @@ class FeatureManager:
             default_config["enabled"],
             default_config["options"]
         )
+        self._changed(guild_id, feature)
 
     def get_required_permissions(self, feature: FeatureType) -> Dict[str, bool]:
         """Get required bot permissions for a feature"""
@@ -179,21 +376,16 @@ class FeatureManager:
 
     async def update_whisper_thread(self, guild_id: int, whisper_id: str, updates: Dict[str, Any]) -> bool:
         """Update a whisper thread's data"""
-        settings = await self.get_feature_settings(guild_id, FeatureType.WHISPERS)
-        if not settings or not settings['enabled']:
-            return False
-            
-        threads = settings['options'].get('threads', [])
-        for thread in threads:
-            if thread['whisper_id'] == whisper_id:
-                thread.update(updates)
-                await self.update_feature_settings(
-                    guild_id,
-                    FeatureType.WHISPERS,
-                    {'threads': threads}
-                )
-                return True
-        return False
+        updated = await self.db.patch_feature_list_item(
+            guild_id,
+            FeatureType.WHISPERS.value,
+            'threads',
+            ('whisper_id', whisper_id),
+            updates
+        )
+        if updated:
+            self._changed(guild_id, FeatureType.WHISPERS)
+        return updated
 
     async def remove_whisper_thread(self, guild_id: int, whisper_id: str) -> bool:
         """Remove a whisper thread from storage"""
@@ -201,7 +393,7 @@ class FeatureManager:
         if not settings or not settings['enabled']:
             return False
             
-        threads = settings['options'].get('threads', [])
+        threads = settings.mutable_options().get('threads', [])
         new_threads = [t for t in threads if t['whisper_id'] != whisper_id]
         
         if len(new_threads) != len(threads):
@@ -220,13 +412,14 @@ class FeatureManager:
         if not settings or not settings['enabled']:
             return 0
             
-        current_time = time.time()
-        max_age = hours * 3600  # Convert hours to seconds
-        
-        threads = settings['options'].get('threads', [])
+        cutoff = cutoff_ms(hours / 24)
+
+        # closed_at may still be epoch seconds or CURRENT_TIMESTAMP text from older
+        # entries, epoch_ms() normalizes both
+        threads = settings.mutable_options().get('threads', [])
         active_threads = [
-            t for t in threads 
-            if not t['is_closed'] or (current_time - t['closed_at']) < max_age
+            t for t in threads
+            if not t['is_closed'] or t.get('closed_at') is None or epoch_ms(t['closed_at']) >= cutoff
         ]
         
         if len(active_threads) != len(threads):
@@ -240,23 +433,75 @@ class FeatureManager:
 
     async def init_guild_features(self, guild_id: int) -> None:
         """Initialize default features for a new guild"""
-        for feature in FeatureType:
-            settings = await self.get_feature_settings(guild_id, feature)
-            if not settings:
-                default_config = getattr(self.defaults, feature.value)
-                await self.db.set_feature_settings(
-                    guild_id,
-                    feature.value,
-                    default_config["enabled"],
-                    default_config["options"]
-                )
+        await self.init_features_bulk([guild_id])
 
-    async def get_guild_features(self, guild_id: int) -> Dict[str, Dict[str, Any]]:
-        """Get all feature settings for a guild"""
-        features = {}
+    async def init_features_bulk(self, guild_ids: Iterable[int]) -> int:
+        """Seed default settings for every feature a guild is missing.
+        Runs in one transaction regardless of the number of guilds.
+        Returns number of feature rows created"""
+        defaults = {}
         for feature in FeatureType:
-            features[feature.value] = await self.get_feature_settings(guild_id, feature)
-        return features
+            default_config = getattr(self.defaults, feature.value)
+            defaults[feature.value] = (default_config["enabled"], default_config["options"])
+        guild_ids = set(guild_ids)
+        created = await self.db.init_features_bulk(guild_ids, defaults)
+        if created:
+            self.invalidate(guild_ids)
+            for guild_id in guild_ids:
+                self.bus.publish(GuildChanged(guild_id))
+        return created
+
+    async def get_guild_features(self, guild_id: int) -> Mapping[str, FeatureSnapshot]:
+        """Get all feature settings for a guild by feature name"""
+        return (await self.get_guild_settings(guild_id)).features
+
+    async def warm(self, batch_size: int = 1000) -> Dict[str, Any]:
+        """Load the settings of every guild into the cache in one streaming scan.
+
+        Stops once the cache is full. A guild whose settings are written while
+        the scan runs is left out and loads on first use.
+        Returns the number of guilds and rows loaded, the time taken and the
+        approximate size of the cache afterwards"""
+        start = time.perf_counter()
+        guilds = rows = 0
+        guild_id: Optional[int] = None
+        stored: List[Any] = []
+        # The scan reads a snapshot taken when it starts, so a guild written
+        # since then must not be cached from it
+        written = self._written_while_warming = set()
+        resets = self.remote_resets
+
+        def cache_guild() -> None:
+            if guild_id in written or self.remote_resets != resets:
+                return
+            self.cache.put(
+                guild_id, GuildSettings.compile(stored, self._default_snapshots, FEATURE_BITS), self.cache.generation
+            )
+
+        try:
+            async with aclosing(self.db.iter_feature_rows(batch_size)) as scan:
+                async for row in scan:
+                    if row.guild_id != guild_id:
+                        if guild_id is not None:
+                            cache_guild()
+                            guilds += 1
+                        if len(self.cache) >= self.cache.max_guilds:
+                            guild_id = None
+                            break
+                        guild_id, stored = row.guild_id, []
+                    stored.append(row)
+                    rows += 1
+            if guild_id is not None:
+                cache_guild()
+                guilds += 1
+        finally:
+            self._written_while_warming = None
+        return {
+            "guilds": guilds,
+            "rows": rows,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+            "cache_bytes": self.cache.approx_bytes(),
+        }
 
     async def bulk_update_features(self, guild_id: int, updates: Dict[str, Dict[str, Any]]) -> None:
         """Update multiple features at once"""
@@ -0,0 +1,147 @@
+"""Compiled, read-only feature settings of one guild.
+
+Settings are stored as JSON, so a plain read hands out fresh dicts and lists,
+and a listener checking ``event_type in options['events']`` walks a list on
+every event. :class:`FeatureManager` instead compiles the rows of a guild once
+into a :class:`GuildSettings` and caches it until the guild's settings are
+written:
+
+- options are frozen, dicts become read-only mappings and lists become tuples
+- channel and role IDs in options are stored as ints, whatever JSON held
+- the logging event list becomes a frozenset and the configured channel an
+  attribute, so listeners check them without any allocation
+- the enabled flags become one bitmask, so listeners can skip a disabled
+  feature without awaiting anything
+
+Snapshots are shared by every caller. To change settings, edit the copy
+returned by :meth:`FeatureSnapshot.mutable_options` and write it back.
+"""
+from __future__ import annotations
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional
+
+from utils.records import Record
+
+# Top-level options holding a list of role IDs
+_ID_LISTS = frozenset({"roles", "restricted_roles"})
+
+
+def _as_id(value: Any) -> Any:
+    """Snowflake as an int, other values unchanged"""
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return value
+
+
+def freeze(value: Any) -> Any:
+    """Deep read-only copy of decoded JSON"""
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Deep mutable copy of frozen options, the inverse of :func:`freeze`"""
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+def compile_options(options: Optional[Mapping[str, Any]]) -> Mapping[str, Any]:
+    """Frozen options with top-level IDs coerced to ints.
+    Nested values are only frozen, whisper thread entries keep their string IDs"""
+    compiled = {}
+    for key, value in (options or {}).items():
+        if key.endswith("_id"):
+            value = _as_id(value)
+        elif key in _ID_LISTS and isinstance(value, list):
+            value = [_as_id(item) for item in value]
+        compiled[key] = freeze(value)
+    return MappingProxyType(compiled)
+
+
+class FeatureSnapshot(Record):
+    """Compiled settings of one feature. Read-only
+
+    ``events`` is the set of enabled logging events and ``channel_id`` the
+    feature's channel, both taken from the options.
+    """
+
+    __slots__ = ('feature', 'enabled', 'options', 'channel_id', 'events')
+
+    def __init__(self, feature: str, enabled: bool, options: Optional[Mapping[str, Any]]) -> None:
+        options = compile_options(options)
+        events = options.get("events") or ()
+        if isinstance(events, str):
+            events = (events,)
+        channel_id = options.get("channel_id")
+        set_ = object.__setattr__
+        set_(self, 'feature', feature)
+        set_(self, 'enabled', bool(enabled))
+        set_(self, 'options', options)
+        set_(self, 'channel_id', channel_id if isinstance(channel_id, int) else None)
+        set_(self, 'events', frozenset(events))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    @classmethod
+    def from_row(cls, row: Any) -> FeatureSnapshot:
+        """Record with ``feature``, ``enabled`` and ``options`` attributes"""
+        return cls(row.feature, row.enabled, row.options)
+
+    def mutable_options(self) -> Dict[str, Any]:
+        """Deep mutable copy of the options, to edit and write back"""
+        return thaw(self.options)
+
+
+class GuildSettings:
+    """Compiled settings of every feature of one guild. Read-only
+
+    Args:
+        features: Snapshot of every feature by name
+        bits: Bit of every feature in :attr:`enabled_mask`
+    """
+
+    __slots__ = ('features', 'enabled_mask')
+
+    features: Mapping[str, FeatureSnapshot]
+    enabled_mask: int
+
+    def __init__(self, features: Mapping[str, FeatureSnapshot], bits: Mapping[str, int]) -> None:
+        mask = 0
+        for name, snapshot in features.items():
+            if snapshot.enabled:
+                mask |= bits[name]
+        object.__setattr__(self, 'features', MappingProxyType(dict(features)))
+        object.__setattr__(self, 'enabled_mask', mask)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    @classmethod
+    def compile(
+        cls,
+        rows: Iterable[Any],
+        defaults: Mapping[str, FeatureSnapshot],
+        bits: Mapping[str, int]
+    ) -> GuildSettings:
+        """Snapshot of stored feature rows, features without a row use ``defaults``"""
+        features = dict(defaults)
+        for row in rows:
+            if row.feature in bits:
+                features[row.feature] = FeatureSnapshot.from_row(row)
+        return cls(features, bits)
+
+    def __getitem__(self, feature: str) -> FeatureSnapshot:
+        return self.features[feature]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.features)
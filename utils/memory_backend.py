@@ -0,0 +1,538 @@
+"""Pure in-memory storage backend.
+
+Everything lives in per-guild dicts, so lookups cost the same as the SQLite
+backend's primary key reads without any disk I/O. Nothing survives a restart:
+use it for load tests and ephemeral shards only.
+"""
+from __future__ import annotations
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+import itertools
+import json
+import logging
+
+from utils.records import (
+    FeatureSettings, GuildFeatureSettings, LeaderboardEntry, LogEntry, NamedFeatureSettings, UserXP,
+    cutoff_ms, epoch_ms, now_ms, parse_timestamp
+)
+from utils.storage import Page, StorageBackend, decode_cursor, make_page
+
+
+def _decoded(row: Dict[str, Any], *columns: str) -> Dict[str, Any]:
+    """Copy of a row with its epoch milliseconds columns as datetimes, like the SQLite decoders"""
+    row = dict(row)
+    for column in columns:
+        row[column] = parse_timestamp(row[column])
+    return row
+
+
+def _log_entry(entry: Dict[str, Any]) -> LogEntry:
+    return LogEntry(entry['id'], entry['guild_id'], entry['event_type'], entry['description'],
+                    parse_timestamp(entry['timestamp']))
+
+
+class MemoryBackend(StorageBackend):
+    """Storage backend that keeps every table in dicts and indexes"""
+
+    def __init__(self, logger: Optional[logging.Logger] = None) -> None:
+        self.log = logger or logging.getLogger("MemoryBackend")
+        self._reset()
+
+    def _reset(self) -> None:
+        # guild_id -> {'prefix', 'locale', 'created_at'}
+        self._guilds: Dict[int, Dict[str, Any]] = {}
+        # guild_id -> key -> value
+        self._guild_settings: Dict[int, Dict[str, str]] = {}
+        # guild_id -> user_id -> user row
+        self._users: Dict[int, Dict[int, Dict[str, Any]]] = {}
+        # guild_id -> feature -> (enabled, options_json). Options are stored
+        # serialized so callers can never mutate stored state by reference.
+        self._features: Dict[int, Dict[str, Tuple[bool, str]]] = {}
+        # guild_id -> user_id -> xp row
+        self._xp: Dict[int, Dict[int, Dict[str, Any]]] = {}
+        # guild_id -> level -> role_id
+        self._level_roles: Dict[int, Dict[int, int]] = {}
+        # guild_id -> (message_id, emoji) -> role_id
+        self._reaction_roles: Dict[int, Dict[Tuple[int, str], int]] = {}
+        # guild_id -> actions in insertion order
+        self._mod_actions: Dict[int, List[Dict[str, Any]]] = {}
+        # guild_id -> whisper_id -> whisper row, plus (guild_id, user_id) -> whisper ids
+        self._whispers: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        self._whispers_by_user: Dict[Tuple[int, int], List[str]] = {}
+        # guild_id -> logs in insertion (= timestamp) order
+        self._logs: Dict[int, List[Dict[str, Any]]] = {}
+        self._log_ids = itertools.count(1)
+        self._mod_action_ids = itertools.count(1)
+
+    # -------------------- Lifecycle --------------------
+
+    async def init(self) -> None:
+        """Nothing to open, the backend is ready as soon as it exists"""
+        self.log.info("In-memory storage initialized, data will not be persisted")
+
+    async def close(self, drain_timeout: float = 5.0) -> None:
+        """Drop all data"""
+        self._reset()
+
+    def stats(self) -> Dict[str, Any]:
+        """Row counts per table"""
+        return {
+            "guilds": len(self._guilds),
+            "users": sum(len(users) for users in self._users.values()),
+            "feature_settings": sum(len(features) for features in self._features.values()),
+            "xp": sum(len(rows) for rows in self._xp.values()),
+            "mod_actions": sum(len(rows) for rows in self._mod_actions.values()),
+            "whispers": sum(len(rows) for rows in self._whispers.values()),
+            "logs": sum(len(rows) for rows in self._logs.values()),
+        }
+
+    # -------------------- Guilds --------------------
+
+    def _ensure_guild(self, guild_id: int) -> bool:
+        if guild_id in self._guilds:
+            return False
+        self._guilds[guild_id] = {'prefix': '!', 'locale': 'en', 'created_at': now_ms()}
+        return True
+
+    async def add_guild(self, guild_id: int) -> None:
+        self._ensure_guild(guild_id)
+
+    async def add_guilds_bulk(self, guild_ids: Iterable[int]) -> int:
+        return sum(self._ensure_guild(guild_id) for guild_id in set(guild_ids))
+
+    async def remove_guild(self, guild_id: int) -> None:
+        await self.delete_guild_data(guild_id)
+
+    async def get_guild_prefix(self, guild_id: int) -> str:
+        guild = self._guilds.get(guild_id)
+        return guild['prefix'] if guild else "!"
+
+    async def set_guild_prefix(self, guild_id: int, prefix: str) -> None:
+        self._ensure_guild(guild_id)
+        self._guilds[guild_id]['prefix'] = prefix
+
+    async def get_guild_setting(self, guild_id: int, key: str) -> Optional[str]:
+        return self._guild_settings.get(guild_id, {}).get(key)
+
+    async def set_guild_setting(self, guild_id: int, key: str, value: str) -> None:
+        self._ensure_guild(guild_id)
+        self._guild_settings.setdefault(guild_id, {})[key] = value
+
+    async def get_guild_settings(self, guild_id: int) -> List[Dict[str, Any]]:
+        settings = self._guild_settings.get(guild_id, {})
+        return [{'key': key, 'value': settings[key]} for key in sorted(settings)]
+
+    async def get_global_stats(self) -> Dict[str, int]:
+        users = [user for guild_users in self._users.values() for user in guild_users.values()]
+        return {
+            'guilds': len(self._guilds),
+            'users': len(users),
+            'messages': sum(user['messages_count'] for user in users),
+            'commands': sum(user['commands_used'] for user in users),
+            'ranked_users': sum(1 for rows in self._xp.values() for row in rows.values() if row['xp'] > 0),
+        }
+
+    async def delete_guild_data(self, guild_id: int) -> None:
+        for table in (
+            self._guilds, self._guild_settings, self._users, self._features, self._xp,
+            self._level_roles, self._reaction_roles, self._mod_actions, self._whispers, self._logs
+        ):
+            table.pop(guild_id, None)
+        for key in [key for key in self._whispers_by_user if key[0] == guild_id]:
+            del self._whispers_by_user[key]
+
+    async def purge_guild(self, guild_id: int) -> None:
+        # Dict pops are instant, no need to spread them out
+        await self.delete_guild_data(guild_id)
+
+    # -------------------- Users --------------------
+
+    def _user(self, guild_id: int, user_id: int) -> Dict[str, Any]:
+        users = self._users.setdefault(guild_id, {})
+        user = users.get(user_id)
+        if user is None:
+            user = users[user_id] = {
+                'user_id': user_id,
+                'guild_id': guild_id,
+                'first_seen': now_ms(),
+                'last_seen': None,
+                'messages_count': 0,
+                'commands_used': 0
+            }
+        return user
+
+    async def update_user_activity(self, guild_id: int, user_id: int) -> None:
+        user = self._user(guild_id, user_id)
+        user['last_seen'] = now_ms()
+        user['messages_count'] += 1
+
+    async def increment_user_commands(self, guild_id: int, user_id: int) -> None:
+        self._user(guild_id, user_id)['commands_used'] += 1
+
+    async def delete_user_data(self, guild_id: int, user_id: int) -> None:
+        self._users.get(guild_id, {}).pop(user_id, None)
+        self._xp.get(guild_id, {}).pop(user_id, None)
+        whispers = self._whispers.get(guild_id, {})
+        for whisper_id in self._whispers_by_user.pop((guild_id, user_id), []):
+            whispers.pop(whisper_id, None)
+        actions = self._mod_actions.get(guild_id)
+        if actions:
+            self._mod_actions[guild_id] = [a for a in actions if a['user_id'] != user_id]
+
+    # -------------------- Feature Settings --------------------
+
+    async def get_feature_settings(self, guild_id: int, feature: str) -> Optional[FeatureSettings]:
+        stored = self._features.get(guild_id, {}).get(feature)
+        if stored is None:
+            return None
+        return FeatureSettings(stored[0], json.loads(stored[1]))
+
+    async def get_all_feature_settings(self, guild_id: int) -> List[NamedFeatureSettings]:
+        features = self._features.get(guild_id, {})
+        return [
+            NamedFeatureSettings(feature, features[feature][0], json.loads(features[feature][1]))
+            for feature in sorted(features)
+        ]
+
+    async def get_feature_rows_after(self, limit: int = 500, cursor: Optional[str] = None) -> Page:
+        after = tuple(decode_cursor("feature_rows", cursor)) if cursor is not None else (-1, "")
+        keys = sorted(
+            (guild_id, feature)
+            for guild_id, features in self._features.items() for feature in features
+            if (guild_id, feature) > after
+        )
+        rows = []
+        for guild_id, feature in keys[:limit + 1]:
+            enabled, options_json = self._features[guild_id][feature]
+            rows.append(GuildFeatureSettings(guild_id, feature, enabled, json.loads(options_json)))
+        return make_page(rows, limit, "feature_rows", lambda row: (row.guild_id, row.feature))
+
+    async def iter_feature_rows(self, batch_size: int = 500) -> AsyncIterator[GuildFeatureSettings]:
+        for guild_id in sorted(self._features):
+            for feature, (enabled, options_json) in sorted(self._features.get(guild_id, {}).items()):
+                yield GuildFeatureSettings(guild_id, feature, enabled, json.loads(options_json))
+
+    async def set_feature_settings(self, guild_id: int, feature: str, enabled: bool, options: Dict[str, Any]) -> None:
+        self._ensure_guild(guild_id)
+        self._features.setdefault(guild_id, {})[feature] = (bool(enabled), json.dumps(options))
+
+    async def set_feature_enabled(
+        self,
+        guild_id: int,
+        feature: str,
+        enabled: bool,
+        default_options: Dict[str, Any]
+    ) -> None:
+        self._ensure_guild(guild_id)
+        features = self._features.setdefault(guild_id, {})
+        stored = features.get(feature)
+        features[feature] = (bool(enabled), stored[1] if stored else json.dumps(default_options))
+
+    async def patch_feature_options(
+        self,
+        guild_id: int,
+        feature: str,
+        options: Dict[str, Any],
+        default: Tuple[bool, Dict[str, Any]]
+    ) -> None:
+        if not options:
+            return
+        self._ensure_guild(guild_id)
+        features = self._features.setdefault(guild_id, {})
+        enabled, current = features.get(feature) or (bool(default[0]), json.dumps(default[1]))
+        merged = json.loads(current)
+        merged.update(options)
+        features[feature] = (enabled, json.dumps(merged))
+
+    async def patch_feature_list_item(
+        self,
+        guild_id: int,
+        feature: str,
+        key: str,
+        match: Tuple[str, Any],
+        updates: Dict[str, Any]
+    ) -> bool:
+        stored = self._features.get(guild_id, {}).get(feature)
+        if not updates or stored is None or not stored[0]:
+            return False
+        options = json.loads(stored[1])
+        field, value = match
+        for item in options.get(key, []):
+            if isinstance(item, dict) and item.get(field) == value:
+                item.update(updates)
+                self._features[guild_id][feature] = (stored[0], json.dumps(options))
+                return True
+        return False
+
+    async def init_features_bulk(
+        self,
+        guild_ids: Iterable[int],
+        defaults: Dict[str, Tuple[bool, Dict[str, Any]]]
+    ) -> int:
+        encoded = [(feature, bool(enabled), json.dumps(options)) for feature, (enabled, options) in defaults.items()]
+        created = 0
+        for guild_id in set(guild_ids):
+            self._ensure_guild(guild_id)
+            features = self._features.setdefault(guild_id, {})
+            for feature, enabled, options_json in encoded:
+                if feature not in features:
+                    features[feature] = (enabled, options_json)
+                    created += 1
+        return created
+
+    # -------------------- Leveling --------------------
+
+    async def get_user_xp(self, guild_id: int, user_id: int) -> Optional[UserXP]:
+        row = self._xp.get(guild_id, {}).get(user_id)
+        if row is None:
+            return None
+        return UserXP(row['xp'], row['level'], row.get('last_xp_gain'), row.get('last_message'))
+
+    def _xp_row(self, guild_id: int, user_id: int) -> Dict[str, Any]:
+        rows = self._xp.setdefault(guild_id, {})
+        row = rows.get(user_id)
+        if row is None:
+            row = rows[user_id] = {'user_id': user_id, 'xp': 0, 'level': 0}
+        return row
+
+    async def update_user_xp(self, guild_id: int, user_id: int, xp: int, level: int) -> None:
+        row = self._xp_row(guild_id, user_id)
+        row['xp'] = xp
+        row['level'] = level
+
+    async def update_user_xp_with_message(
+        self,
+        guild_id: int,
+        user_id: int,
+        xp: int,
+        level: int,
+        xp_gain: int,
+        message: str
+    ) -> None:
+        row = self._xp_row(guild_id, user_id)
+        row.update(xp=xp, level=level, last_xp_gain=xp_gain, last_message=message)
+
+    async def reset_user_xp(self, guild_id: int, user_id: int) -> None:
+        row = self._xp.get(guild_id, {}).get(user_id)
+        if row is not None:
+            row.update(xp=0, level=0, last_xp_gain=None, last_message=None)
+
+    async def delete_all_xp(self, guild_id: int) -> None:
+        self._xp.pop(guild_id, None)
+
+    def _ranked(self, guild_id: int) -> List[Dict[str, Any]]:
+        rows = [row for row in self._xp.get(guild_id, {}).values() if row['xp'] > 0]
+        rows.sort(key=lambda row: (-row['xp'], row['user_id']))
+        return rows
+
+    async def get_leaderboard(self, guild_id: int) -> List[LeaderboardEntry]:
+        return [LeaderboardEntry(row['user_id'], row['xp'], row['level']) for row in self._ranked(guild_id)]
+
+    async def get_leaderboard_page(self, guild_id: int, limit: int = 10, offset: int = 0) -> List[LeaderboardEntry]:
+        rows = self._ranked(guild_id)[offset:offset + limit if limit >= 0 else None]
+        return [LeaderboardEntry(row['user_id'], row['xp'], row['level']) for row in rows]
+
+    async def get_leaderboard_after(self, guild_id: int, limit: int = 10, cursor: Optional[str] = None) -> Page:
+        rows = self._ranked(guild_id)
+        if cursor is not None:
+            xp, user_id = decode_cursor("leaderboard", cursor)
+            rows = [row for row in rows if (-row['xp'], row['user_id']) > (-xp, user_id)]
+        entries = [LeaderboardEntry(row['user_id'], row['xp'], row['level']) for row in rows[:limit + 1]]
+        return make_page(entries, limit, "leaderboard", lambda row: (row['xp'], row['user_id']))
+
+    async def get_xp_cooldown(self, guild_id: int, user_id: int) -> Optional[float]:
+        row = self._xp.get(guild_id, {}).get(user_id)
+        last = row.get('last_xp_at') if row else None
+        return last / 1000 if last is not None else None
+
+    async def set_xp_cooldown(self, guild_id: int, user_id: int, timestamp: float) -> None:
+        self._xp_row(guild_id, user_id)['last_xp_at'] = int(timestamp * 1000)
+
+    async def set_level_role(self, guild_id: int, level: int, role_id: int) -> None:
+        self._level_roles.setdefault(guild_id, {})[level] = role_id
+
+    async def delete_level_role(self, guild_id: int, level: int) -> None:
+        self._level_roles.get(guild_id, {}).pop(level, None)
+
+    async def get_level_roles(self, guild_id: int) -> List[Dict[str, Any]]:
+        roles = self._level_roles.get(guild_id, {})
+        return [{'level': level, 'role_id': roles[level]} for level in sorted(roles)]
+
+    async def get_level_roles_for_level(self, guild_id: int, level: int) -> List[int]:
+        role_id = self._level_roles.get(guild_id, {}).get(level)
+        return [role_id] if role_id is not None else []
+
+    # -------------------- Roles --------------------
+
+    async def add_reaction_role(self, guild_id: int, message_id: int, emoji: str, role_id: int) -> None:
+        self._reaction_roles.setdefault(guild_id, {})[(message_id, emoji)] = role_id
+
+    async def remove_reaction_role(self, guild_id: int, message_id: int, emoji: str) -> None:
+        self._reaction_roles.get(guild_id, {}).pop((message_id, emoji), None)
+
+    async def get_reaction_roles(self, guild_id: int) -> List[Dict[str, Any]]:
+        roles = self._reaction_roles.get(guild_id, {})
+        return [
+            {'message_id': message_id, 'emoji': emoji, 'role_id': roles[(message_id, emoji)]}
+            for message_id, emoji in sorted(roles)
+        ]
+
+    # -------------------- Moderation --------------------
+
+    async def insert_mod_action(
+        self,
+        guild_id: int,
+        user_id: int,
+        action: str,
+        reason: Optional[str],
+        moderator_id: int
+    ) -> None:
+        self._mod_actions.setdefault(guild_id, []).append({
+            'id': next(self._mod_action_ids),
+            'user_id': user_id,
+            'action': action,
+            'reason': reason,
+            'moderator_id': moderator_id,
+            'created_at': now_ms()
+        })
+
+    async def get_mod_actions_page(self, guild_id: int, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
+        actions = self._mod_actions.get(guild_id, [])
+        newest_first = actions[::-1]
+        return [_decoded(a, 'created_at') for a in newest_first[offset:offset + limit if limit >= 0 else None]]
+
+    async def get_mod_actions_after(self, guild_id: int, limit: int = 10, cursor: Optional[str] = None) -> Page:
+        actions = self._mod_actions.get(guild_id, [])
+        before_id = decode_cursor("mod_actions", cursor)[0] if cursor is not None else None
+        rows: List[Dict[str, Any]] = []
+        for action in reversed(actions):
+            if before_id is not None and action['id'] >= before_id:
+                continue
+            rows.append(_decoded(action, 'created_at'))
+            if len(rows) > limit:
+                break
+        return make_page(rows, limit, "mod_actions", lambda row: (row['id'],))
+
+    # -------------------- Whispers --------------------
+
+    async def create_whisper(self, guild_id: int, whisper_id: str, user_id: int, thread_id: int) -> None:
+        whispers = self._whispers.setdefault(guild_id, {})
+        if whisper_id in whispers:
+            raise ValueError(f"Whisper {whisper_id} already exists")
+        whispers[whisper_id] = {
+            'guild_id': guild_id,
+            'whisper_id': whisper_id,
+            'user_id': user_id,
+            'thread_id': thread_id,
+            'is_closed': False,
+            'created_at': now_ms(),
+            'closed_at': None
+        }
+        self._whispers_by_user.setdefault((guild_id, user_id), []).append(whisper_id)
+
+    async def close_whisper(self, guild_id: int, whisper_id: str) -> None:
+        whisper = self._whispers.get(guild_id, {}).get(whisper_id)
+        if whisper is not None and not whisper['is_closed']:
+            whisper['is_closed'] = True
+            whisper['closed_at'] = now_ms()
+
+    async def get_whispers_by_user(self, guild_id: int, user_id: int) -> List[Dict[str, Any]]:
+        whispers = self._whispers.get(guild_id, {})
+        ids = self._whispers_by_user.get((guild_id, user_id), [])
+        rows = [whispers[whisper_id] for whisper_id in ids if whisper_id in whispers]
+        rows.sort(key=lambda w: w['thread_id'], reverse=True)
+        return [_decoded(w, 'created_at', 'closed_at') for w in rows]
+
+    async def get_all_whispers(self, guild_id: int) -> List[Dict[str, Any]]:
+        rows = sorted(self._whispers.get(guild_id, {}).values(), key=lambda w: w['thread_id'], reverse=True)
+        return [_decoded(w, 'created_at', 'closed_at') for w in rows]
+
+    async def delete_all_whispers(self, guild_id: int) -> None:
+        self._whispers.pop(guild_id, None)
+        for key in [key for key in self._whispers_by_user if key[0] == guild_id]:
+            del self._whispers_by_user[key]
+
+    # -------------------- Logs --------------------
+
+    async def add_log(self, guild_id: int, event_type: str, description: str) -> None:
+        self._logs.setdefault(guild_id, []).append({
+            'id': next(self._log_ids),
+            'guild_id': guild_id,
+            'event_type': event_type,
+            'description': description,
+            'timestamp': now_ms()
+        })
+
+    def _select_logs(
+        self,
+        guild_id: int,
+        event_type: Optional[str],
+        since: Optional[int],
+        limit: int
+    ) -> List[LogEntry]:
+        result: List[LogEntry] = []
+        if limit == 0:
+            return result
+        for entry in reversed(self._logs.get(guild_id, [])):
+            if since is not None and entry['timestamp'] < since:
+                break  # Logs are appended in timestamp order
+            if event_type and entry['event_type'] != event_type:
+                continue
+            result.append(_log_entry(entry))
+            if 0 <= limit <= len(result):
+                break
+        return result
+
+    async def get_logs(self, guild_id: int, event_type: Optional[str] = None, limit: int = 100) -> List[LogEntry]:
+        return self._select_logs(guild_id, event_type, None, limit)
+
+    async def get_logs_filtered(
+        self,
+        guild_id: int,
+        event_type: Optional[str] = None,
+        since_days: Optional[int] = None,
+        limit: int = -1
+    ) -> List[LogEntry]:
+        since = cutoff_ms(since_days) if since_days is not None else None
+        return self._select_logs(guild_id, event_type, since, limit)
+
+    async def get_logs_after(
+        self,
+        guild_id: int,
+        event_type: Optional[str] = None,
+        since_days: Optional[int] = None,
+        search: Optional[str] = None,
+        limit: int = 10,
+        cursor: Optional[str] = None
+    ) -> Page:
+        if cursor is None:
+            since = cutoff_ms(since_days) if since_days is not None else 0
+            before_id = None
+        else:
+            _, before_id, since = decode_cursor("logs", cursor)
+        rows: List[LogEntry] = []
+        for entry in reversed(self._logs.get(guild_id, [])):
+            if before_id is not None and entry['id'] >= before_id:
+                continue
+            if entry['timestamp'] < since:
+                break  # Logs are appended in timestamp order
+            if event_type and entry['event_type'] != event_type:
+                continue
+            if search is not None and search not in entry['description']:
+                continue
+            rows.append(_log_entry(entry))
+            if len(rows) > limit:
+                break
+        return make_page(
+            rows, limit, "logs",
+            lambda row: (epoch_ms(row.timestamp), row['id'], since)
+        )
+
+    async def clear_old_logs(self, guild_id: int, days: int) -> None:
+        cutoff = cutoff_ms(days)
+        logs = self._logs.get(guild_id)
+        if logs:
+            self._logs[guild_id] = [entry for entry in logs if entry['timestamp'] >= cutoff]
+
+    async def purge_old_logs(self, days: int) -> None:
+        for guild_id in list(self._logs):
+            await self.clear_old_logs(guild_id, days)
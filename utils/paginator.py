@@ -0,0 +1,86 @@
+from typing import Any, Awaitable, Callable, List, Optional
+import discord
+
+from utils.storage import Page
+
+# fetch(cursor, limit) -> (rows, next_cursor)
+Fetch = Callable[[Optional[str], int], Awaitable[Page]]
+# render(rows, page_number) -> embed
+Render = Callable[[List[Any], int], discord.Embed]
+
+
+class CursorPaginator(discord.ui.View):
+    """Previous/Next buttons over a cursor-paginated storage listing.
+
+    Pages are fetched on demand with the cursor of the previous page, so
+    moving forward always costs one small seek. Pages already seen are kept
+    for the Previous button.
+    """
+
+    def __init__(
+        self,
+        fetch: Fetch,
+        render: Render,
+        per_page: int = 5,
+        max_entries: Optional[int] = None,
+        timeout: float = 180
+    ) -> None:
+        super().__init__(timeout=timeout)
+        self.fetch = fetch
+        self.render = render
+        self.per_page = per_page
+        self.max_entries = max_entries
+        self.pages: List[List[Any]] = []
+        self.current = 0
+        self.next_cursor: Optional[str] = None
+
+    @property
+    def loaded_entries(self) -> int:
+        return sum(len(page) for page in self.pages)
+
+    @property
+    def has_more(self) -> bool:
+        """Whether another page exists beyond the ones already fetched"""
+        if self.pages and self.next_cursor is None:
+            return False
+        return self.max_entries is None or self.loaded_entries < self.max_entries
+
+    async def _load_next(self) -> bool:
+        limit = self.per_page
+        if self.max_entries is not None:
+            limit = min(limit, self.max_entries - self.loaded_entries)
+        rows, self.next_cursor = await self.fetch(self.next_cursor, limit)
+        if rows:
+            self.pages.append(rows)
+        else:
+            self.next_cursor = None
+        return bool(rows)
+
+    async def start(self) -> Optional[discord.Embed]:
+        """Fetch the first page. Returns its embed, or None if the listing is empty"""
+        if not await self._load_next():
+            return None
+        self._update_buttons()
+        return self.render(self.pages[0], 1)
+
+    @property
+    def needs_buttons(self) -> bool:
+        return self.has_more or len(self.pages) > 1
+
+    def _update_buttons(self) -> None:
+        self.previous.disabled = self.current == 0
+        self.next.disabled = self.current == len(self.pages) - 1 and not self.has_more
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.gray)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.current = max(0, self.current - 1)
+        self._update_buttons()
+        await interaction.response.edit_message(embed=self.render(self.pages[self.current], self.current + 1), view=self)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.gray)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.current == len(self.pages) - 1 and self.has_more:
+            await self._load_next()
+        self.current = min(len(self.pages) - 1, self.current + 1)
+        self._update_buttons()
+        await interaction.response.edit_message(embed=self.render(self.pages[self.current], self.current + 1), view=self)
@@ -0,0 +1,156 @@
+"""Priority classes for database work.
+
+Every storage call runs in one of three classes:
+
+- ``INTERACTIVE``: slash commands a user is waiting on
+- ``EVENT``: gateway event handlers, the default
+- ``BACKGROUND``: bookkeeping nobody waits on, such as activity counters, log
+  inserts, write-behind flushes and maintenance
+
+The class is read from a context variable, so it follows the calling task
+through every layer without being passed around. Set it with
+:func:`db_priority`, or :func:`set_db_priority` for the rest of a task.
+
+:class:`PrioritySemaphore` hands the writer lock and pooled readers to the
+waiter with the best class, oldest first within a class. To keep a steady
+stream of commands from starving background work, a waiter moves up one class
+for every ``aging_ms`` it has waited.
+"""
+from __future__ import annotations
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+import asyncio
+import itertools
+import time
+
+from utils.query_metrics import LatencyHistogram
+
+
+class Priority(IntEnum):
+    """Database work classes, lower values are served first"""
+    INTERACTIVE = 0
+    EVENT = 1
+    BACKGROUND = 2
+
+
+_current: ContextVar[Priority] = ContextVar("db_priority", default=Priority.EVENT)
+
+
+def current_priority() -> Priority:
+    """Class of the database work issued by the current task"""
+    return _current.get()
+
+
+def set_db_priority(priority: Priority) -> None:
+    """Run the rest of the current task's database work in ``priority``"""
+    _current.set(priority)
+
+
+@contextmanager
+def db_priority(priority: Priority) -> Iterator[None]:
+    """Run the database work inside the block in ``priority``"""
+    token = _current.set(priority)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class _Waiter:
+    __slots__ = ('priority', 'seq', 'since', 'future')
+
+    def __init__(self, priority: Priority, seq: int, since: float, future: asyncio.Future) -> None:
+        self.priority = priority
+        self.seq = seq
+        self.since = since
+        self.future = future
+
+
+class PrioritySemaphore:
+    """A semaphore that wakes waiters by priority class instead of arrival order.
+
+    Args:
+        value: Number of holders allowed at once
+        aging_ms: A waiter moves up one class for every ``aging_ms`` waited,
+            0 disables aging
+    """
+
+    def __init__(self, value: int = 1, aging_ms: float = 250.0) -> None:
+        self._value = value
+        self.aging_ms = aging_ms
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+
+        # Stats
+        self.queue_time = {priority: LatencyHistogram() for priority in Priority}
+        self.promoted = 0
+
+    def locked(self) -> bool:
+        return self._value == 0
+
+    async def acquire(self, priority: Optional[Priority] = None) -> None:
+        """Wait for a slot. ``priority`` defaults to the current task's class"""
+        if priority is None:
+            priority = _current.get()
+        since = time.perf_counter()
+        if self._value > 0 and not self._waiters:
+            self._value -= 1
+            self.queue_time[priority].observe(0.0)
+            return
+
+        waiter = _Waiter(priority, next(self._seq), since, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.cancelled():
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            else:
+                # Woken and cancelled before resuming: pass the slot on
+                self.release()
+            raise
+        self.queue_time[priority].observe((time.perf_counter() - since) * 1000)
+
+    def release(self) -> None:
+        self._value += 1
+        self._wake()
+
+    def _rank(self, waiter: _Waiter, now: float) -> tuple:
+        if self.aging_ms > 0:
+            return (waiter.priority - int((now - waiter.since) * 1000 // self.aging_ms), waiter.seq)
+        return (waiter.priority, waiter.seq)
+
+    def _wake(self) -> None:
+        while self._value > 0 and self._waiters:
+            now = time.perf_counter()
+            waiter = min(self._waiters, key=lambda w: self._rank(w, now))
+            self._waiters.remove(waiter)
+            if waiter.future.done():
+                continue  # Cancelled, its task has not run yet
+            if any(other.priority < waiter.priority for other in self._waiters):
+                self.promoted += 1
+            self._value -= 1
+            waiter.future.set_result(None)
+
+    @asynccontextmanager
+    async def hold(self, priority: Optional[Priority] = None) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the block"""
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Waiters and queue time per class, and how often aging overtook a better class"""
+        waiting = {priority.name.lower(): 0 for priority in Priority}
+        for waiter in self._waiters:
+            waiting[waiter.priority.name.lower()] += 1
+        return {
+            "waiting": waiting,
+            "queue_ms": {priority.name.lower(): hist.stats() for priority, hist in self.queue_time.items()},
+            "promoted": self.promoted,
+        }
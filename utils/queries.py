@@ -0,0 +1,573 @@
+"""Named, parameterized SQL statements used by DBManager.
+
+Every statement is registered once with a fixed SQL string. sqlite3 caches
+prepared statements per connection keyed by their SQL text, so as long as
+callers go through the registry a hot statement is parsed once per connection
+and then reused for the connection's lifetime.
+"""
+from __future__ import annotations
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from utils.records import (
+    FeatureSettings, GuildFeatureSettings, LeaderboardEntry, LogEntry, NamedFeatureSettings, SettingsChange, UserXP,
+    parse_timestamp
+)
+
+Decoder = Callable[[Any], Any]
+# sqlite3 row factory: (cursor, raw row tuple) -> decoded row
+RowFactory = Callable[[Any, Tuple[Any, ...]], Any]
+
+# -------------------- Row Decoders --------------------
+
+def decode_scalar(row: Any) -> Any:
+    """First column of the row"""
+    return row[0]
+
+def decode_dict(row: Any) -> Dict[str, Any]:
+    """Row as a plain dict keyed by column name"""
+    return dict(row)
+
+def decode_mod_action(row: Any) -> Dict[str, Any]:
+    """Moderation action row with its timestamp as a datetime"""
+    entry = dict(row)
+    entry['created_at'] = parse_timestamp(entry['created_at'])
+    return entry
+
+def decode_whisper(row: Any) -> Dict[str, Any]:
+    """Whisper row with typed status and timestamps"""
+    entry = dict(row)
+    entry['is_closed'] = bool(entry['is_closed'])
+    entry['created_at'] = parse_timestamp(entry['created_at'])
+    entry['closed_at'] = parse_timestamp(entry['closed_at'])
+    return entry
+
+# Current time in epoch milliseconds, for times stamped by SQLite itself.
+# julianday() keeps millisecond precision and works on every SQLite version.
+# The product is rounded, truncating it would land 1 ms early.
+NOW_MS = "CAST(ROUND((julianday('now') - 2440587.5) * 86400000) AS INTEGER)"
+
+# JSON text of a json_each() value. json_each reports true/false as 1/0, so
+# booleans are spelled out; everything else round-trips through json_quote.
+_JSON_VALUE = (
+    "CASE item.type WHEN 'true' THEN 'true' WHEN 'false' THEN 'false' "
+    "ELSE json_quote(item.value) END"
+)
+
+# -------------------- Registry --------------------
+
+@dataclass(frozen=True)
+class Statement:
+    """A named SQL statement and the decoder applied to its rows"""
+    name: str
+    sql: str
+    decoder: Optional[Decoder] = None
+    # Builds rows while they are fetched, replacing the connection's Row factory
+    row_factory: Optional[RowFactory] = None
+
+    def for_table(self, table: str) -> str:
+        """SQL of a partitioned statement with its ``{table}`` placeholder filled in"""
+        return self.sql.format(table=table)
+
+class QueryRegistry:
+    """Looks statements up by name and counts how often each one runs"""
+
+    def __init__(self, statements: Iterable[Statement]) -> None:
+        self._statements: Dict[str, Statement] = {}
+        for statement in statements:
+            if statement.name in self._statements:
+                raise ValueError(f"Duplicate statement name '{statement.name}'")
+            self._statements[statement.name] = statement
+        self.calls: Counter = Counter()
+
+    def __getitem__(self, name: str) -> Statement:
+        return self._statements[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._statements
+
+    def __len__(self) -> int:
+        return len(self._statements)
+
+    def record(self, name: str, count: int = 1) -> None:
+        """Count ``count`` executions of a statement"""
+        self.calls[name] += count
+
+    def stats(self) -> Dict[str, int]:
+        """Execution counts per statement, most used first"""
+        return dict(self.calls.most_common())
+
+# -------------------- Statements --------------------
+
+STATEMENTS = (
+    # Guilds
+    Statement(
+        "guilds.ensure",
+        f"INSERT OR IGNORE INTO guilds (guild_id, created_at) VALUES (?, {NOW_MS})"
+    ),
+    Statement(
+        "guilds.delete",
+        "DELETE FROM guilds WHERE guild_id = ?"
+    ),
+    Statement(
+        "guilds.get_prefix",
+        "SELECT prefix FROM guilds WHERE guild_id = ?",
+        decode_scalar
+    ),
+    Statement(
+        "guilds.global_stats",
+        "SELECT (SELECT COUNT(*) FROM guilds) AS guilds, "
+        "(SELECT COUNT(*) FROM users) AS users, "
+        "(SELECT COALESCE(SUM(messages_count), 0) FROM users) AS messages, "
+        "(SELECT COALESCE(SUM(commands_used), 0) FROM users) AS commands, "
+        "(SELECT COUNT(*) FROM xp WHERE xp > 0) AS ranked_users",
+        decode_dict
+    ),
+    Statement(
+        "guilds.set_prefix",
+        f"INSERT INTO guilds (guild_id, prefix, created_at) VALUES (?, ?, {NOW_MS}) "
+        "ON CONFLICT(guild_id) DO UPDATE SET prefix = excluded.prefix"
+    ),
+
+    # Guild settings
+    Statement(
+        "guild_settings.get",
+        "SELECT value FROM guild_settings WHERE guild_id = ? AND key = ?",
+        decode_scalar
+    ),
+    Statement(
+        "guild_settings.list",
+        "SELECT key, value FROM guild_settings WHERE guild_id = ? ORDER BY key",
+        decode_dict
+    ),
+    Statement(
+        "guild_settings.set",
+        "INSERT INTO guild_settings (guild_id, key, value) VALUES (?, ?, ?) "
+        "ON CONFLICT(guild_id, key) DO UPDATE SET value = excluded.value"
+    ),
+    Statement(
+        "guild_settings.delete_guild_chunk",
+        "DELETE FROM guild_settings WHERE rowid IN (SELECT rowid FROM guild_settings WHERE guild_id = ? LIMIT ?)"
+    ),
+
+    # Users
+    Statement(
+        "users.touch",
+        "INSERT INTO users (guild_id, user_id, first_seen, last_seen, messages_count) "
+        f"VALUES (?, ?, {NOW_MS}, {NOW_MS}, 1) "
+        "ON CONFLICT(guild_id, user_id) DO UPDATE "
+        "SET last_seen = excluded.last_seen, messages_count = messages_count + 1"
+    ),
+    Statement(
+        "users.increment_commands",
+        f"INSERT INTO users (guild_id, user_id, first_seen, commands_used) VALUES (?, ?, {NOW_MS}, 1) "
+        "ON CONFLICT(guild_id, user_id) DO UPDATE SET commands_used = commands_used + 1"
+    ),
+    Statement(
+        "users.add_counters",
+        "INSERT INTO users (guild_id, user_id, first_seen, last_seen, messages_count, commands_used) "
+        f"VALUES (?, ?, {NOW_MS}, ?, ?, ?) "
+        "ON CONFLICT(guild_id, user_id) DO UPDATE "
+        "SET last_seen = COALESCE(excluded.last_seen, last_seen), "
+        "messages_count = messages_count + excluded.messages_count, "
+        "commands_used = commands_used + excluded.commands_used"
+    ),
+    Statement(
+        "users.delete",
+        "DELETE FROM users WHERE guild_id = ? AND user_id = ?"
+    ),
+    Statement(
+        "users.delete_guild_chunk",
+        "DELETE FROM users WHERE rowid IN (SELECT rowid FROM users WHERE guild_id = ? LIMIT ?)"
+    ),
+
+    # Feature settings. Options are stored one row per key in feature_options;
+    # options_json only holds blobs that the online migration has not reached
+    # yet, so reads fall back to it while it is set.
+    Statement(
+        "feature_settings.get",
+        "SELECT enabled, coalesce(options_json, ("
+        "    SELECT json_group_object(key, json(value_json)) FROM feature_options AS option "
+        "    WHERE option.guild_id = feature_settings.guild_id AND option.feature = feature_settings.feature"
+        ")) FROM feature_settings WHERE guild_id = ? AND feature = ?",
+        row_factory=FeatureSettings.row_factory
+    ),
+    Statement(
+        "feature_settings.list",
+        "SELECT feature, enabled, coalesce(options_json, ("
+        "    SELECT json_group_object(key, json(value_json)) FROM feature_options AS option "
+        "    WHERE option.guild_id = feature_settings.guild_id AND option.feature = feature_settings.feature"
+        ")) FROM feature_settings WHERE guild_id = ? ORDER BY feature",
+        row_factory=NamedFeatureSettings.row_factory
+    ),
+    Statement(
+        "feature_settings.scan",
+        "SELECT guild_id, feature, enabled, coalesce(options_json, ("
+        "    SELECT json_group_object(key, json(value_json)) FROM feature_options AS option "
+        "    WHERE option.guild_id = feature_settings.guild_id AND option.feature = feature_settings.feature"
+        ")) FROM feature_settings "
+        "WHERE (guild_id, feature) > (:guild_id, :feature) ORDER BY guild_id, feature LIMIT :limit",
+        row_factory=GuildFeatureSettings.row_factory
+    ),
+    Statement(
+        "settings_changes.after",
+        "SELECT seq, guild_id, feature, origin FROM settings_changes WHERE seq > ? ORDER BY seq LIMIT ?",
+        row_factory=SettingsChange.row_factory
+    ),
+    Statement(
+        "settings_changes.record",
+        "INSERT INTO settings_changes (guild_id, feature, origin) VALUES (?, ?, ?)"
+    ),
+    Statement(
+        "settings_changes.head",
+        "SELECT coalesce((SELECT seq FROM sqlite_sequence WHERE name = 'settings_changes'), 0)",
+        decoder=decode_scalar
+    ),
+    Statement(
+        "settings_changes.prune",
+        "DELETE FROM settings_changes WHERE changed_at < ?"
+    ),
+    Statement(
+        "feature_settings.get_option",
+        "SELECT coalesce("
+        "    (SELECT value_json FROM feature_options "
+        "     WHERE guild_id = :guild_id AND feature = :feature AND key = :key), "
+        f"    (SELECT {_JSON_VALUE} FROM feature_settings, json_each(feature_settings.options_json) AS item "
+        "     WHERE guild_id = :guild_id AND feature = :feature AND item.key = :key)"
+        ")",
+        decoder=decode_scalar
+    ),
+    Statement(
+        "feature_settings.delete_guild_chunk",
+        "DELETE FROM feature_settings WHERE rowid IN (SELECT rowid FROM feature_settings WHERE guild_id = ? LIMIT ?)"
+    ),
+    Statement(
+        "feature_settings.insert_missing",
+        "INSERT OR IGNORE INTO feature_settings (guild_id, feature, enabled) VALUES (?, ?, ?)"
+    ),
+    Statement(
+        "feature_settings.upsert",
+        "INSERT INTO feature_settings (guild_id, feature, enabled) VALUES (?, ?, ?) "
+        "ON CONFLICT(guild_id, feature) DO UPDATE "
+        "SET enabled = excluded.enabled, options_json = NULL"
+    ),
+    Statement(
+        "feature_settings.set_enabled",
+        "INSERT INTO feature_settings (guild_id, feature, enabled) VALUES (?, ?, ?) "
+        "ON CONFLICT(guild_id, feature) DO UPDATE SET enabled = excluded.enabled"
+    ),
+    Statement(
+        "feature_settings.legacy_batch",
+        "SELECT guild_id, feature FROM feature_settings WHERE options_json IS NOT NULL LIMIT ?"
+    ),
+    Statement(
+        "feature_settings.clear_legacy",
+        "UPDATE feature_settings SET options_json = NULL "
+        "WHERE guild_id = ? AND feature = ? AND options_json IS NOT NULL"
+    ),
+
+    # Feature options, one row per (guild, feature, key) with the value as JSON text
+    Statement(
+        "feature_options.migrate",
+        "INSERT OR REPLACE INTO feature_options (guild_id, feature, key, value_json) "
+        f"SELECT guild_id, feature, item.key, {_JSON_VALUE} "
+        "FROM feature_settings, json_each(feature_settings.options_json) AS item "
+        "WHERE guild_id = ? AND feature = ? AND options_json IS NOT NULL"
+    ),
+    # Options of a feature that has no row yet, from a JSON object
+    Statement(
+        "feature_options.insert_missing",
+        "INSERT OR IGNORE INTO feature_options (guild_id, feature, key, value_json) "
+        f"SELECT :guild_id, :feature, item.key, {_JSON_VALUE} FROM json_each(:options_json) AS item "
+        "WHERE NOT EXISTS (SELECT 1 FROM feature_settings WHERE guild_id = :guild_id AND feature = :feature)"
+    ),
+    Statement(
+        "feature_options.insert_json",
+        "INSERT INTO feature_options (guild_id, feature, key, value_json) "
+        f"SELECT :guild_id, :feature, item.key, {_JSON_VALUE} FROM json_each(:options_json) AS item"
+    ),
+    Statement(
+        "feature_options.upsert",
+        "INSERT INTO feature_options (guild_id, feature, key, value_json) VALUES (:guild_id, :feature, :key, json(:value)) "
+        "ON CONFLICT(guild_id, feature, key) DO UPDATE SET value_json = excluded.value_json"
+    ),
+    # Patch one field of the first object in a list option whose match field is equal
+    Statement(
+        "feature_options.set_list_item_field",
+        "UPDATE feature_options "
+        "SET value_json = json_set(value_json, ("
+        "    SELECT '$[' || item.key || '].' || json_quote(:field) FROM json_each(value_json) AS item "
+        "    WHERE json_extract(item.value, '$.' || json_quote(:match_field)) = :match_value "
+        "    LIMIT 1"
+        "), json(:value)) "
+        "WHERE guild_id = :guild_id AND feature = :feature AND key = :key "
+        "AND EXISTS ("
+        "    SELECT 1 FROM json_each(value_json) AS item "
+        "    WHERE json_extract(item.value, '$.' || json_quote(:match_field)) = :match_value"
+        ") "
+        "AND EXISTS ("
+        "    SELECT 1 FROM feature_settings "
+        "    WHERE guild_id = :guild_id AND feature = :feature AND enabled"
+        ")"
+    ),
+    Statement(
+        "feature_options.delete",
+        "DELETE FROM feature_options WHERE guild_id = ? AND feature = ?"
+    ),
+    Statement(
+        "feature_options.delete_guild_chunk",
+        "DELETE FROM feature_options WHERE guild_id = ?1 AND (feature, key) IN "
+        "(SELECT feature, key FROM feature_options WHERE guild_id = ?1 LIMIT ?2)"
+    ),
+
+    # XP
+    Statement(
+        "xp.get",
+        "SELECT xp, level, last_xp_gain, last_message FROM xp WHERE guild_id = ? AND user_id = ?",
+        row_factory=UserXP.row_factory
+    ),
+    Statement(
+        "xp.set",
+        "INSERT INTO xp (guild_id, user_id, xp, level) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(guild_id, user_id) DO UPDATE SET xp = excluded.xp, level = excluded.level"
+    ),
+    Statement(
+        "xp.set_with_message",
+        "INSERT INTO xp (guild_id, user_id, xp, level, last_xp_gain, last_message) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(guild_id, user_id) DO UPDATE SET xp = excluded.xp, level = excluded.level, "
+        "last_xp_gain = excluded.last_xp_gain, last_message = excluded.last_message"
+    ),
+    Statement(
+        "xp.reset",
+        "UPDATE xp SET xp = 0, level = 0, last_xp_gain = NULL, last_message = NULL "
+        "WHERE guild_id = ? AND user_id = ?"
+    ),
+    Statement(
+        "xp.delete",
+        "DELETE FROM xp WHERE guild_id = ? AND user_id = ?"
+    ),
+    Statement(
+        "xp.delete_guild",
+        "DELETE FROM xp WHERE guild_id = ?"
+    ),
+    Statement(
+        "xp.delete_guild_chunk",
+        "DELETE FROM xp WHERE rowid IN (SELECT rowid FROM xp WHERE guild_id = ? LIMIT ?)"
+    ),
+    Statement(
+        "xp.leaderboard_page",
+        "SELECT user_id, xp, level FROM xp WHERE guild_id = ? AND xp > 0 "
+        "ORDER BY xp DESC, user_id LIMIT ? OFFSET ?",
+        row_factory=LeaderboardEntry.row_factory
+    ),
+    Statement(
+        "xp.leaderboard_after",
+        "SELECT user_id, xp, level FROM xp WHERE guild_id = ? AND xp > 0 "
+        "AND (xp < ? OR (xp = ? AND user_id > ?)) "
+        "ORDER BY xp DESC, user_id LIMIT ?",
+        row_factory=LeaderboardEntry.row_factory
+    ),
+    Statement(
+        "xp.leaderboard_seek",
+        "SELECT xp, user_id FROM xp WHERE guild_id = ? AND xp > 0 "
+        "ORDER BY xp DESC, user_id LIMIT 1 OFFSET ?"
+    ),
+    Statement(
+        "xp.get_cooldown",
+        "SELECT last_xp_at FROM xp WHERE guild_id = ? AND user_id = ?",
+        decode_scalar
+    ),
+    Statement(
+        "xp.set_cooldown",
+        "INSERT INTO xp (guild_id, user_id, last_xp_at) VALUES (?, ?, ?) "
+        "ON CONFLICT(guild_id, user_id) DO UPDATE SET last_xp_at = excluded.last_xp_at"
+    ),
+
+    # Level roles
+    Statement(
+        "level_roles.set",
+        "INSERT INTO level_roles (guild_id, level, role_id) VALUES (?, ?, ?) "
+        "ON CONFLICT(guild_id, level) DO UPDATE SET role_id = excluded.role_id"
+    ),
+    Statement(
+        "level_roles.delete",
+        "DELETE FROM level_roles WHERE guild_id = ? AND level = ?"
+    ),
+    Statement(
+        "level_roles.list",
+        "SELECT level, role_id FROM level_roles WHERE guild_id = ? ORDER BY level",
+        decode_dict
+    ),
+    Statement(
+        "level_roles.for_level",
+        "SELECT role_id FROM level_roles WHERE guild_id = ? AND level = ?",
+        decode_scalar
+    ),
+    Statement(
+        "level_roles.delete_guild_chunk",
+        "DELETE FROM level_roles WHERE rowid IN (SELECT rowid FROM level_roles WHERE guild_id = ? LIMIT ?)"
+    ),
+
+    # Reaction roles
+    Statement(
+        "reaction_roles.add",
+        "INSERT INTO reaction_roles (guild_id, message_id, emoji, role_id) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(guild_id, message_id, emoji) DO UPDATE SET role_id = excluded.role_id"
+    ),
+    Statement(
+        "reaction_roles.remove",
+        "DELETE FROM reaction_roles WHERE guild_id = ? AND message_id = ? AND emoji = ?"
+    ),
+    Statement(
+        "reaction_roles.list",
+        "SELECT message_id, emoji, role_id FROM reaction_roles WHERE guild_id = ? ORDER BY message_id",
+        decode_dict
+    ),
+    Statement(
+        "reaction_roles.delete_guild_chunk",
+        "DELETE FROM reaction_roles WHERE rowid IN (SELECT rowid FROM reaction_roles WHERE guild_id = ? LIMIT ?)"
+    ),
+
+    # Moderation
+    Statement(
+        "mod_actions.insert",
+        "INSERT INTO mod_actions (guild_id, user_id, action, reason, moderator_id, created_at) "
+        f"VALUES (?, ?, ?, ?, ?, {NOW_MS})"
+    ),
+    Statement(
+        "mod_actions.page",
+        "SELECT id, user_id, action, reason, moderator_id, created_at FROM mod_actions "
+        "WHERE guild_id = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+        decode_mod_action
+    ),
+    Statement(
+        "mod_actions.page_before",
+        "SELECT id, user_id, action, reason, moderator_id, created_at FROM mod_actions "
+        "WHERE guild_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+        decode_mod_action
+    ),
+    Statement(
+        "mod_actions.delete_user",
+        "DELETE FROM mod_actions WHERE guild_id = ? AND user_id = ?"
+    ),
+    Statement(
+        "mod_actions.delete_guild_chunk",
+        "DELETE FROM mod_actions WHERE rowid IN (SELECT rowid FROM mod_actions WHERE guild_id = ? LIMIT ?)"
+    ),
+
+    # Whispers. Lists are ordered by thread ID, a snowflake whose high bits are
+    # the thread's creation time
+    Statement(
+        "whispers.create",
+        "INSERT INTO whispers (guild_id, whisper_id, user_id, thread_id, created_at) "
+        f"VALUES (?, ?, ?, ?, {NOW_MS})"
+    ),
+    Statement(
+        "whispers.close",
+        f"UPDATE whispers SET is_closed = 1, closed_at = {NOW_MS} "
+        "WHERE guild_id = ? AND whisper_id = ? AND is_closed = 0"
+    ),
+    Statement(
+        "whispers.by_user",
+        "SELECT * FROM whispers WHERE guild_id = ? AND user_id = ? ORDER BY thread_id DESC",
+        decode_whisper
+    ),
+    Statement(
+        "whispers.list",
+        "SELECT * FROM whispers WHERE guild_id = ? ORDER BY thread_id DESC",
+        decode_whisper
+    ),
+    Statement(
+        "whispers.delete_user",
+        "DELETE FROM whispers WHERE guild_id = ? AND user_id = ?"
+    ),
+    Statement(
+        "whispers.delete_guild",
+        "DELETE FROM whispers WHERE guild_id = ?"
+    ),
+    Statement(
+        "whispers.delete_guild_chunk",
+        "DELETE FROM whispers WHERE rowid IN (SELECT rowid FROM whispers WHERE guild_id = ? LIMIT ?)"
+    ),
+
+    # Logs. Logs live in weekly partitions, ``{table}`` is filled in by LogPartitions.
+    # ``timestamp`` is epoch milliseconds, so windows and cursors compare integers
+    Statement(
+        "logs.insert_at",
+        "INSERT INTO {table} (guild_id, event_type, description, timestamp) VALUES (?, ?, ?, ?)"
+    ),
+    Statement(
+        "logs.recent",
+        "SELECT id, guild_id, event_type, description, timestamp FROM {table} "
+        "WHERE guild_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+        row_factory=LogEntry.row_factory
+    ),
+    Statement(
+        "logs.recent_by_type",
+        "SELECT id, guild_id, event_type, description, timestamp FROM {table} "
+        "WHERE guild_id = ? AND event_type = ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+        row_factory=LogEntry.row_factory
+    ),
+    Statement(
+        "logs.since",
+        "SELECT id, guild_id, event_type, description, timestamp FROM {table} "
+        "WHERE guild_id = ? AND timestamp >= ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+        row_factory=LogEntry.row_factory
+    ),
+    Statement(
+        "logs.since_by_type",
+        "SELECT id, guild_id, event_type, description, timestamp FROM {table} "
+        "WHERE guild_id = ? AND event_type = ? AND timestamp >= ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+        row_factory=LogEntry.row_factory
+    ),
+    Statement(
+        "logs.page_before",
+        "SELECT id, guild_id, event_type, description, timestamp FROM {table} "
+        "WHERE guild_id = :guild_id AND timestamp >= :since "
+        "AND (timestamp < :before OR (timestamp = :before AND id < :before_id)) "
+        "AND (:search IS NULL OR instr(description, :search) > 0) "
+        "ORDER BY timestamp DESC, id DESC LIMIT :limit",
+        row_factory=LogEntry.row_factory
+    ),
+    # A separate statement, so the planner can use the (guild_id, event_type, timestamp) index
+    Statement(
+        "logs.page_before_by_type",
+        "SELECT id, guild_id, event_type, description, timestamp FROM {table} "
+        "WHERE guild_id = :guild_id AND event_type = :event_type AND timestamp >= :since "
+        "AND (timestamp < :before OR (timestamp = :before AND id < :before_id)) "
+        "AND (:search IS NULL OR instr(description, :search) > 0) "
+        "ORDER BY timestamp DESC, id DESC LIMIT :limit",
+        row_factory=LogEntry.row_factory
+    ),
+    Statement(
+        "logs.delete_older_than",
+        "DELETE FROM {table} WHERE guild_id = ? AND timestamp < ?"
+    ),
+    Statement(
+        "logs.purge_older_than",
+        "DELETE FROM {table} WHERE timestamp < ?"
+    ),
+    Statement(
+        "logs.delete_guild_chunk",
+        "DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE guild_id = ? LIMIT ?)"
+    ),
+
+    # Guild purges that have not finished yet, see GuildPurger
+    Statement(
+        "guild_purges.add",
+        f"INSERT OR IGNORE INTO guild_purges (guild_id, requested_at) VALUES (?, {NOW_MS})"
+    ),
+    Statement(
+        "guild_purges.list",
+        "SELECT guild_id, step FROM guild_purges ORDER BY requested_at, guild_id"
+    ),
+    Statement(
+        "guild_purges.advance",
+        "UPDATE guild_purges SET step = ?, deleted = deleted + ? WHERE guild_id = ?"
+    ),
+    Statement(
+        "guild_purges.delete",
+        "DELETE FROM guild_purges WHERE guild_id = ?"
+    ),
+)
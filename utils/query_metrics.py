@@ -0,0 +1,200 @@
+"""Latency and row metrics for the SQLite backend.
+
+Every registered statement run by :class:`~utils.db_manager.DBManager` is timed
+into a per-statement histogram together with the number of rows it returned or
+changed. Transactions record how long they waited for the write lock and for
+``BEGIN IMMEDIATE``, and how long they held it. Statements slower than the
+configured threshold are kept in a bounded slow-query log along with their
+``EXPLAIN QUERY PLAN``.
+
+Histograms use fixed buckets, so recording is a bisect and two additions and
+percentiles are estimates: the upper bound of the bucket they fall in.
+"""
+from __future__ import annotations
+from bisect import bisect_left
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+import time
+
+# Bucket upper bounds in milliseconds; the last bucket is unbounded
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram in milliseconds"""
+
+    __slots__ = ('counts', 'count', 'total_ms', 'max_ms')
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, elapsed_ms: float, count: int = 1) -> None:
+        """Record ``count`` runs that took ``elapsed_ms`` in total"""
+        each = elapsed_ms / count
+        self.counts[bisect_left(BUCKETS_MS, each)] += count
+        self.count += count
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, each)
+
+    def percentile(self, p: float) -> float:
+        """Estimated ``p`` percentile (0-100) in milliseconds"""
+        if not self.count:
+            return 0.0
+        target = self.count * p / 100
+        seen = 0
+        for bound, bucket in zip(BUCKETS_MS, self.counts):
+            seen += bucket
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50), 3),
+            "p95_ms": round(self.percentile(95), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+class StatementMetrics:
+    """Latency and row counts of one named statement"""
+
+    __slots__ = ('latency', 'rows', 'slow')
+
+    def __init__(self) -> None:
+        self.latency = LatencyHistogram()
+        self.rows = 0
+        self.slow = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.latency.stats(),
+            "total_ms": round(self.latency.total_ms, 3),
+            "rows": self.rows,
+            "slow": self.slow,
+        }
+
+
+@dataclass
+class SlowQuery:
+    """A statement run that took longer than the slow-query threshold"""
+    name: str
+    sql: str
+    elapsed_ms: float
+    rows: int
+    plan: Optional[List[str]] = None
+    at: float = field(default_factory=time.time)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "sql": self.sql,
+            "elapsed_ms": round(self.elapsed_ms, 3),
+            "rows": self.rows,
+            "plan": self.plan,
+            "at": self.at,
+        }
+
+
+def format_plan(rows: List[Tuple[Any, ...]]) -> List[str]:
+    """Indent ``EXPLAIN QUERY PLAN`` rows (id, parent, notused, detail) by depth"""
+    depth: Dict[int, int] = {0: -1}
+    lines = []
+    for row in rows:
+        node, parent, detail = row[0], row[1], row[3]
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return lines
+
+
+class QueryMetrics:
+    """Collects statement and transaction timings for one or more databases.
+
+    Args:
+        slow_query_ms: Statements at or above this duration go to the slow-query
+            log. 0 disables the log.
+        slow_log_size: Number of slow queries kept, oldest are dropped first
+    """
+
+    # Distinct SQL texts whose plans are cached
+    MAX_PLANS = 256
+
+    def __init__(self, slow_query_ms: float = 100.0, slow_log_size: int = 50) -> None:
+        self.slow_query_ms = slow_query_ms
+        self.statements: Dict[str, StatementMetrics] = {}
+        self.lock_wait = LatencyHistogram()
+        self.begin_wait = LatencyHistogram()
+        self.transactions = LatencyHistogram()
+        self.slow_queries: deque = deque(maxlen=slow_log_size)
+        self.plans: Dict[str, List[str]] = {}
+        self.since = time.time()
+
+    def is_slow(self, elapsed_ms: float) -> bool:
+        return 0 < self.slow_query_ms <= elapsed_ms
+
+    def observe(self, name: str, elapsed_ms: float, rows: int = 0, executions: int = 1) -> None:
+        """Record one call of a statement, ``executions`` runs for executemany"""
+        executions = max(executions, 1)
+        metrics = self.statements.get(name)
+        if metrics is None:
+            metrics = self.statements[name] = StatementMetrics()
+        metrics.latency.observe(elapsed_ms, executions)
+        metrics.rows += max(rows, 0)
+        if self.is_slow(elapsed_ms):
+            metrics.slow += 1
+
+    def add_slow(self, name: str, sql: str, elapsed_ms: float, rows: int, plan: Optional[List[str]]) -> None:
+        if plan is not None and sql not in self.plans and len(self.plans) < self.MAX_PLANS:
+            self.plans[sql] = plan
+        self.slow_queries.append(SlowQuery(name, " ".join(sql.split()), elapsed_ms, rows, plan))
+
+    def observe_transaction(self, lock_wait_ms: float, begin_ms: float, held_ms: float) -> None:
+        self.lock_wait.observe(lock_wait_ms)
+        self.begin_wait.observe(begin_ms)
+        self.transactions.observe(held_ms)
+
+    def top(self, count: int = 10, by: str = "total_ms") -> List[Tuple[str, Dict[str, Any]]]:
+        """The ``count`` statements with the highest ``by`` stat"""
+        ranked = sorted(
+            ((name, metrics.stats()) for name, metrics in self.statements.items()),
+            key=lambda item: item[1][by],
+            reverse=True
+        )
+        return ranked[:count]
+
+    def snapshot(self, top: int = 10, by: str = "total_ms", slow: int = 10) -> Dict[str, Any]:
+        """Statement, transaction and slow-query metrics as plain data"""
+        return {
+            "since": self.since,
+            "slow_query_ms": self.slow_query_ms,
+            "statements": dict(self.top(top, by)),
+            "lock_wait": self.lock_wait.stats(),
+            "begin_wait": self.begin_wait.stats(),
+            "transactions": self.transactions.stats(),
+            "slow_queries": [entry.as_dict() for entry in list(self.slow_queries)[-slow:]][::-1] if slow else [],
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """Compact form for periodic stats logging"""
+        return {
+            "top": {name: (stats["count"], stats["total_ms"], stats["p95_ms"]) for name, stats in self.top(5)},
+            "lock_wait_p99_ms": round(self.lock_wait.percentile(99), 3),
+            "slow": len(self.slow_queries),
+        }
+
+    def reset(self) -> None:
+        """Forget everything recorded so far, including cached plans"""
+        self.statements.clear()
+        self.lock_wait = LatencyHistogram()
+        self.begin_wait = LatencyHistogram()
+        self.transactions = LatencyHistogram()
+        self.slow_queries.clear()
+        self.plans.clear()
+        self.since = time.time()
@@ -0,0 +1,248 @@
+"""Slotted record types returned by the storage backends.
+
+Records are built straight from raw result tuples by position, inside the
+sqlite3 row factory, without an intermediate Row or dict. They use
+``__slots__`` so a large leaderboard or log read costs one small object per
+row. Fields are plain attributes (``entry.xp``), but records also answer
+read-only mapping lookups (``entry['xp']``, ``entry.get('xp')``) so existing
+callers keep working. :meth:`Record.as_dict` gives a real dict for JSON and
+display code.
+
+Times are stored as integer epoch milliseconds and exposed as aware UTC
+datetimes.
+
+Treat records as read-only.
+"""
+from __future__ import annotations
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple, Union
+import json
+import time
+
+DAY_MS = 86_400_000
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MS = timedelta(milliseconds=1)
+
+
+def now_ms() -> int:
+    """Current time in epoch milliseconds"""
+    return time.time_ns() // 1_000_000
+
+
+def cutoff_ms(days: float) -> int:
+    """Epoch milliseconds ``days`` days ago"""
+    return now_ms() - int(days * DAY_MS)
+
+
+def epoch_ms(value: Union[None, int, float, str, datetime]) -> Optional[int]:
+    """Normalize a stored time to epoch milliseconds.
+
+    Accepts epoch milliseconds, epoch seconds (any number below ``1e11``, which
+    is 1973 in milliseconds and the year 5138 in seconds), ``CURRENT_TIMESTAMP``
+    strings written before times were stored as integers, and datetimes. Naive
+    datetimes and strings are taken as UTC.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return (value - _EPOCH) // _MS
+    return round(value * 1000) if value < 1e11 else int(value)
+
+
+def parse_timestamp(value: Union[None, int, float, str]) -> Optional[datetime]:
+    """Stored time, see :func:`epoch_ms`, as an aware UTC datetime"""
+    if value is None:
+        return None
+    return _EPOCH + epoch_ms(value) * _MS
+
+
+class Record:
+    """Base class for slotted row records"""
+
+    __slots__ = ()
+
+    @classmethod
+    def from_row(cls, row: Any) -> Record:
+        raise NotImplementedError
+
+    @classmethod
+    def row_factory(cls, cursor: Any, row: Tuple[Any, ...]) -> Record:
+        """sqlite3 row factory that builds the record from the raw row tuple"""
+        return cls.from_row(row)
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in self.__slots__:
+            return default
+        return getattr(self, key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.__slots__
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.__slots__
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Fields as a new dict"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Record):
+            return type(self) is type(other) and self.as_dict() == other.as_dict()
+        if isinstance(other, dict):
+            return self.as_dict() == other
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class FeatureSettings(Record):
+    """Enabled flag and options of one feature"""
+
+    __slots__ = ('enabled', 'options')
+
+    def __init__(self, enabled: bool, options: Dict[str, Any]) -> None:
+        self.enabled = enabled
+        self.options = options
+
+    @classmethod
+    def from_row(cls, row: Any) -> FeatureSettings:
+        """(enabled, options_json) row"""
+        return cls(bool(row[0]), json.loads(row[1]) if row[1] else {})
+
+
+class NamedFeatureSettings(Record):
+    """Feature settings together with the feature name"""
+
+    __slots__ = ('feature', 'enabled', 'options')
+
+    def __init__(self, feature: str, enabled: bool, options: Dict[str, Any]) -> None:
+        self.feature = feature
+        self.enabled = enabled
+        self.options = options
+
+    @classmethod
+    def from_row(cls, row: Any) -> NamedFeatureSettings:
+        """(feature, enabled, options_json) row"""
+        return cls(row[0], bool(row[1]), json.loads(row[2]) if row[2] else {})
+
+
+class GuildFeatureSettings(Record):
+    """Feature settings together with the guild and feature name"""
+
+    __slots__ = ('guild_id', 'feature', 'enabled', 'options')
+
+    def __init__(self, guild_id: int, feature: str, enabled: bool, options: Dict[str, Any]) -> None:
+        self.guild_id = guild_id
+        self.feature = feature
+        self.enabled = enabled
+        self.options = options
+
+    @classmethod
+    def from_row(cls, row: Any) -> GuildFeatureSettings:
+        """(guild_id, feature, enabled, options_json) row"""
+        return cls(row[0], row[1], bool(row[2]), json.loads(row[3]) if row[3] else {})
+
+
+class SettingsChange(Record):
+    """One write to a guild's feature settings, recorded in the change log.
+    ``feature`` is None when every feature of the guild may have changed,
+    ``origin`` identifies the backend instance that wrote it"""
+
+    __slots__ = ('seq', 'guild_id', 'feature', 'origin')
+
+    def __init__(self, seq: int, guild_id: int, feature: Optional[str], origin: Optional[str] = None) -> None:
+        self.seq = seq
+        self.guild_id = guild_id
+        self.feature = feature
+        self.origin = origin
+
+    @classmethod
+    def from_row(cls, row: Any) -> SettingsChange:
+        """(seq, guild_id, feature, origin) row"""
+        return cls(row[0], row[1], row[2], row[3])
+
+
+class SettingsChanges(Record):
+    """Result of one change log poll.
+
+    ``cursor`` is passed to the next poll, None when the backend keeps no
+    change log. ``complete`` is False when changes since the previous cursor
+    were pruned before they were read, so every cached setting may be stale.
+    """
+
+    __slots__ = ('changes', 'cursor', 'complete')
+
+    def __init__(self, changes: List[SettingsChange], cursor: Optional[str], complete: bool = True) -> None:
+        self.changes = changes
+        self.cursor = cursor
+        self.complete = complete
+
+
+class UserXP(Record):
+    """A member's XP, level and the message that last earned XP"""
+
+    __slots__ = ('xp', 'level', 'last_xp_gain', 'last_message')
+
+    def __init__(
+        self,
+        xp: int,
+        level: int,
+        last_xp_gain: Optional[int] = None,
+        last_message: Optional[str] = None
+    ) -> None:
+        self.xp = xp
+        self.level = level
+        self.last_xp_gain = last_xp_gain
+        self.last_message = last_message
+
+    @classmethod
+    def from_row(cls, row: Any) -> UserXP:
+        """(xp, level, last_xp_gain, last_message) row"""
+        return cls(row[0], row[1], row[2], row[3])
+
+
+class LeaderboardEntry(Record):
+    """One ranked member"""
+
+    __slots__ = ('user_id', 'xp', 'level')
+
+    def __init__(self, user_id: int, xp: int, level: int) -> None:
+        self.user_id = user_id
+        self.xp = xp
+        self.level = level
+
+    @classmethod
+    def from_row(cls, row: Any) -> LeaderboardEntry:
+        """(user_id, xp, level) row"""
+        return cls(row[0], row[1], row[2])
+
+
+class LogEntry(Record):
+    """One guild log event"""
+
+    __slots__ = ('id', 'guild_id', 'event_type', 'description', 'timestamp')
+
+    def __init__(self, id: int, guild_id: int, event_type: str, description: str, timestamp: datetime) -> None:
+        self.id = id
+        self.guild_id = guild_id
+        self.event_type = event_type
+        self.description = description
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_row(cls, row: Any) -> LogEntry:
+        """(id, guild_id, event_type, description, timestamp) row"""
+        return cls(row[0], row[1], row[2], row[3], parse_timestamp(row[4]))
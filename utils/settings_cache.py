@@ -0,0 +1,138 @@
+"""In-process cache of per-guild feature settings.
+
+Every message and gateway event looks up the settings of at least one
+feature, while settings change a few times a day. :class:`SettingsCache`
+keeps the settings of the most recently used guilds in memory, so those
+lookups don't go to the database at all.
+
+Entries are dropped when settings are written (see
+:meth:`SettingsCache.invalidate`), when the guild is the least recently used
+one and the cache is full, and, if a TTL is set, once they are older than the
+TTL. The TTL is only a safety net for writes that bypass the cache, such as
+another process writing to the same database.
+
+A read that was already running when its guild was invalidated may return the
+old settings. :meth:`SettingsCache.put` takes the :attr:`~SettingsCache.generation`
+seen before the read started and ignores the result if anything was
+invalidated since.
+
+Each guild is cached as one :class:`~utils.guild_settings.GuildSettings`
+snapshot, shared by every caller and never mutated.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+import sys
+import time
+
+# Returned by get() when nothing is cached; None is a valid cached value
+MISSING: Any = object()
+
+
+def approx_size(value: Any, seen: Optional[Set[int]] = None) -> int:
+    """Rough deep size in bytes of plain data: containers, slotted records and scalars.
+    Objects reachable more than once are counted once"""
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, (dict, MappingProxyType)):
+        size += sum(approx_size(k, seen) + approx_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approx_size(item, seen) for item in value)
+    elif hasattr(type(value), '__slots__'):
+        size += sum(approx_size(getattr(value, name, None), seen) for name in type(value).__slots__)
+    return size
+
+
+class SettingsCache:
+    """LRU cache of ``guild_id -> settings``, bounded by guild count.
+
+    Args:
+        max_guilds: Guilds kept at once, the least recently used is evicted first
+        ttl: Seconds an entry stays valid, 0 keeps entries until invalidated
+    """
+
+    def __init__(self, max_guilds: int = 10000, ttl: float = 0.0) -> None:
+        self.max_guilds = max_guilds
+        self.ttl = ttl
+        # guild_id -> (settings, expires_at)
+        self._guilds: OrderedDict[int, Tuple[Any, float]] = OrderedDict()
+        self.generation = 0
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._guilds)
+
+    def get(self, guild_id: int) -> Any:
+        """Cached settings of a guild, or :data:`MISSING`"""
+        entry = self._guilds.get(guild_id)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        if self.ttl > 0 and entry[1] <= time.monotonic():
+            del self._guilds[guild_id]
+            self.expirations += 1
+            self.misses += 1
+            return MISSING
+        self._guilds.move_to_end(guild_id)
+        self.hits += 1
+        return entry[0]
+
+    def peek(self, guild_id: int) -> Any:
+        """Cached settings of a guild, or :data:`MISSING`, without counting a lookup
+        or refreshing the guild's LRU position"""
+        entry = self._guilds.get(guild_id)
+        if entry is None or (self.ttl > 0 and entry[1] <= time.monotonic()):
+            return MISSING
+        return entry[0]
+
+    def put(self, guild_id: int, settings: Any, generation: int) -> None:
+        """Cache settings read while :attr:`generation` was ``generation``"""
+        if generation != self.generation or self.max_guilds <= 0:
+            return
+        self._guilds[guild_id] = (settings, time.monotonic() + self.ttl if self.ttl > 0 else 0.0)
+        self._guilds.move_to_end(guild_id)
+        while len(self._guilds) > self.max_guilds:
+            self._guilds.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, guild_ids: Iterable[int]) -> None:
+        """Drop the settings of ``guild_ids``"""
+        self.generation += 1
+        for guild_id in guild_ids:
+            if self._guilds.pop(guild_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        self.generation += 1
+        self.invalidations += len(self._guilds)
+        self._guilds.clear()
+
+    def approx_bytes(self) -> int:
+        """Rough memory held by the cache, walks every entry"""
+        return approx_size(self._guilds)
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit ratio"""
+        lookups = self.hits + self.misses
+        return {
+            "guilds": len(self._guilds),
+            "max_guilds": self.max_guilds,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,111 @@
+"""Notifications of feature settings changes.
+
+:class:`FeatureManager` publishes an event on its :class:`SettingsBus` after
+every settings write, once the cached settings are dropped, so a subscriber
+that reads the settings again sees the new values. Cogs subscribe to rebuild
+whatever they derive from settings instead of re-reading them on every event::
+
+    self.unsubscribe = bot.features.bus.subscribe(FeatureChanged, self.on_settings_changed)
+
+Subscribing to a base class receives its subclasses too, :class:`SettingsEvent`
+receives everything. Callbacks may be plain functions or coroutine functions,
+the latter run as their own tasks. Events marked ``remote`` were written by
+another process and seen through the storage change log. An event may be
+delivered more than once, so subscribers must be idempotent.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Type
+import asyncio
+import inspect
+import logging
+
+if TYPE_CHECKING:
+    from utils.features import FeatureType
+
+
+class SettingsEvent:
+    """Base of every settings event"""
+
+    __slots__ = ()
+
+
+@dataclass(frozen=True)
+class FeatureChanged(SettingsEvent):
+    """The settings of one feature of a guild changed"""
+    guild_id: int
+    feature: FeatureType
+    remote: bool = False
+
+
+@dataclass(frozen=True)
+class GuildChanged(SettingsEvent):
+    """Any feature of a guild may have changed, e.g. it was seeded or purged"""
+    guild_id: int
+    remote: bool = False
+
+
+@dataclass(frozen=True)
+class SettingsReset(SettingsEvent):
+    """Changes were missed, the settings of every guild may have changed"""
+    remote: bool = True
+
+
+Subscriber = Callable[[Any], Any]
+
+
+class SettingsBus:
+    """Delivers settings events to their subscribers, in subscription order"""
+
+    def __init__(self, logger: Optional[logging.Logger] = None) -> None:
+        self.log = logger or logging.getLogger("SettingsBus")
+        self._subscribers: Dict[type, List[Subscriber]] = {}
+        self._tasks: set = set()
+
+        # Stats
+        self.published = 0
+        self.delivered = 0
+        self.errors = 0
+
+    def subscribe(self, event_type: Type[SettingsEvent], callback: Subscriber) -> Callable[[], None]:
+        """Call ``callback(event)`` for every published ``event_type``.
+        Returns a function that unsubscribes it"""
+        self._subscribers.setdefault(event_type, []).append(callback)
+        return lambda: self.unsubscribe(event_type, callback)
+
+    def unsubscribe(self, event_type: Type[SettingsEvent], callback: Subscriber) -> None:
+        callbacks = self._subscribers.get(event_type)
+        if callbacks and callback in callbacks:
+            callbacks.remove(callback)
+
+    def publish(self, event: SettingsEvent) -> None:
+        """Deliver ``event`` now. Coroutine callbacks are scheduled, never awaited"""
+        self.published += 1
+        for event_type in type(event).__mro__:
+            for callback in tuple(self._subscribers.get(event_type, ())):
+                self.delivered += 1
+                try:
+                    result = callback(event)
+                except Exception as e:
+                    self.errors += 1
+                    self.log.error(f"Settings subscriber {callback!r} failed on {event!r}: {e}", exc_info=True)
+                    continue
+                if inspect.isawaitable(result):
+                    task = asyncio.ensure_future(result)
+                    self._tasks.add(task)
+                    task.add_done_callback(lambda done, event=event: self._finished(done, event))
+
+    def _finished(self, task: asyncio.Future, event: SettingsEvent) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+            self.log.error(f"Settings subscriber failed on {event!r}: {task.exception()}", exc_info=task.exception())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": sum(len(callbacks) for callbacks in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "pending": len(self._tasks),
+            "errors": self.errors,
+        }
@@ -0,0 +1,382 @@
+"""Per-guild sharding of the SQLite backend.
+
+SQLite allows a single writer per file, so with one database every guild queues
+behind the same write lock. :class:`ShardedDBManager` spreads guilds over several
+database files, each with its own :class:`DBManager` (writer, reader pool, write
+queue and maintenance), and routes every guild-scoped call to the shard that owns
+the guild. Cross-guild calls fan out to every shard and merge the results.
+
+Guilds are assigned with Discord's own shard formula, ``(guild_id >> 22) % count``.
+Changing the shard count moves guilds between files, so existing data has to be
+re-split with the migration tool::
+
+    python -m utils.sharding --source data/database.db --shards 4
+"""
+from __future__ import annotations
+from contextlib import aclosing
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import argparse
+import asyncio
+import logging
+import aiosqlite
+
+from utils.db_backup import BackupReport
+from utils.db_manager import TIME_COLUMNS, DBManager
+from utils.query_metrics import QueryMetrics
+from utils.records import GuildFeatureSettings, SettingsChanges, epoch_ms
+from utils.storage import Page, StorageBackend, decode_cursor, encode_cursor
+
+# Tables that hold per-guild rows, in parent-first order
+SHARDED_TABLES = (
+    "guilds",
+    "guild_settings",
+    "users",
+    "feature_settings",
+    "feature_options",
+    "xp",
+    "level_roles",
+    "reaction_roles",
+    "mod_actions",
+    "whispers",
+    "guild_purges",
+)
+
+
+def shard_index(guild_id: int, shard_count: int) -> int:
+    """Index of the shard that owns a guild"""
+    return (guild_id >> 22) % shard_count
+
+
+def shard_paths(db_path: str, shard_count: int) -> List[str]:
+    """Shard files for a database path: ``data/database.db`` -> ``data/shards/database-00.db``, ..."""
+    path = Path(db_path)
+    directory = path.parent / "shards"
+    return [str(directory / f"{path.stem}-{i:02d}{path.suffix}") for i in range(shard_count)]
+
+
+def _routed(name: str):
+    """Forward a guild-scoped method to the shard owning its ``guild_id`` argument"""
+    async def method(self: ShardedDBManager, guild_id: int, *args: Any, **kwargs: Any) -> Any:
+        return await getattr(self.shard_for(guild_id), name)(guild_id, *args, **kwargs)
+
+    method.__name__ = name
+    method.__qualname__ = f"ShardedDBManager.{name}"
+    method.__doc__ = getattr(StorageBackend, name).__doc__
+    return method
+
+
+def _routed_iter(name: str):
+    """Forward a guild-scoped async iterator to the shard owning its ``guild_id`` argument"""
+    def method(self: ShardedDBManager, guild_id: int, *args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        return getattr(self.shard_for(guild_id), name)(guild_id, *args, **kwargs)
+
+    method.__name__ = name
+    method.__qualname__ = f"ShardedDBManager.{name}"
+    method.__doc__ = getattr(StorageBackend, name).__doc__
+    return method
+
+
+class ShardedDBManager(StorageBackend):
+    """SQLite storage split over several files by guild ID"""
+
+    def __init__(self, paths: Sequence[str], logger: Optional[logging.Logger] = None, **options: Any) -> None:
+        if not paths:
+            raise ValueError("At least one shard path is required")
+        self.log = logger or logging.getLogger("ShardedDBManager")
+        # One set of query metrics for the whole process
+        self.metrics = QueryMetrics(options.pop("slow_query_ms", 100.0))
+        self.shards = [DBManager(path, logger=self.log, metrics=self.metrics, **options) for path in paths]
+
+    def shard_for(self, guild_id: int) -> DBManager:
+        """Get the shard that owns a guild"""
+        return self.shards[shard_index(guild_id, len(self.shards))]
+
+    def _partition(self, guild_ids: Iterable[int]) -> Dict[int, List[int]]:
+        """Group guild IDs by shard index"""
+        groups: Dict[int, List[int]] = {}
+        for guild_id in set(guild_ids):
+            groups.setdefault(shard_index(guild_id, len(self.shards)), []).append(guild_id)
+        return groups
+
+    # -------------------- Lifecycle --------------------
+
+    async def init(self) -> None:
+        """Open every shard"""
+        for path in {Path(shard.db_path).parent for shard in self.shards}:
+            path.mkdir(parents=True, exist_ok=True)
+        await asyncio.gather(*(shard.init() for shard in self.shards))
+        self.log.info(f"Opened {len(self.shards)} database shard(s)")
+
+    async def close(self, drain_timeout: float = 5.0) -> None:
+        """Drain and close every shard"""
+        results = await asyncio.gather(
+            *(shard.close(drain_timeout) for shard in self.shards),
+            return_exceptions=True
+        )
+        for shard, result in zip(self.shards, results):
+            if isinstance(result, BaseException):
+                self.log.error(f"Error closing shard {shard.db_path}: {result}")
+
+    async def drain(self, timeout: float = 5.0) -> int:
+        """Drain every shard concurrently. Returns the total number of lost writes"""
+        return sum(await asyncio.gather(*(shard.drain(timeout) for shard in self.shards)))
+
+    async def backup(self, progress: Optional[Callable[[BackupReport], None]] = None) -> List[BackupReport]:
+        """Snapshot the shards one after another, so only one copy uses the disk at a time"""
+        reports = []
+        for shard in self.shards:
+            reports.extend(await shard.backup(progress))
+        return reports
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-shard runtime statistics"""
+        return {"shards": {shard.db_path: shard.stats() for shard in self.shards}}
+
+    def query_stats(self, top: int = 10, by: str = "total_ms", slow: int = 10) -> Dict[str, Any]:
+        """Query metrics of every shard combined"""
+        return self.metrics.snapshot(top, by, slow)
+
+    def reset_query_stats(self) -> None:
+        """Start query metrics from scratch"""
+        self.metrics.reset()
+        for shard in self.shards:
+            shard.single_flight.reset()
+
+    # -------------------- Cross-guild --------------------
+
+    async def add_guilds_bulk(self, guild_ids: Iterable[int]) -> int:
+        """Add every missing guild, one transaction per shard"""
+        groups = self._partition(guild_ids)
+        added = await asyncio.gather(*(self.shards[i].add_guilds_bulk(ids) for i, ids in groups.items()))
+        return sum(added)
+
+    async def init_features_bulk(
+        self,
+        guild_ids: Iterable[int],
+        defaults: Dict[str, Tuple[bool, Dict[str, Any]]]
+    ) -> int:
+        """Seed missing guild and feature rows, one transaction per shard"""
+        groups = self._partition(guild_ids)
+        seeded = await asyncio.gather(
+            *(self.shards[i].init_features_bulk(ids, defaults) for i, ids in groups.items())
+        )
+        return sum(seeded)
+
+    async def get_global_stats(self) -> Dict[str, int]:
+        """Totals across every shard"""
+        totals: Dict[str, int] = {}
+        for stats in await asyncio.gather(*(shard.get_global_stats() for shard in self.shards)):
+            for key, value in stats.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    async def purge_old_logs(self, days: int) -> None:
+        """Clear every guild's logs older than specified days on every shard"""
+        await asyncio.gather(*(shard.purge_old_logs(days) for shard in self.shards))
+
+    async def get_feature_rows_after(self, limit: int = 500, cursor: Optional[str] = None) -> Page:
+        """Merge every shard's page after the same cursor. Each shard is ordered
+        by the same key, so the first ``limit`` merged rows are the global page"""
+        pages = await asyncio.gather(*(shard.get_feature_rows_after(limit, cursor) for shard in self.shards))
+        rows = sorted((row for page, _ in pages for row in page), key=lambda row: (row.guild_id, row.feature))
+        if len(rows) <= limit and all(next_cursor is None for _, next_cursor in pages):
+            return rows, None
+        rows = rows[:limit]
+        return rows, encode_cursor("feature_rows", rows[-1].guild_id, rows[-1].feature)
+
+    async def iter_feature_rows(self, batch_size: int = 500) -> AsyncIterator[GuildFeatureSettings]:
+        """Stream every shard in turn, one scan each. Rows are ordered within a shard only"""
+        for shard in self.shards:
+            async with aclosing(shard.iter_feature_rows(batch_size)) as rows:
+                async for row in rows:
+                    yield row
+
+    async def get_settings_changes(self, cursor: Optional[str] = None, limit: int = 1000) -> SettingsChanges:
+        """Poll every shard's change log, the cursor holds one cursor per shard"""
+        cursors = decode_cursor("shard_changes", cursor) if cursor is not None else [None] * len(self.shards)
+        if len(cursors) != len(self.shards):
+            raise ValueError("Invalid pagination cursor")
+        polls = await asyncio.gather(*(
+            shard.get_settings_changes(shard_cursor, limit) for shard, shard_cursor in zip(self.shards, cursors)
+        ))
+        if any(poll.cursor is None for poll in polls):
+            return SettingsChanges([], None)
+        return SettingsChanges(
+            [change for poll in polls for change in poll.changes],
+            encode_cursor("shard_changes", *(poll.cursor for poll in polls)),
+            all(poll.complete for poll in polls)
+        )
+
+    # -------------------- Guild-scoped --------------------
+
+    add_guild = _routed("add_guild")
+    remove_guild = _routed("remove_guild")
+    get_guild_prefix = _routed("get_guild_prefix")
+    set_guild_prefix = _routed("set_guild_prefix")
+    get_guild_setting = _routed("get_guild_setting")
+    set_guild_setting = _routed("set_guild_setting")
+    get_guild_settings = _routed("get_guild_settings")
+    delete_guild_data = _routed("delete_guild_data")
+    purge_guild = _routed("purge_guild")
+    cancel_guild_purge = _routed("cancel_guild_purge")
+
+    update_user_activity = _routed("update_user_activity")
+    increment_user_commands = _routed("increment_user_commands")
+    delete_user_data = _routed("delete_user_data")
+
+    get_feature_settings = _routed("get_feature_settings")
+    get_all_feature_settings = _routed("get_all_feature_settings")
+    get_feature_option = _routed("get_feature_option")
+    set_feature_settings = _routed("set_feature_settings")
+    set_feature_enabled = _routed("set_feature_enabled")
+    patch_feature_options = _routed("patch_feature_options")
+    patch_feature_list_item = _routed("patch_feature_list_item")
+
+    get_user_xp = _routed("get_user_xp")
+    update_user_xp = _routed("update_user_xp")
+    update_user_xp_with_message = _routed("update_user_xp_with_message")
+    reset_user_xp = _routed("reset_user_xp")
+    delete_all_xp = _routed("delete_all_xp")
+    get_leaderboard = _routed("get_leaderboard")
+    get_leaderboard_page = _routed("get_leaderboard_page")
+    get_leaderboard_after = _routed("get_leaderboard_after")
+    get_leaderboard_cursor = _routed("get_leaderboard_cursor")
+    iter_leaderboard = _routed_iter("iter_leaderboard")
+    get_xp_cooldown = _routed("get_xp_cooldown")
+    set_xp_cooldown = _routed("set_xp_cooldown")
+    set_level_role = _routed("set_level_role")
+    delete_level_role = _routed("delete_level_role")
+    get_level_roles = _routed("get_level_roles")
+    get_level_roles_for_level = _routed("get_level_roles_for_level")
+
+    add_reaction_role = _routed("add_reaction_role")
+    remove_reaction_role = _routed("remove_reaction_role")
+    get_reaction_roles = _routed("get_reaction_roles")
+
+    insert_mod_action = _routed("insert_mod_action")
+    get_mod_actions_page = _routed("get_mod_actions_page")
+    get_mod_actions_after = _routed("get_mod_actions_after")
+    iter_mod_actions = _routed_iter("iter_mod_actions")
+
+    create_whisper = _routed("create_whisper")
+    close_whisper = _routed("close_whisper")
+    get_whispers_by_user = _routed("get_whispers_by_user")
+    get_all_whispers = _routed("get_all_whispers")
+    delete_all_whispers = _routed("delete_all_whispers")
+
+    add_log = _routed("add_log")
+    get_logs = _routed("get_logs")
+    get_logs_filtered = _routed("get_logs_filtered")
+    get_logs_after = _routed("get_logs_after")
+    iter_logs = _routed_iter("iter_logs")
+    clear_old_logs = _routed("clear_old_logs")
+
+
+# -------------------- Migration --------------------
+
+async def migrate_to_shards(
+    source_path: str,
+    target: ShardedDBManager,
+    batch_size: int = 1000,
+    logger: Optional[logging.Logger] = None
+) -> Dict[str, int]:
+    """Copy a single-file database into an initialized sharded backend.
+
+    Rows are streamed from the source in batches and written with one
+    transaction per batch and shard. Existing rows in the shards are replaced,
+    so an interrupted migration can simply be run again.
+
+    Returns:
+        The number of rows copied per table
+    """
+    log = logger or logging.getLogger("ShardMigration")
+    copied: Dict[str, int] = {}
+    source = await aiosqlite.connect(f"file:{source_path}?mode=ro", uri=True)
+    try:
+        async with source.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name") as cursor:
+            existing = [row[0] for row in await cursor.fetchall()]
+        # Older files predate some tables, e.g. feature_options
+        tables = [table for table in SHARDED_TABLES if table in existing]
+        # Logs are either the legacy single table or weekly partitions
+        log_tables = [
+            name for name in existing
+            if name == "logs" or (name.startswith("logs_") and name[5:].isdigit())
+        ]
+
+        for table in (*tables, *log_tables):
+            async with source.execute(f"SELECT * FROM {table}") as cursor:
+                columns = [column[0] for column in cursor.description]
+                guild_column = columns.index("guild_id")
+                # Older files store times as CURRENT_TIMESTAMP text
+                time_columns = [
+                    columns.index(column)
+                    for column in TIME_COLUMNS.get("logs" if table in log_tables else table, ())
+                    if column in columns
+                ]
+                sql = (
+                    f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' for _ in columns)})"
+                )
+                copied[table] = 0
+                while rows := await cursor.fetchmany(batch_size):
+                    groups: Dict[int, List[Tuple[Any, ...]]] = {}
+                    for row in rows:
+                        row = list(row)
+                        for column in time_columns:
+                            row[column] = epoch_ms(row[column])
+                        index = shard_index(row[guild_column], len(target.shards))
+                        groups.setdefault(index, []).append(tuple(row))
+                    for index, group in groups.items():
+                        shard = target.shards[index]
+                        async with shard.transaction() as tr:
+                            if table in log_tables:
+                                await _copy_logs(shard, tr, columns, group)
+                            else:
+                                await tr.executemany(sql, group)
+                    copied[table] += len(rows)
+            log.info(f"Copied {copied[table]} row(s) from {table}")
+    finally:
+        await source.close()
+    return copied
+
+
+async def _copy_logs(shard: DBManager, tr: Any, columns: List[str], rows: List[Tuple[Any, ...]]) -> None:
+    """Write log rows into the target shard's weekly partitions"""
+    timestamp_column = columns.index("timestamp")
+    by_table: Dict[str, List[Tuple[Any, ...]]] = {}
+    for row in rows:
+        table = await shard.log_partitions.ensure(tr, row[timestamp_column])
+        by_table.setdefault(table, []).append(row)
+    for table, group in by_table.items():
+        await tr.executemany(
+            f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})",
+            group
+        )
+
+
+async def _main(args: argparse.Namespace) -> None:
+    target = ShardedDBManager(
+        shard_paths(args.source, args.shards),
+        read_pool_size=0,
+        storage_profile="throughput"
+    )
+    await target.init()
+    try:
+        copied = await migrate_to_shards(args.source, target, args.batch_size)
+    finally:
+        await target.close()
+    print(f"Migrated {sum(copied.values())} row(s) into {args.shards} shard(s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split a single-file database into guild shards")
+    parser.add_argument("--source", default="data/database.db", help="Existing database file")
+    parser.add_argument("--shards", type=int, required=True, help="Number of shard files to create")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows copied per transaction")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    _main_args = parser.parse_args()
+    if _main_args.shards < 2:
+        parser.error("--shards must be at least 2")
+    asyncio.run(_main(_main_args))
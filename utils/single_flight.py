@@ -0,0 +1,119 @@
+"""Coalescing of concurrent identical reads.
+
+A burst of events in one guild makes many coroutines ask for the same settings
+at the same moment. :class:`SingleFlight` lets the first caller run the read
+and hands its result to every caller that asks for the same key while it is in
+flight. Nothing is cached: once the read finishes, the next caller starts a new
+one.
+
+Callers share the result object, so results must not be mutated.
+
+A caller that finished a write must not join a read that started before it,
+or it would miss its own write. Each read is tagged with what it reads (tables,
+guilds), and after a write :meth:`SingleFlight.forget` detaches the in-flight
+reads with the written tags. Later callers start fresh reads, and callers already
+waiting still get the older result.
+"""
+from __future__ import annotations
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Tuple, TypeVar
+import asyncio
+
+T = TypeVar('T')
+
+
+class FlightStats:
+    """Call counts of one kind of coalesced read"""
+
+    __slots__ = ('calls', 'shared')
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.shared = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "executed": self.calls - self.shared,
+            "shared": self.shared,
+            "ratio": round(self.shared / self.calls, 3) if self.calls else 0.0,
+        }
+
+
+class SingleFlight:
+    """Shares one in-flight call between concurrent callers with the same key.
+
+    Keys are ``(name, *args)`` tuples, where ``name`` labels the read in the
+    stats. The shared call runs as its own task, so a caller that is cancelled
+    doesn't cancel it for the others.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, Tuple[asyncio.Task, frozenset]] = {}
+        self._stats: Dict[str, FlightStats] = {}
+
+    async def run(
+        self,
+        key: Tuple[Any, ...],
+        call: Callable[[], Awaitable[T]],
+        tags: Iterable[Hashable] = ()
+    ) -> T:
+        """Await ``call()``, or the identical call already in flight.
+
+        Args:
+            key: ``(name, *args)`` identifying the call
+            call: Starts the call, only invoked when none is in flight
+            tags: What the call reads, see :meth:`forget`
+        """
+        stats = self._stats.get(key[0])
+        if stats is None:
+            stats = self._stats[key[0]] = FlightStats()
+        stats.calls += 1
+        entry = self._calls.get(key)
+        if entry is not None:
+            stats.shared += 1
+            task = entry[0]
+        else:
+            task = asyncio.ensure_future(call())
+            self._calls[key] = (task, frozenset(tags))
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        entry = self._calls.get(key)
+        if entry is not None and entry[0] is task:
+            del self._calls[key]
+        # Retrieve the exception, every caller may have been cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def forget(self, tags: Iterable[Hashable]) -> int:
+        """Stop sharing in-flight calls that read any of ``tags``.
+        Returns the number of calls detached"""
+        tags = set(tags)
+        stale = [key for key, (_, read) in self._calls.items() if not tags.isdisjoint(read)]
+        for key in stale:
+            del self._calls[key]
+        return len(stale)
+
+    def forget_all(self) -> int:
+        """Stop sharing every in-flight call. Returns the number of calls detached"""
+        detached = len(self._calls)
+        self._calls.clear()
+        return detached
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-read call counts and the share of calls that joined another"""
+        calls = sum(s.calls for s in self._stats.values())
+        shared = sum(s.shared for s in self._stats.values())
+        return {
+            "in_flight": self.in_flight,
+            "ratio": round(shared / calls, 3) if calls else 0.0,
+            "reads": {name: s.stats() for name, s in self._stats.items()},
+        }
+
+    def reset(self) -> None:
+        self._stats.clear()
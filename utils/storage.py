@@ -0,0 +1,521 @@
+"""Storage interface shared by every database backend.
+
+Cogs only talk to ``bot.db`` through the methods declared here, so the engine
+behind it can be swapped without touching them. Two backends ship with the bot:
+
+- ``sqlite``: :class:`utils.db_manager.DBManager`, the persistent default
+- ``memory``: :class:`utils.memory_backend.MemoryBackend`, dicts and indexes only,
+  for load tests and ephemeral shards
+
+SQLite storage can also run in a separate worker process behind
+:class:`utils.db_worker.WorkerBackend`.
+"""
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import base64
+import binascii
+import json
+
+from utils.db_backup import BackupReport
+from utils.records import (
+    FeatureSettings, GuildFeatureSettings, LeaderboardEntry, LogEntry, NamedFeatureSettings, SettingsChanges, UserXP
+)
+
+# A page of rows and the cursor of the next page, None on the last page
+Page = Tuple[List[Any], Optional[str]]
+
+
+def encode_cursor(kind: str, *key: Any) -> str:
+    """Pack the sort key of the last row on a page into an opaque cursor"""
+    payload = json.dumps([kind, *key], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(kind: str, cursor: str) -> List[Any]:
+    """Unpack a cursor made by :func:`encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed or belongs to another listing
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(payload)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError("Invalid pagination cursor") from e
+    if not isinstance(values, list) or not values or values[0] != kind:
+        raise ValueError("Invalid pagination cursor")
+    return values[1:]
+
+
+def make_page(rows: Sequence[Any], limit: int, kind: str, key: Callable[[Any], Sequence[Any]]) -> Page:
+    """Build a page from up to ``limit + 1`` rows; the extra row only signals that more follow"""
+    if len(rows) <= limit:
+        return list(rows), None
+    rows = list(rows[:limit])
+    return rows, encode_cursor(kind, *key(rows[-1]))
+
+
+class StorageBackend(ABC):
+    """Abstract storage API used by the cogs and FeatureManager"""
+
+    # -------------------- Lifecycle --------------------
+
+    @abstractmethod
+    async def init(self) -> None:
+        """Open the backend and create its schema"""
+
+    @abstractmethod
+    async def close(self, drain_timeout: float = 5.0) -> None:
+        """Flush pending work for at most ``drain_timeout`` seconds and close"""
+
+    async def drain(self, timeout: float = 5.0) -> int:
+        """Flush buffered writes. Returns the number of writes that were lost"""
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Backend runtime statistics"""
+        return {}
+
+    async def backup(self, progress: Optional[Callable[[BackupReport], None]] = None) -> List[BackupReport]:
+        """Snapshot every database file. Returns one report per file, none if nothing is persisted"""
+        return []
+
+    def query_stats(self, top: int = 10, by: str = "total_ms", slow: int = 10) -> Optional[Dict[str, Any]]:
+        """Statement latency metrics and slow queries, or None if the backend isn't instrumented"""
+        return None
+
+    def reset_query_stats(self) -> None:
+        """Start query metrics from scratch"""
+
+    # -------------------- Guilds --------------------
+
+    @abstractmethod
+    async def add_guild(self, guild_id: int) -> None:
+        """Add a new guild"""
+
+    @abstractmethod
+    async def add_guilds_bulk(self, guild_ids: Iterable[int]) -> int:
+        """Add every missing guild. Returns the number added"""
+
+    @abstractmethod
+    async def remove_guild(self, guild_id: int) -> None:
+        """Remove a guild and everything stored for it, see :meth:`purge_guild`"""
+
+    @abstractmethod
+    async def get_guild_prefix(self, guild_id: int) -> str:
+        """Get guild prefix"""
+
+    @abstractmethod
+    async def set_guild_prefix(self, guild_id: int, prefix: str) -> None:
+        """Set guild prefix"""
+
+    @abstractmethod
+    async def get_guild_setting(self, guild_id: int, key: str) -> Optional[str]:
+        """Get a single guild setting value"""
+
+    @abstractmethod
+    async def set_guild_setting(self, guild_id: int, key: str, value: str) -> None:
+        """Set a single guild setting value"""
+
+    @abstractmethod
+    async def get_guild_settings(self, guild_id: int) -> List[Dict[str, Any]]:
+        """Get every guild setting as ``{'key', 'value'}`` entries"""
+
+    @abstractmethod
+    async def delete_guild_data(self, guild_id: int) -> None:
+        """Delete everything stored for a guild"""
+
+    @abstractmethod
+    async def purge_guild(self, guild_id: int) -> None:
+        """Delete everything stored for a guild without waiting for it to finish"""
+
+    async def cancel_guild_purge(self, guild_id: int) -> bool:
+        """Stop an unfinished purge of a guild. Returns whether one was running"""
+        return False
+
+    @abstractmethod
+    async def get_global_stats(self) -> Dict[str, int]:
+        """Totals across every guild: guilds, users, messages, commands and ranked users"""
+
+    # -------------------- Users --------------------
+
+    @abstractmethod
+    async def update_user_activity(self, guild_id: int, user_id: int) -> None:
+        """Update user's last seen timestamp and message count"""
+
+    @abstractmethod
+    async def increment_user_commands(self, guild_id: int, user_id: int) -> None:
+        """Increment user's commands used counter"""
+
+    @abstractmethod
+    async def delete_user_data(self, guild_id: int, user_id: int) -> None:
+        """Delete everything stored for a user in a guild"""
+
+    # -------------------- Feature Settings --------------------
+
+    @abstractmethod
+    async def get_feature_settings(self, guild_id: int, feature: str) -> Optional[FeatureSettings]:
+        """Get ``{'enabled', 'options'}`` for a feature, or None if not stored"""
+
+    @abstractmethod
+    async def get_all_feature_settings(self, guild_id: int) -> List[NamedFeatureSettings]:
+        """Get every stored feature of a guild as ``{'feature', 'enabled', 'options'}`` entries"""
+
+    @abstractmethod
+    async def get_feature_rows_after(self, limit: int = 500, cursor: Optional[str] = None) -> Page:
+        """Get stored feature settings of every guild, ordered by guild and feature,
+        the page after ``cursor``"""
+
+    async def iter_feature_rows(self, batch_size: int = 500) -> AsyncIterator[GuildFeatureSettings]:
+        """Stream stored feature settings of every guild, ``batch_size`` rows at a time"""
+        cursor = None
+        while True:
+            rows, cursor = await self.get_feature_rows_after(batch_size, cursor)
+            for row in rows:
+                yield row
+            if cursor is None:
+                return
+
+    async def get_settings_changes(self, cursor: Optional[str] = None, limit: int = 1000) -> SettingsChanges:
+        """Feature settings writes after ``cursor`` by other processes sharing the storage,
+        oldest first. Without a cursor, returns the cursor of the current end.
+        Backends only one process can open keep no change log and return a None cursor"""
+        return SettingsChanges([], None)
+
+    async def get_feature_option(self, guild_id: int, feature: str, key: str, default: Any = None) -> Any:
+        """Get a single option value of a feature, or ``default`` if it is not stored"""
+        settings = await self.get_feature_settings(guild_id, feature)
+        return settings.options.get(key, default) if settings else default
+
+    @abstractmethod
+    async def set_feature_settings(self, guild_id: int, feature: str, enabled: bool, options: Dict[str, Any]) -> None:
+        """Set raw feature settings. For feature management, use FeatureManager"""
+
+    @abstractmethod
+    async def init_features_bulk(
+        self,
+        guild_ids: Iterable[int],
+        defaults: Dict[str, Tuple[bool, Dict[str, Any]]]
+    ) -> int:
+        """Seed missing guild and feature rows. Returns the number of feature rows created"""
+
+    @abstractmethod
+    async def set_feature_enabled(
+        self,
+        guild_id: int,
+        feature: str,
+        enabled: bool,
+        default_options: Dict[str, Any]
+    ) -> None:
+        """Set a feature's enabled flag and keep its stored options.
+        A missing feature is created with ``default_options``"""
+
+    @abstractmethod
+    async def patch_feature_options(
+        self,
+        guild_id: int,
+        feature: str,
+        options: Dict[str, Any],
+        default: Tuple[bool, Dict[str, Any]]
+    ) -> None:
+        """Replace individual option keys in one write, leaving the other keys untouched.
+        A missing feature is first created from ``default`` (enabled, options)"""
+
+    @abstractmethod
+    async def patch_feature_list_item(
+        self,
+        guild_id: int,
+        feature: str,
+        key: str,
+        match: Tuple[str, Any],
+        updates: Dict[str, Any]
+    ) -> bool:
+        """Update fields of the first object in the ``key`` option list whose
+        ``match`` (field, value) pair is equal, if the feature is enabled.
+        Returns whether an item was updated"""
+
+    async def get_whisper_settings(self, guild_id: int) -> Optional[Dict[str, Any]]:
+        """Get the whispers feature options, or None if not stored"""
+        settings = await self.get_feature_settings(guild_id, "whispers")
+        return settings['options'] if settings else None
+
+    async def set_whisper_channel(self, guild_id: int, channel_id: int, staff_role_id: int) -> None:
+        """Set the whisper channel and staff role, keeping other whisper options"""
+        await self.patch_feature_options(
+            guild_id, "whispers",
+            {'channel_id': channel_id, 'staff_role_id': staff_role_id},
+            (False, {})
+        )
+
+    async def get_autoroles(self, guild_id: int) -> List[int]:
+        """Get the auto role IDs of a guild"""
+        settings = await self.get_feature_settings(guild_id, "autoroles")
+        return list(settings['options'].get('roles', [])) if settings else []
+
+    async def remove_autorole(self, guild_id: int, role_id: int) -> None:
+        """Remove an auto role"""
+        settings = await self.get_feature_settings(guild_id, "autoroles")
+        if not settings:
+            return
+        # The settings may be shared with concurrent readers, only the roles key is rewritten
+        roles = [r for r in settings['options'].get('roles', []) if r != role_id]
+        await self.patch_feature_options(guild_id, "autoroles", {'roles': roles}, (settings['enabled'], {}))
+
+    # -------------------- Leveling --------------------
+
+    @abstractmethod
+    async def get_user_xp(self, guild_id: int, user_id: int) -> Optional[UserXP]:
+        """Get ``{'xp', 'level', ...}`` for a user, or None if they have no XP"""
+
+    @abstractmethod
+    async def update_user_xp(self, guild_id: int, user_id: int, xp: int, level: int) -> None:
+        """Set a user's XP and level"""
+
+    @abstractmethod
+    async def update_user_xp_with_message(
+        self,
+        guild_id: int,
+        user_id: int,
+        xp: int,
+        level: int,
+        xp_gain: int,
+        message: str
+    ) -> None:
+        """Set a user's XP and level and remember the message that earned it"""
+
+    @abstractmethod
+    async def reset_user_xp(self, guild_id: int, user_id: int) -> None:
+        """Reset a user's XP and level"""
+
+    @abstractmethod
+    async def delete_all_xp(self, guild_id: int) -> None:
+        """Delete all XP data of a guild"""
+
+    @abstractmethod
+    async def get_leaderboard(self, guild_id: int) -> List[LeaderboardEntry]:
+        """Get every user of a guild ordered by XP, highest first"""
+
+    @abstractmethod
+    async def get_leaderboard_page(self, guild_id: int, limit: int = 10, offset: int = 0) -> List[LeaderboardEntry]:
+        """Get one page of the leaderboard"""
+
+    @abstractmethod
+    async def get_leaderboard_after(self, guild_id: int, limit: int = 10, cursor: Optional[str] = None) -> Page:
+        """Get the leaderboard page after ``cursor``, or the first page without one"""
+
+    async def get_leaderboard_cursor(self, guild_id: int, offset: int) -> Optional[str]:
+        """Cursor for :meth:`get_leaderboard_after` that skips the first ``offset`` entries,
+        None when the leaderboard is not that long"""
+        if offset <= 0:
+            return None
+        rows = await self.get_leaderboard_page(guild_id, 1, offset - 1)
+        return encode_cursor("leaderboard", rows[0].xp, rows[0].user_id) if rows else None
+
+    async def iter_leaderboard(self, guild_id: int, batch_size: int = 500) -> AsyncIterator[LeaderboardEntry]:
+        """Stream the leaderboard, highest XP first, ``batch_size`` rows at a time"""
+        cursor = None
+        while True:
+            rows, cursor = await self.get_leaderboard_after(guild_id, batch_size, cursor)
+            for row in rows:
+                yield row
+            if cursor is None:
+                return
+
+    @abstractmethod
+    async def get_xp_cooldown(self, guild_id: int, user_id: int) -> Optional[float]:
+        """Get the epoch time in seconds a user last earned XP"""
+
+    @abstractmethod
+    async def set_xp_cooldown(self, guild_id: int, user_id: int, timestamp: float) -> None:
+        """Set the epoch time in seconds a user last earned XP"""
+
+    @abstractmethod
+    async def set_level_role(self, guild_id: int, level: int, role_id: int) -> None:
+        """Set the reward role for a level"""
+
+    @abstractmethod
+    async def delete_level_role(self, guild_id: int, level: int) -> None:
+        """Remove the reward role for a level"""
+
+    @abstractmethod
+    async def get_level_roles(self, guild_id: int) -> List[Dict[str, Any]]:
+        """Get every level reward as ``{'level', 'role_id'}`` entries"""
+
+    @abstractmethod
+    async def get_level_roles_for_level(self, guild_id: int, level: int) -> List[int]:
+        """Get the reward role IDs for a level"""
+
+    # -------------------- Roles --------------------
+
+    @abstractmethod
+    async def add_reaction_role(self, guild_id: int, message_id: int, emoji: str, role_id: int) -> None:
+        """Store a reaction role binding"""
+
+    @abstractmethod
+    async def remove_reaction_role(self, guild_id: int, message_id: int, emoji: str) -> None:
+        """Remove a reaction role binding"""
+
+    @abstractmethod
+    async def get_reaction_roles(self, guild_id: int) -> List[Dict[str, Any]]:
+        """Get every reaction role binding of a guild"""
+
+    # -------------------- Moderation --------------------
+
+    @abstractmethod
+    async def insert_mod_action(
+        self,
+        guild_id: int,
+        user_id: int,
+        action: str,
+        reason: Optional[str],
+        moderator_id: int
+    ) -> None:
+        """Record a moderation action"""
+
+    @abstractmethod
+    async def get_mod_actions_page(self, guild_id: int, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
+        """Get moderation actions, newest first"""
+
+    @abstractmethod
+    async def get_mod_actions_after(self, guild_id: int, limit: int = 10, cursor: Optional[str] = None) -> Page:
+        """Get the moderation actions page after ``cursor``, newest first"""
+
+    async def iter_mod_actions(self, guild_id: int, batch_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """Stream moderation actions, newest first, ``batch_size`` rows at a time"""
+        cursor = None
+        while True:
+            rows, cursor = await self.get_mod_actions_after(guild_id, batch_size, cursor)
+            for row in rows:
+                yield row
+            if cursor is None:
+                return
+
+    # -------------------- Whispers --------------------
+
+    @abstractmethod
+    async def create_whisper(self, guild_id: int, whisper_id: str, user_id: int, thread_id: int) -> None:
+        """Record a new whisper thread"""
+
+    @abstractmethod
+    async def close_whisper(self, guild_id: int, whisper_id: str) -> None:
+        """Mark a whisper thread as closed"""
+
+    @abstractmethod
+    async def get_whispers_by_user(self, guild_id: int, user_id: int) -> List[Dict[str, Any]]:
+        """Get a user's whispers, newest first"""
+
+    @abstractmethod
+    async def get_all_whispers(self, guild_id: int) -> List[Dict[str, Any]]:
+        """Get every whisper of a guild, newest first"""
+
+    @abstractmethod
+    async def delete_all_whispers(self, guild_id: int) -> None:
+        """Delete every whisper of a guild"""
+
+    # -------------------- Logs --------------------
+
+    @abstractmethod
+    async def add_log(self, guild_id: int, event_type: str, description: str) -> None:
+        """Add a log entry"""
+
+    async def insert_log(self, guild_id: int, event_type: str, description: str) -> None:
+        """Add a log entry"""
+        await self.add_log(guild_id, event_type, description)
+
+    @abstractmethod
+    async def get_logs(self, guild_id: int, event_type: Optional[str] = None, limit: int = 100) -> List[LogEntry]:
+        """Get the most recent logs with optional filtering"""
+
+    @abstractmethod
+    async def get_logs_filtered(
+        self,
+        guild_id: int,
+        event_type: Optional[str] = None,
+        since_days: Optional[int] = None,
+        limit: int = -1
+    ) -> List[LogEntry]:
+        """Get logs newer than ``since_days`` days, newest first. A negative limit means no limit"""
+
+    @abstractmethod
+    async def get_logs_after(
+        self,
+        guild_id: int,
+        event_type: Optional[str] = None,
+        since_days: Optional[int] = None,
+        search: Optional[str] = None,
+        limit: int = 10,
+        cursor: Optional[str] = None
+    ) -> Page:
+        """Get the logs page after ``cursor``, newest first.
+
+        ``search`` keeps only entries whose description contains it. The time
+        window is fixed by the first page, so later pages don't drift.
+        """
+
+    async def iter_logs(
+        self,
+        guild_id: int,
+        event_type: Optional[str] = None,
+        since_days: Optional[int] = None,
+        batch_size: int = 500
+    ) -> AsyncIterator[LogEntry]:
+        """Stream logs, newest first, ``batch_size`` rows at a time.
+
+        Memory use stays constant however many rows match. Wrap the iterator
+        in ``contextlib.aclosing`` when it may be abandoned early.
+        """
+        cursor = None
+        while True:
+            rows, cursor = await self.get_logs_after(
+                guild_id, event_type, since_days, limit=batch_size, cursor=cursor
+            )
+            for row in rows:
+                yield row
+            if cursor is None:
+                return
+
+    @abstractmethod
+    async def clear_old_logs(self, guild_id: int, days: int) -> None:
+        """Clear a guild's logs older than specified days"""
+
+    @abstractmethod
+    async def purge_old_logs(self, days: int) -> None:
+        """Clear every guild's logs older than specified days"""
+
+
+BACKENDS = ("sqlite", "memory")
+
+
+def create_storage(
+    backend: str,
+    db_path: str,
+    shards: int = 0,
+    worker: bool = False,
+    **options: Any
+) -> StorageBackend:
+    """Create the storage backend selected by configuration.
+
+    Args:
+        backend: One of ``BACKENDS``
+        db_path: Database file, ignored by the memory backend
+        shards: Split SQLite storage across this many files, 0 or 1 keeps a single file
+        worker: Run SQLite storage in a separate process, see :mod:`utils.db_worker`
+        **options: Backend specific keyword arguments
+
+    Raises:
+        ValueError: If the backend name is unknown
+    """
+    if backend == "sqlite":
+        if worker:
+            from utils.db_worker import WorkerBackend
+            return WorkerBackend(db_path, shards, **options)
+        if shards > 1:
+            from utils.sharding import ShardedDBManager, shard_paths
+            return ShardedDBManager(shard_paths(db_path, shards), **options)
+        from utils.db_manager import DBManager
+        return DBManager(db_path, **options)
+    if backend == "memory":
+        from utils.memory_backend import MemoryBackend
+        return MemoryBackend(logger=options.get("logger"))
+    raise ValueError(f"Unknown storage backend '{backend}', expected one of: {', '.join(BACKENDS)}")